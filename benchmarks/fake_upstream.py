@@ -0,0 +1,226 @@
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+
+# Local stand-ins for the Finnhub, Polygon and Yahoo REST APIs. Responses are
+# synthetic but deterministic per symbol and shaped like the real payloads, so
+# the app's parsing code runs unchanged.
+
+
+@dataclass
+class UpstreamConfig:
+    latency: float = 0.05       # seconds added to every response
+    jitter: float = 0.02        # uniform +/- seconds on top of latency
+    error_rate: float = 0.0     # fraction of requests answered with a 500
+    rate_limit: int = 0         # requests per minute before answering 429, 0 for unlimited
+
+
+def _seed(symbol):
+    return zlib.crc32(symbol.upper().encode())
+
+
+def base_price(symbol):
+    return 20 + _seed(symbol) % 480
+
+
+class FakeUpstream:
+    """A threaded HTTP server on 127.0.0.1 answering a table of path regexes."""
+
+    def __init__(self, name, routes, config=None, prefix=""):
+        self.name = name
+        self.routes = [(re.compile(f"^{prefix}{pattern}$"), handler) for pattern, handler in routes]
+        self.config = config or UpstreamConfig()
+        self.calls = Counter()      # route name -> requests served, including errors
+        self.statuses = Counter()
+        self._window = []           # request times within the last minute, for the rate limit
+        self._lock = threading.Lock()
+        self._random = random.Random(_seed(name))
+
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                upstream._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}{prefix}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True, name=f"fake-{self.name}").start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _admit(self):
+        now = time.monotonic()
+        with self._lock:
+            self._window = [t for t in self._window if now - t < 60]
+            if self.config.rate_limit and len(self._window) >= self.config.rate_limit:
+                return False
+            self._window.append(now)
+            return True
+
+    def _handle(self, request):
+        url = urlsplit(request.path)
+        path = re.sub("/+", "/", url.path)     # the finnhub SDK joins its base url and paths with a double slash
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        for pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return self._reply(request, "unknown", 404, {"error": "Not found"})
+
+        name = handler.__name__
+        if not self._admit():
+            return self._reply(request, name, 429, {"error": "API limit reached"})
+
+        with self._lock:
+            delay = max(self.config.latency + self._random.uniform(-self.config.jitter, self.config.jitter), 0)
+            failed = self._random.random() < self.config.error_rate
+        time.sleep(delay)
+        if failed:
+            return self._reply(request, name, 500, {"error": "Internal error"})
+        return self._reply(request, name, 200, handler(*match.groups(), **params))
+
+    def _reply(self, request, name, status, payload):
+        body = json.dumps(payload).encode()
+        with self._lock:
+            self.calls[name] += 1
+            self.statuses[status] += 1
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+# --- Finnhub -----------------------------------------------------------------
+
+SYMBOL_COUNT = 5000
+
+
+def _symbols():
+    names = ["Holdings", "Technologies", "Pharma", "Energy", "Capital", "Systems", "Foods", "Motors"]
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    for i in range(SYMBOL_COUNT):
+        ticker = letters[i % 26] + letters[i // 26 % 26] + letters[i // 676 % 26] * (i >= 676)
+        yield ticker, f"{ticker} {names[i % len(names)]} Inc".upper()
+
+
+def quote(symbol="AAPL", **params):
+    price = base_price(symbol)
+    change = (_seed(symbol) % 200 - 100) / 50
+    return {"c": price + change, "d": change, "dp": change / price * 100, "h": price + 3,
+            "l": price - 3, "o": price, "pc": price, "t": int(time.time())}
+
+
+def profile2(symbol="AAPL", **params):
+    return {"name": f"{symbol} Inc", "ticker": symbol, "exchange": "NASDAQ NMS - GLOBAL MARKET",
+            "ipo": "1990-01-01", "marketCapitalization": base_price(symbol) * 1000.0, "currency": "USD",
+            "shareOutstanding": 1000.0, "weburl": f"https://{symbol.lower()}.example.com",
+            "country": "US", "finnhubIndustry": "Technology", "logo": ""}
+
+
+def recommendation(symbol="AAPL", **params):
+    seed = _seed(symbol)
+    return [{"symbol": symbol, "period": date.today().replace(day=1).isoformat(), "buy": seed % 20,
+             "hold": seed % 7, "sell": seed % 3, "strongBuy": seed % 5, "strongSell": 0}]
+
+
+def market_status(**params):
+    return {"exchange": "US", "holiday": None, "isOpen": True, "session": "market", "timezone": "America/New_York"}
+
+
+def search(q="", **params):
+    q = q.upper()
+    matches = [
+        {"description": name, "displaySymbol": ticker, "symbol": ticker, "type": "Common Stock"}
+        for ticker, name in _symbols() if ticker.startswith(q)
+    ][:20]
+    return {"count": len(matches), "result": matches}
+
+
+def symbol_list(**params):
+    return [{"symbol": ticker, "description": name, "displaySymbol": ticker, "type": "Common Stock"}
+            for ticker, name in _symbols()]
+
+
+FINNHUB_ROUTES = [
+    (r"/quote", quote),
+    (r"/stock/profile2", profile2),
+    (r"/stock/recommendation", recommendation),
+    (r"/stock/market-status", market_status),
+    (r"/search", search),
+    (r"/stock/symbol", symbol_list),
+]
+
+
+# --- Polygon -----------------------------------------------------------------
+
+_SPAN_SECONDS = {"minute": 60, "hour": 3600}
+
+
+def aggregates(symbol, multiplier, timespan, start, end, **params):
+    step = int(multiplier) * _SPAN_SECONDS[timespan]
+    day, last = date.fromisoformat(start), date.fromisoformat(end)
+    rng = np.random.default_rng(_seed(symbol))
+    results = []
+    while day <= last:
+        if day.weekday() < 5:
+            # regular session 14:30-21:00 UTC
+            open_ = datetime(day.year, day.month, day.day, 14, 30, tzinfo=timezone.utc).timestamp()
+            times = np.arange(open_, open_ + 390 * 60, step)
+            closes = base_price(symbol) + np.cumsum(rng.normal(0, 0.1, len(times)))
+            results += [
+                {"t": int(t * 1000), "o": c, "h": c + 0.05, "l": c - 0.05, "c": c, "v": 1000.0}
+                for t, c in zip(times.tolist(), closes.tolist())
+            ]
+        day += timedelta(days=1)
+    return {"ticker": symbol, "status": "OK", "resultsCount": len(results), "results": results}
+
+
+POLYGON_ROUTES = [
+    (r"/v2/aggs/ticker/([^/]+)/range/(\d+)/(\w+)/([\d-]+)/([\d-]+)", aggregates),
+]
+
+
+# --- Yahoo chart API ------------------------------------------------------------
+
+def chart(symbol, **params):
+    price = base_price(symbol)
+    closes = [price - 2, price - 1, price + 0.5, price, price + 1]
+    return {"chart": {"result": [{"meta": {"symbol": symbol}, "indicators": {"quote": [{"close": closes}]}}], "error": None}}
+
+
+YAHOO_ROUTES = [
+    (r"/([^/]+)", chart),
+]
+
+
+def start_all(finnhub=None, polygon=None, yahoo=None):
+    return {
+        "finnhub": FakeUpstream("finnhub", FINNHUB_ROUTES, finnhub, prefix="/api/v1").start(),
+        "polygon": FakeUpstream("polygon", POLYGON_ROUTES, polygon).start(),
+        "yahoo": FakeUpstream("yahoo", YAHOO_ROUTES, yahoo, prefix="/v8/finance/chart").start(),
+    }
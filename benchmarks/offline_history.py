@@ -0,0 +1,54 @@
+import time
+import threading
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from stocks import finnhub_service, history_store, upstream
+from stocks.finnhub_service import index_change
+
+from .fake_upstream import _seed, base_price
+
+
+# Stand-ins for the yfinance calls: daily history is generated locally with a
+# configurable delay, index quotes go to the fake Yahoo chart server.
+
+calls = Counter()
+_lock = threading.Lock()
+
+
+def _frame(symbol, start):
+    days = pd.bdate_range(start, datetime.today().date())
+    rng = np.random.default_rng(_seed(symbol))
+    close = base_price(symbol) * np.exp(np.cumsum(rng.normal(0, 0.015, len(days))))
+    return pd.DataFrame({
+        "Open": close * 0.995, "High": close * 1.01, "Low": close * 0.99,
+        "Close": close, "Volume": rng.integers(1_000_000, 5_000_000, len(days)).astype(float),
+    }, index=days)
+
+
+def install(latency=0.3):
+    def download(symbol, start):
+        with _lock:
+            calls["download"] += 1
+        time.sleep(latency)
+        return history_store._to_columns(_frame(symbol, start))
+
+    def download_many(symbols, start):
+        with _lock:
+            calls["download_many"] += 1
+        time.sleep(latency)
+        return {symbol: history_store._to_columns(_frame(symbol, start)) for symbol in symbols}
+
+    def get_index_quote(symbol):
+        response = upstream.yahoo_api.get(f"{settings.YAHOO_CHART_URL}/{symbol}", params={"range": "5d", "interval": "1d"})
+        response.raise_for_status()
+        closes = response.json()["chart"]["result"][0]["indicators"]["quote"][0]["close"]
+        return index_change([close for close in closes if close is not None])
+
+    history_store.download = download
+    history_store.download_many = download_many
+    finnhub_service.get_index_quote = get_index_quote
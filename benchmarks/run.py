@@ -0,0 +1,220 @@
+"""
+Offline benchmark for the REST API.
+
+Runs the Django app in-process against local fake Finnhub/Polygon/Yahoo servers
+and a generated stand-in for yfinance, drives every endpoint at a fixed
+concurrency and prints latency percentiles, throughput and upstream calls per
+scenario. Nothing leaves the machine and no API keys are needed.
+
+Scenarios run in order in one process, so later ones see the caches earlier
+ones filled; run a scenario alone with --only for cold-cache numbers.
+
+    python -m benchmarks.run --concurrency 8 --requests 200
+    python -m benchmarks.run --only details,chart_daily --latency 0.1 --error-rate 0.05
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .fake_upstream import UpstreamConfig, start_all
+
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "TSLA", "AMD", "JNJ", "PFE", "MRNA", "UNH", "LLY",
+           "JPM", "BAC", "WFC", "GS", "MS", "KO", "PEP", "XOM", "CVX", "DIS"]
+PORTFOLIO = SYMBOLS[:10]
+WATCHLIST = SYMBOLS[10:15]
+
+
+def scenarios():
+    """name -> (method, path template, body); {symbol} cycles through SYMBOLS."""
+    return {
+        # stocks
+        "index": ("GET", "/stocks/index/", None),
+        "home": ("GET", "/stocks/home/", None),
+        "details": ("GET", "/stocks/{symbol}/details/", None),
+        "search": ("GET", "/stocks/{prefix}/search/", None),
+        "chart_daily": ("GET", "/stocks/{symbol}/chart/?range=6M", None),
+        "chart_intraday": ("GET", "/stocks/{symbol}/chart/?range=5D&points=200", None),
+        "indicators": ("GET", "/stocks/{symbol}/indicators/?range=3M", None),
+        "valuation": ("GET", "/stocks/portfolio/valuation/", None),
+        "async_details": ("GET", "/stocks/async/{symbol}/details/", None),
+        "async_home": ("GET", "/stocks/async/home/", None),
+        # user
+        "profile": ("GET", "/user/profile/", None),
+        "portfolio": ("GET", "/user/portfolio/", None),
+        "watchlist_contains": ("GET", "/user/watchlist/contains/{symbol}/", None),
+        "watchlist_bulk": ("POST", "/user/watchlist/{action}/bulk/", {"stocks": SYMBOLS}),
+        "metrics": ("GET", "/metrics", None),
+        # Prophet fits, minutes on a cold cache, opt in with --only analysis
+        "analysis": ("GET", "/stocks/{symbol}/analysis/", None),
+    }
+
+
+DEFAULT_SCENARIOS = [name for name in scenarios() if name != "analysis"]
+
+
+def _configure(args, workdir, servers):
+    os.environ.update({
+        "DJANGO_SETTINGS_MODULE": "benchmarks.settings",
+        "BENCHMARK_DB": os.path.join(workdir, "db.sqlite3"),
+        "SECRET_KEY": "benchmark",
+        "FINNHUB_API_KEY": "benchmark",
+        "POLYGON_API_KEY": "benchmark",
+        "FINNHUB_API_URL": servers["finnhub"].url,
+        "POLYGON_API_URL": servers["polygon"].url,
+        "YAHOO_CHART_URL": servers["yahoo"].url,
+        "HISTORY_DIR": os.path.join(workdir, "history"),
+        "FORECAST_CACHE_DIR": os.path.join(workdir, "forecasts"),
+        "SYMBOL_INDEX_PATH": os.path.join(workdir, "us_symbols.json"),
+        # a backend shared between processes, so token lookups are cached as in production
+        "CACHE_URL": f"filecache://{os.path.join(workdir, 'cache')}",
+    })
+    if args.unthrottled:
+        # measure the app, not the per-process quota it keeps for the real plans
+        for provider in ("FINNHUB", "POLYGON", "YAHOO"):
+            os.environ[f"{provider}_RATE_LIMIT"] = "100000"
+            os.environ[f"{provider}_BURST"] = "1000"
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+    from . import offline_history
+    offline_history.install(latency=args.history_latency)
+
+
+def _create_user():
+    from django.contrib.auth.models import User
+    from rest_framework.authtoken.models import Token
+    from user.models import Stock, UserProfile
+
+    # staff, so the metrics scenario can read /metrics with the same token
+    user = User.objects.create_user("bench", "bench@example.com", "bench-password", first_name="Bench", last_name="User",
+                                    is_staff=True)
+    profile = UserProfile.objects.create(user=user)
+    profile.portfolio.set([Stock.objects.get_or_create(ticker=sym, defaults={"name": sym})[0] for sym in PORTFOLIO])
+    profile.watchlist.set([Stock.objects.get_or_create(ticker=sym, defaults={"name": sym})[0] for sym in WATCHLIST])
+    return Token.objects.create(user=user).key
+
+
+def _upstream_calls(servers):
+    from . import offline_history
+    counts = Counter()
+    for name, server in servers.items():
+        for route, count in server.calls.items():
+            counts[f"{name}.{route}"] += count
+    for kind, count in offline_history.calls.items():
+        counts[f"yfinance.{kind}"] += count
+    return counts
+
+
+def run_scenario(name, token, concurrency, requests):
+    from django.test import Client
+
+    method, template, body = scenarios()[name]
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "client"):
+            local.client = Client(HTTP_AUTHORIZATION=f"Token {token}")
+        symbol = SYMBOLS[i % len(SYMBOLS)]
+        path = template.format(symbol=symbol, prefix=symbol[:2], action=("add", "remove")[i % 2])
+
+        started = time.perf_counter()
+        if method == "GET":
+            response = local.client.get(path)
+        else:
+            response = local.client.post(path, data=json.dumps(body), content_type="application/json")
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([latency for latency, _ in outcomes]) * 1000
+    statuses = Counter(status for _, status in outcomes)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(latencies.max()), 2),
+        "throughput_rps": round(requests / elapsed, 1),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": dict(statuses),
+    }
+
+
+def _print_table(results):
+    header = f"{'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}  upstream calls"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        calls = ", ".join(f"{route}={count}" for route, count in sorted(r["upstream_calls"].items())) or "-"
+        print(f"{r['scenario']:<20}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['throughput_rps']:>10}{r['errors']:>8}  {calls}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--only", help=f"comma separated scenarios, default: {','.join(DEFAULT_SCENARIOS)}")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls failing with 500")
+    parser.add_argument("--rate-limit", type=int, default=0, help="upstream requests per minute before 429, 0 for none")
+    parser.add_argument("--history-latency", type=float, default=0.3, help="seconds per yfinance download")
+    parser.add_argument("--unthrottled", action="store_true", help="lift the app's own upstream rate limits")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else DEFAULT_SCENARIOS
+    unknown = set(names) - set(scenarios())
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    config = UpstreamConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, rate_limit=args.rate_limit)
+    servers = start_all(finnhub=config, polygon=config, yahoo=config)
+    workdir = tempfile.mkdtemp(prefix="stock-insights-bench-")
+
+    try:
+        _configure(args, workdir, servers)
+        token = _create_user()
+
+        results = []
+        for name in names:
+            before = _upstream_calls(servers)
+            result = run_scenario(name, token, args.concurrency, args.requests)
+            result["upstream_calls"] = dict(_upstream_calls(servers) - before)
+            results.append(result)
+            print(f"[Bench] {name}: p50 {result['p50_ms']} ms, {result['throughput_rps']} req/s", file=sys.stderr)
+
+        print()
+        _print_table(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"config": vars(args), "results": results}, f, indent=2)
+    finally:
+        for server in servers.values():
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+
+from stockInsights.settings import *  # noqa: F401,F403
+
+
+# The benchmark runner points the upstream URLs and cache directories at its
+# own temporary locations through the environment before Django starts.
+
+DEBUG = False   # keeps Django from recording every query in memory
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ["BENCHMARK_DB"],
+        'OPTIONS': {'timeout': 30},
+    }
+}
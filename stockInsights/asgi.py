@@ -6,6 +6,8 @@ from channels.auth import AuthMiddlewareStack
 from django.core.asgi import get_asgi_application
 from stocks.auth_middleware import TokenAuthMiddleware
 from stocks import routing
+from stocks.scheduler import start_on_startup as start_scheduler
+from stocks.warmup import warm_up_on_startup
 
 
 application = ProtocolTypeRouter({
@@ -16,3 +18,6 @@ application = ProtocolTypeRouter({
         )
     ),
 })
+
+warm_up_on_startup()
+start_scheduler()
@@ -21,6 +21,53 @@ environ.Env.read_env()
 BASE_DIR = Path(__file__).resolve().parent.parent
 FINNHUB_API_KEY = os.getenv("FINNHUB_API_KEY")
 POLYGON_API_KEY = os.getenv("POLYGON_API_KEY")
+FINNHUB_API_URL = os.getenv("FINNHUB_API_URL", "https://finnhub.io/api/v1")
+POLYGON_API_URL = os.getenv("POLYGON_API_URL", "https://api.polygon.io")
+YAHOO_CHART_URL = os.getenv("YAHOO_CHART_URL", "https://query1.finance.yahoo.com/v8/finance/chart")
+
+# Upstream quotas per process (requests per minute and burst size), keep the
+# sum across worker processes within the plan limits of each provider
+FINNHUB_RATE_LIMIT = int(os.getenv("FINNHUB_RATE_LIMIT", 60))
+FINNHUB_BURST = int(os.getenv("FINNHUB_BURST", 30))
+POLYGON_RATE_LIMIT = int(os.getenv("POLYGON_RATE_LIMIT", 5))
+POLYGON_BURST = int(os.getenv("POLYGON_BURST", 5))
+YAHOO_RATE_LIMIT = int(os.getenv("YAHOO_RATE_LIMIT", 120))
+YAHOO_BURST = int(os.getenv("YAHOO_BURST", 10))
+UPSTREAM_TIMEOUT = 10           # seconds per upstream HTTP call
+UPSTREAM_QUEUE_TIMEOUT = 15     # seconds a call may wait for a rate limit slot
+UPSTREAM_POOL_SIZE = 16         # keep-alive connections per provider
+
+# On-disk cache for fitted forecast models and their forecast frames
+FORECAST_CACHE_DIR = Path(os.getenv("FORECAST_CACHE_DIR", BASE_DIR / 'cache' / 'forecasts'))
+
+# Number of processes fitting Prophet models in the background
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", 2))
+
+# Per-symbol daily OHLCV history files shared by the predictor and chart views
+HISTORY_DIR = Path(os.getenv("HISTORY_DIR", BASE_DIR / 'cache' / 'history'))
+
+# Request profiling (stocks/profiling.py): profile 1 in PROFILE_SAMPLE_RATE
+# /stocks/ requests, 0 to only profile staff requests that ask for it; the
+# newest PROFILE_KEEP profiles are kept in PROFILE_DIR
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", BASE_DIR / 'cache' / 'profiles'))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 200))
+
+# Run stocks.warmup (imports, home page caches, forecast workers) when a
+# worker loads the WSGI/ASGI application, before it takes traffic
+WARMUP_ON_STARTUP = env.bool("WARMUP_ON_STARTUP", default=False)
+
+# Refresh home page quotes, indices and popular details in the background on a
+# market-hours cadence (stocks/scheduler.py). One worker, elected through a lock
+# file in SCHEDULER_DIR, does the refreshing; the others load its snapshot
+REFRESH_SCHEDULER = env.bool("REFRESH_SCHEDULER", default=False)
+SCHEDULER_DIR = Path(os.getenv("SCHEDULER_DIR", BASE_DIR / 'cache' / 'scheduler'))
+
+# Bearer token for scraping /metrics; without it only staff users can read it
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Snapshot of the US symbol list behind the local search index
+SYMBOL_INDEX_PATH = Path(os.getenv("SYMBOL_INDEX_PATH", BASE_DIR / 'cache' / 'us_symbols.json'))
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -60,6 +107,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'stocks.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -86,6 +134,29 @@ TEMPLATES = [
 WSGI_APPLICATION = 'stockInsights.wsgi.application'
 ASGI_APPLICATION = "stockInsights.asgi.application"
 
+# Channel layer used to fan out the shared Finnhub feed to websocket consumers.
+# Each process opens its own upstream Finnhub socket (stocks.feed.price_feed is
+# a module global) and pushes only to the consumers it serves; a shared layer
+# such as channels_redis does not change that.
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer"
+    }
+}
+
+# Upper bound on price pushes per second sent to each websocket client
+STREAM_MAX_PUSH_RATE = float(os.getenv("STREAM_MAX_PUSH_RATE", 1))
+
+
+# Django's cache, where token lookups and profile payloads are cached so that
+# every worker sees a logout or a list change (stocks.cache.SharedCache) once
+# the backend is shared between processes, e.g. CACHE_URL=redis://127.0.0.1:6379/1.
+# With the per-process default each worker caches them in memory for 30
+# seconds, so a logout can take that long to reach the other workers.
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
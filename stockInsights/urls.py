@@ -3,10 +3,12 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 from . import views
+from stocks import views as stocks_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('test/', views.test, name="test"),
     path('user/', include('user.urls')),
-    path('stocks/', include('stocks.urls'))
+    path('stocks/', include('stocks.urls')),
+    path('metrics', stocks_views.metrics, name='metrics')
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stockInsights.settings')
 
 application = get_wsgi_application()
+
+# imported once the settings are configured, the stocks modules read them at import
+from stocks.scheduler import start_on_startup as start_scheduler  # noqa: E402
+from stocks.warmup import warm_up_on_startup  # noqa: E402
+
+warm_up_on_startup()
+start_scheduler()
@@ -0,0 +1,93 @@
+import asyncio
+
+from django.conf import settings
+
+from . import finnhub_service, symbol_index
+from .cache import cached_async
+from .concurrency import fan_out_async
+from .finnhub_service import INDEX_LABELS, build_company_details, build_home_stocks, build_lookup, collect_index_data, index_change
+from .upstream import finnhub_api, yahoo_api
+
+
+# Non-blocking counterparts of finnhub_service for the async views. They call the
+# REST APIs directly over httpx and share the caches of the sync functions.
+
+
+async def _finnhub(path, **params):
+    params["token"] = settings.FINNHUB_API_KEY
+    response = await finnhub_api.aget(f"{settings.FINNHUB_API_URL}{path}", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+@cached_async(finnhub_service.get_quote)
+async def get_quote(symbol):
+    return await _finnhub("/quote", symbol=symbol)
+
+
+@cached_async(finnhub_service.get_company_profile)
+async def get_company_profile(symbol):
+    return await _finnhub("/stock/profile2", symbol=symbol)
+
+
+@cached_async(finnhub_service.get_recommendation_trends)
+async def get_recommendation_trends(symbol):
+    return await _finnhub("/stock/recommendation", symbol=symbol)
+
+
+async def is_market_open():
+    # computed from the local NYSE calendar, nothing to wait for
+    return finnhub_service.is_market_open()
+
+
+async def get_index_quote(symbol):
+    # the same daily closes yfinance reads, straight from Yahoo's chart API
+    response = await yahoo_api.aget(f"{settings.YAHOO_CHART_URL}/{symbol}", params={"range": "5d", "interval": "1d"})
+    response.raise_for_status()
+    result = response.json()["chart"]["result"][0]
+    closes = [close for close in result["indicators"]["quote"][0]["close"] if close is not None]
+    return index_change(closes)
+
+
+@cached_async(finnhub_service.get_index_data)
+async def get_index_data():
+    fetched = await fan_out_async({symbol: get_index_quote(symbol) for symbol in INDEX_LABELS})
+    return collect_index_data(fetched)
+
+
+async def get_company_details(symbol):
+    symbol = symbol.upper()
+    # all three are needed, so the first failure fails the request like the sync view
+    profile, recommendation_data, price = await asyncio.gather(
+        get_company_profile(symbol),
+        get_recommendation_trends(symbol),
+        get_quote(symbol),
+    )
+    if profile:
+        finnhub_service.note_details_request(symbol)
+    return build_company_details(symbol, profile, recommendation_data, price)
+
+
+@cached_async(finnhub_service.search_upstream)
+async def search_upstream(query):
+    data = await _finnhub("/search", q=query, exchange="US")
+    return [
+        {"description": item.get("description"), "symbol": item.get("symbol")}
+        for item in data.get("result", [])
+    ]
+
+
+async def get_stocks(symbol, limit=10):
+    results = symbol_index.search(symbol, limit)
+    if not results:
+        results = (await search_upstream(symbol))[:limit]
+    return build_lookup(results)
+
+
+async def get_home_stocks(symbols):
+    calls = {}
+    for sym in symbols:
+        calls[(sym, "quote")] = get_quote(sym)
+        calls[(sym, "profile")] = get_company_profile(sym)
+    fetched = await fan_out_async(calls)
+    return build_home_stocks(symbols, fetched)
@@ -0,0 +1,142 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import exceptions
+from user.authentication import CachedTokenAuthentication, acached_credentials
+
+from . import async_service
+from .charts import get_candles_async, to_json as candles_to_json, ChartError
+from .finnhub_service import HOME_STOCKS
+from .profiling import phase
+from .upstream import UpstreamBusy
+
+
+# Async-native versions of the read-only stocks endpoints. DRF's @api_view is
+# sync only, so these are plain Django async views doing the same token check;
+# under ASGI an upstream wait no longer pins a worker thread.
+
+
+@sync_to_async
+def _authenticate_db(request):
+    try:
+        user_auth_tuple = CachedTokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return None
+    return user_auth_tuple[0] if user_auth_tuple else None
+
+
+async def _authenticate(request):
+    # a cached token is answered from the shared cache, only misses query the database
+    parts = request.headers.get("Authorization", "").split()
+    if len(parts) == 2 and parts[0] == CachedTokenAuthentication.keyword:
+        credentials = await acached_credentials(parts[1])
+        if credentials is not None:
+            return credentials[0]
+    return await _authenticate_db(request)
+
+
+def async_api_view(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != "GET":
+            return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+        with phase("auth"):
+            user = await _authenticate(request)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        request.user = user
+
+        try:
+            return await view(request, *args, **kwargs)
+        except UpstreamBusy as e:
+            return JsonResponse({"detail": str(e)}, status=503)
+
+    return wrapper
+
+
+@async_api_view
+async def index_data(request):
+    try:
+        indices_data = await async_service.get_index_data()
+        market_status = await async_service.is_market_open()
+        return JsonResponse({
+            "indices_data": indices_data,
+            "market_status": market_status
+            })
+    except UpstreamBusy:
+        raise
+    except Exception as e:
+        return JsonResponse({"detail": f"Error fetching index data: {str(e)}"}, status=500)
+
+
+@async_api_view
+async def stock_details(request, symbol):
+    try:
+        data = await async_service.get_company_details(symbol)
+        return JsonResponse(data)
+    except UpstreamBusy:
+        raise
+    except Exception as e:
+        return JsonResponse({"detail": f"Error fetching stock data: {str(e)}"}, status=500)
+
+
+@async_api_view
+async def stock_lookup(request, symbol):
+    try:
+        limit = min(max(int(request.GET.get("limit", 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({"detail": "limit must be an integer"}, status=400)
+
+    try:
+        data = await async_service.get_stocks(symbol, limit)
+        return JsonResponse(data)
+    except UpstreamBusy:
+        raise
+    except Exception as e:
+        return JsonResponse({"detail": f"Error fetching stock data: {str(e)}"}, status=500)
+
+
+@async_api_view
+async def home_stocks(request):
+    try:
+        data = await async_service.get_home_stocks(HOME_STOCKS)
+        return JsonResponse(data)
+    except Exception as e:
+        return JsonResponse({"detail": f"Error fetching stocks: {str(e)}"}, status=500)
+
+
+@async_api_view
+async def get_stock_chart(request, symbol):
+    params = request.GET
+
+    try:
+        points = int(params["points"]) if params.get("points") else None
+    except ValueError:
+        points = 0
+    if points is not None and points < 2:
+        return JsonResponse({"error": "points must be an integer of at least 2"}, status=400)
+
+    try:
+        with phase("compute"):
+            interval, candles = await get_candles_async(
+                symbol,
+                range_=params.get("range", "1M"),
+                interval=params.get("interval"),
+                points=points,
+                downsample=params.get("downsample", "ohlc"),
+            )
+            candles = candles_to_json(candles, columns=params.get("format") == "columns")
+        return JsonResponse({
+            "symbol": symbol,
+            "range": params.get("range", "1M"),
+            "interval": interval,
+            "candles": candles
+        })
+    except ChartError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except UpstreamBusy:
+        raise
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
@@ -0,0 +1,100 @@
+import threading
+
+import numpy as np
+
+from .charts import CANDLE_FIELDS, empty_candles
+
+
+# bar resolution -> seconds
+RESOLUTIONS = {"1s": 1, "1m": 60, "5m": 300}
+BAR_CAPACITY = 1024     # bars kept per symbol and resolution: ~17 min of 1s, ~17 h of 1m, ~3.5 days of 5m
+
+
+class BarRing:
+    """
+    The last `capacity` OHLCV bars of one resolution in preallocated arrays.
+
+    A trade either updates the newest bar in place or overwrites the oldest
+    slot with a new bar, so ticks never allocate.
+    """
+
+    def __init__(self, seconds, capacity=BAR_CAPACITY):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.time = np.zeros(capacity, dtype=np.int64)     # bar start, epoch seconds
+        self.open = np.zeros(capacity)
+        self.high = np.zeros(capacity)
+        self.low = np.zeros(capacity)
+        self.close = np.zeros(capacity)
+        self.volume = np.zeros(capacity)
+        self.head = -1      # slot of the newest bar
+        self.count = 0
+
+    def add(self, ts, price, volume):
+        start = ts - ts % self.seconds
+        head = self.head
+
+        if self.count and start == self.time[head]:
+            if price > self.high[head]:
+                self.high[head] = price
+            if price < self.low[head]:
+                self.low[head] = price
+            self.close[head] = price
+            self.volume[head] += volume
+        elif not self.count or start > self.time[head]:
+            head = self.head = (head + 1) % self.capacity
+            self.time[head] = start
+            self.open[head] = self.high[head] = self.low[head] = self.close[head] = price
+            self.volume[head] = volume
+            self.count = min(self.count + 1, self.capacity)
+        # trades older than the newest bar arrive late and out of order; they are dropped
+
+    def candles(self, since=None):
+        """Bars oldest first as chart candle columns, optionally only those starting at or after `since`."""
+        if not self.count:
+            return empty_candles("s")
+        # unroll the ring: the oldest bar sits right after head once it has wrapped around
+        order = np.arange(self.head - self.count + 1, self.head + 1) % self.capacity
+        if since is not None:
+            order = order[self.time[order] >= since]
+        return {
+            "time": self.time[order].astype("datetime64[s]"),
+            **{field: getattr(self, field)[order] for field in CANDLE_FIELDS[1:]},
+        }
+
+
+class BarEngine:
+    """Rolls live trades into 1s/1m/5m bars per symbol."""
+
+    def __init__(self):
+        self._rings = {}    # symbol -> {resolution: BarRing}
+        self._lock = threading.Lock()   # readers run on request threads, trades on the event loop
+
+    def add_trades(self, trades):
+        # trades as Finnhub sends them: {"s": symbol, "p": price, "t": ms timestamp, "v": volume}
+        with self._lock:
+            for item in trades:
+                rings = self._rings.get(item["s"])
+                if rings is None:
+                    rings = self._rings[item["s"]] = {
+                        resolution: BarRing(seconds) for resolution, seconds in RESOLUTIONS.items()
+                    }
+                ts = item["t"] // 1000
+                for ring in rings.values():
+                    ring.add(ts, item["p"], item.get("v") or 0)
+
+    def candles(self, symbol, resolution, since=None):
+        """Candles for a streamed symbol, None when no trade for it has been seen."""
+        with self._lock:
+            rings = self._rings.get(symbol)
+            if rings is None:
+                return None
+            return rings[resolution].candles(since)
+
+    def drop(self, symbol):
+        # once a symbol is unsubscribed its bars would silently develop gaps
+        with self._lock:
+            self._rings.pop(symbol, None)
+
+
+bar_engine = BarEngine()
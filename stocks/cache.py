@@ -0,0 +1,292 @@
+import time
+import asyncio
+import weakref
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from . import metrics, upstream
+from .singleflight import SingleFlight
+
+
+# small shared pool for stale-while-revalidate refreshes
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+_refresh_tasks = set()     # strong refs so pending async refreshes aren't collected
+
+_MISSING = object()
+
+_caches = weakref.WeakSet()     # every live TTLCache, for the hit/miss metrics
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with a per-entry TTL and LRU eviction.
+
+    Entries stay usable as stale values for `stale_ttl` seconds after they expire,
+    which lets callers answer from memory while a refresh runs in the background.
+    """
+
+    def __init__(self, name, ttl, maxsize=256, stale_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()     # key -> (value, expires_at, stale_until)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = self.stale_hits = self.misses = 0
+        _caches.add(self)
+
+    def lookup(self, key):
+        """Returns (value, is_fresh); value is _MISSING when nothing usable is cached."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING, False
+            value, expires_at, stale_until = entry
+            if now >= stale_until:
+                del self._data[key]
+                self.misses += 1
+                return _MISSING, False
+            self._data.move_to_end(key)
+            if now < expires_at:
+                self.hits += 1
+                return value, True
+            self.stale_hits += 1
+            return value, False
+
+    def get(self, key, default=None):
+        value, _ = self.lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now + ttl, now + ttl + self.stale_ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def fresh_items(self):
+        """(key, value, seconds left) of every entry that hasn't expired yet."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value, expires_at - now)
+                    for key, (value, expires_at, _) in self._data.items() if expires_at > now]
+
+    def __len__(self):
+        return len(self._data)
+
+    def refresh_async(self, key, loader):
+        # only one background refresh per key at a time
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                # refreshes yield to interactive requests for upstream quota
+                with upstream.background():
+                    value = loader()
+                self.set(key, value)
+            except Exception as e:
+                # keep serving the stale value, the next stale hit retries
+                print(f"[Cache] Refresh failed for {self.name}{key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        _refresh_pool.submit(run)
+
+    def refresh_task(self, key, loader):
+        # event loop flavour of refresh_async, `loader` returns a coroutine
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def run():
+            try:
+                with upstream.background():
+                    value = await loader()
+                self.set(key, value)
+            except Exception as e:
+                print(f"[Cache] Refresh failed for {self.name}{key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(run())
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+
+
+class SharedCache:
+    """
+    Per-entry TTL cache in Django's default cache (CACHES), for entries that
+    must be evicted in every worker at once: a delete in one process is seen by
+    all of them.
+
+    When that backend is per process (the local memory or dummy default) the
+    entries go to a bounded in-process TTLCache instead. A delete then only
+    reaches the worker that made it, so those entries live for the shorter
+    `local_ttl`, which bounds how long another worker can serve an evicted one.
+    """
+
+    def __init__(self, name, ttl, local_ttl=None, maxsize=1024):
+        self.name = name
+        self.ttl = ttl
+        self.local = TTLCache(name, ttl if local_ttl is None else local_ttl, maxsize=maxsize)
+        self.hits = self.stale_hits = self.misses = 0
+        _caches.discard(self.local)     # its lookups are counted here
+        _caches.add(self)
+
+    @property
+    def enabled(self):
+        """True when entries go to a backend shared between processes."""
+        from django.core.cache import caches
+        from django.core.cache.backends.dummy import DummyCache
+        from django.core.cache.backends.locmem import LocMemCache
+
+        return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+    def _key(self, key):
+        return f"{self.name}:{key}"
+
+    def _count(self, value, default):
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def get(self, key, default=None):
+        from django.core.cache import cache
+
+        value = cache.get(self._key(key), _MISSING) if self.enabled else self.local.lookup(key)[0]
+        return self._count(value, default)
+
+    async def aget(self, key, default=None):
+        from django.core.cache import cache
+
+        value = await cache.aget(self._key(key), _MISSING) if self.enabled else self.local.lookup(key)[0]
+        return self._count(value, default)
+
+    def set(self, key, value, ttl=None):
+        from django.core.cache import cache
+
+        if self.enabled:
+            cache.set(self._key(key), value, self.ttl if ttl is None else ttl)
+        else:
+            self.local.set(key, value, None if ttl is None else min(ttl, self.local.ttl))
+
+    def delete(self, key):
+        from django.core.cache import cache
+
+        if self.enabled:
+            cache.delete(self._key(key))
+        self.local.delete(key)
+
+
+def cached(ttl, stale_ttl=0, maxsize=256, name=None):
+    """
+    Memoizes a function on its positional arguments.
+
+    Fresh hits return immediately, stale hits return the old value and schedule a
+    background refresh, misses call through. Exceptions are never cached.
+    Concurrent misses and refreshes for the same arguments share one call.
+
+    `wrapper.refresh(*args, ttl=None)` calls through and stores the result, for
+    callers that keep entries warm ahead of requests.
+    """
+    def decorator(fn):
+        cache = TTLCache(name or fn.__name__, ttl, maxsize=maxsize, stale_ttl=stale_ttl)
+        flight = SingleFlight(cache.name)
+
+        def load(args):
+            return flight.do(args, lambda: fn(*args))
+
+        def refresh(*args, ttl=None):
+            value = load(args)
+            cache.set(args, value, ttl=ttl)
+            return value
+
+        @wraps(fn)
+        def wrapper(*args):
+            value, fresh = cache.lookup(args)
+            if value is not _MISSING:
+                if not fresh:
+                    cache.refresh_async(args, lambda: load(args))
+                return value
+
+            value = load(args)
+            cache.set(args, value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.flight = flight
+        wrapper.refresh = refresh
+        return wrapper
+
+    return decorator
+
+
+def cached_async(sync_fn):
+    """
+    Async twin of a @cached function: the decorated coroutine shares the cache of
+    `sync_fn`, so the sync and async views warm the same entries. Concurrent
+    misses on one event loop share one call.
+    """
+    cache = sync_fn.cache
+    flight = sync_fn.flight
+
+    def decorator(fn):
+        def load(args):
+            return flight.do_async(args, lambda: fn(*args))
+
+        @wraps(fn)
+        async def wrapper(*args):
+            value, fresh = cache.lookup(args)
+            if value is not _MISSING:
+                if not fresh:
+                    cache.refresh_task(args, lambda: load(args))
+                return value
+
+            value = await load(args)
+            cache.set(args, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+@metrics.collector
+def _cache_metrics():
+    lookups, sizes = {}, {}
+    for cache in list(_caches):
+        for result, count in (("hit", cache.hits), ("stale", cache.stale_hits), ("miss", cache.misses)):
+            lookups[(cache.name, result)] = lookups.get((cache.name, result), 0) + count
+        if isinstance(cache, TTLCache):     # a SharedCache's entries live in the cache backend
+            sizes[cache.name] = sizes.get(cache.name, 0) + len(cache)
+    return [
+        ("cache_lookups_total", "counter", "Cache lookups by result (fresh hit, stale hit, miss).",
+         [({"cache": name, "result": result}, count) for (name, result), count in sorted(lookups.items())]),
+        ("cache_entries", "gauge", "Entries currently held per in-memory cache.",
+         [({"cache": name}, size) for name, size in sorted(sizes.items())]),
+    ]
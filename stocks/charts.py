@@ -0,0 +1,276 @@
+import asyncio
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+
+from . import history_store
+from .cache import TTLCache
+from .upstream import polygon_api
+
+
+# range -> (calendar days covered, default interval)
+RANGES = {
+    "1D": (1, "5m"),
+    "5D": (5, "15m"),
+    "1M": (30, "1d"),
+    "3M": (91, "1d"),
+    "6M": (182, "1d"),
+    "1Y": (365, "1d"),
+    "5Y": (1826, "1w"),
+}
+
+# intraday intervals come from Polygon as (multiplier, timespan)
+INTRADAY_INTERVALS = {
+    "1m": (1, "minute"),
+    "5m": (5, "minute"),
+    "15m": (15, "minute"),
+    "30m": (30, "minute"),
+    "1h": (1, "hour"),
+}
+DAILY_INTERVALS = ("1d", "1w")
+MAX_INTRADAY_DAYS = 31
+
+CANDLE_FIELDS = ("time", "open", "high", "low", "close", "volume")
+
+# intraday candle arrays per (symbol, interval, day); finished days don't change
+_intraday = TTLCache("intraday_candles", ttl=24 * 60 * 60, maxsize=2048)
+TODAY_TTL = 60
+
+
+class ChartError(ValueError):
+    pass
+
+
+def empty_candles(unit="m"):
+    """Candle columns without any candle, times in datetime64 `unit`."""
+    return {
+        "time": np.empty(0, dtype=f"datetime64[{unit}]"),
+        **{field: np.empty(0) for field in CANDLE_FIELDS[1:]},
+    }
+
+
+def _concat(parts):
+    if not parts:
+        return empty_candles()
+    return {field: np.concatenate([part[field] for part in parts]) for field in CANDLE_FIELDS}
+
+
+def _slice(candles, index):
+    return {field: values[index] for field, values in candles.items()}
+
+
+def _polygon_request(symbol, interval, start, end):
+    multiplier, timespan = INTRADAY_INTERVALS[interval]
+    url = f"{settings.POLYGON_API_URL}/v2/aggs/ticker/{symbol}/range/{multiplier}/{timespan}/{start}/{end}"
+    params = {"adjusted": "true", "sort": "asc", "limit": 50000, "apiKey": settings.POLYGON_API_KEY}
+    return url, params
+
+
+def _parse_polygon(payload):
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(payload.get("results", []), columns=["t", "o", "h", "l", "c", "v"])
+    return {
+        "time": frame["t"].to_numpy("int64").astype("datetime64[ms]").astype("datetime64[m]"),
+        "open": frame["o"].to_numpy(float),
+        "high": frame["h"].to_numpy(float),
+        "low": frame["l"].to_numpy(float),
+        "close": frame["c"].to_numpy(float),
+        "volume": frame["v"].to_numpy(float),
+    }
+
+
+def _fetch_polygon(symbol, interval, start, end):
+    url, params = _polygon_request(symbol, interval, start, end)
+    resp = polygon_api.get(url, params=params)
+    resp.raise_for_status()
+    return _parse_polygon(resp.json())
+
+
+async def _fetch_polygon_async(symbol, interval, start, end):
+    url, params = _polygon_request(symbol, interval, start, end)
+    resp = await polygon_api.aget(url, params=params)
+    resp.raise_for_status()
+    return _parse_polygon(resp.json())
+
+
+def _cached_days(symbol, interval, start, end):
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    cached = {day: _intraday.get((symbol, interval, day)) for day in days}
+    missing = [day for day, candles in cached.items() if candles is None]
+    return cached, missing
+
+
+def _fill_days(symbol, interval, cached, missing, fetched):
+    # split one upstream response covering every missing day into per-day entries
+    fetched_days = fetched["time"].astype("datetime64[D]")
+    for day in missing:
+        candles = _slice(fetched, fetched_days == np.datetime64(day, "D"))
+        ttl = TODAY_TTL if day >= date.today() else None
+        _intraday.set((symbol, interval, day), candles, ttl=ttl)
+        cached[day] = candles
+    return _concat(list(cached.values()))
+
+
+def intraday_candles(symbol, interval, start, end):
+    symbol = symbol.upper()
+    cached, missing = _cached_days(symbol, interval, start, end)
+    fetched = _fetch_polygon(symbol, interval, missing[0], missing[-1]) if missing else empty_candles()
+    return _fill_days(symbol, interval, cached, missing, fetched)
+
+
+async def intraday_candles_async(symbol, interval, start, end):
+    symbol = symbol.upper()
+    cached, missing = _cached_days(symbol, interval, start, end)
+    fetched = await _fetch_polygon_async(symbol, interval, missing[0], missing[-1]) if missing else empty_candles()
+    return _fill_days(symbol, interval, cached, missing, fetched)
+
+
+def daily_candles(symbol, start, weekly=False):
+    bars = history_store.load(symbol)
+    first = np.searchsorted(bars["date"], np.datetime64(start, "D"))
+    candles = {
+        "time": bars["date"][first:],
+        "open": bars["open"][first:],
+        "high": bars["high"][first:],
+        "low": bars["low"][first:],
+        "close": bars["close"][first:],
+        "volume": bars["volume"][first:],
+    }
+    if not weekly or len(candles["time"]) == 0:
+        return candles
+
+    # Monday based weeks, the epoch (1970-01-01) was a Thursday
+    week = (candles["time"].astype("int64") + 3) // 7
+    starts = np.flatnonzero(np.diff(week, prepend=week[0] - 1))
+    return _aggregate(candles, starts)
+
+
+def _aggregate(candles, starts):
+    ends = np.append(starts[1:], len(candles["time"])) - 1
+    return {
+        "time": candles["time"][starts],
+        "open": candles["open"][starts],
+        "high": np.maximum.reduceat(candles["high"], starts),
+        "low": np.minimum.reduceat(candles["low"], starts),
+        "close": candles["close"][ends],
+        "volume": np.add.reduceat(candles["volume"], starts),
+    }
+
+
+def bucket_ohlc(candles, points):
+    """Merges consecutive candles into `points` OHLC buckets of near equal size."""
+    n = len(candles["time"])
+    if points >= n:
+        return candles
+    starts = np.unique(np.linspace(0, n, points, endpoint=False).astype(int))
+    return _aggregate(candles, starts)
+
+
+def lttb(candles, points):
+    """
+    Largest-Triangle-Three-Buckets over the close series. Keeps the candles that
+    best preserve the visual shape of a line chart.
+    """
+    n = len(candles["time"])
+    if points >= n or points < 3:
+        return candles
+
+    x = np.arange(n, dtype=float)
+    y = candles["close"]
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket is the third corner of the triangle
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        area = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(area.argmax())
+        selected[i + 1] = previous
+
+    return _slice(candles, selected)
+
+
+def _resolve(range_, interval):
+    if range_ not in RANGES:
+        raise ChartError(f"Unknown range '{range_}', expected one of {', '.join(RANGES)}")
+    days, default_interval = RANGES[range_]
+    interval = interval or default_interval
+
+    if interval in INTRADAY_INTERVALS:
+        if days > MAX_INTRADAY_DAYS:
+            raise ChartError(f"Intraday intervals are limited to ranges up to {MAX_INTRADAY_DAYS} days")
+    elif interval not in DAILY_INTERVALS:
+        raise ChartError(f"Unknown interval '{interval}'")
+
+    end = date.today()
+    return interval, end - timedelta(days=days), end
+
+
+def _downsample(candles, points, downsample):
+    if not points:
+        return candles
+    if downsample == "lttb":
+        return lttb(candles, points)
+    if downsample == "ohlc":
+        return bucket_ohlc(candles, points)
+    raise ChartError(f"Unknown downsample method '{downsample}', expected 'ohlc' or 'lttb'")
+
+
+def get_candles(symbol, range_="1M", interval=None, points=None, downsample="ohlc"):
+    interval, start, end = _resolve(range_, interval)
+
+    if interval in DAILY_INTERVALS:
+        candles = daily_candles(symbol, start, weekly=interval == "1w")
+    elif range_ == "1D":
+        # most recent session with data, stepping back over weekends and holidays
+        for _ in range(5):
+            candles = intraday_candles(symbol, interval, end, end)
+            if len(candles["time"]):
+                break
+            end -= timedelta(days=1)
+    else:
+        candles = intraday_candles(symbol, interval, start, end)
+
+    return interval, _downsample(candles, points, downsample)
+
+
+async def get_candles_async(symbol, range_="1M", interval=None, points=None, downsample="ohlc"):
+    interval, start, end = _resolve(range_, interval)
+
+    if interval in DAILY_INTERVALS:
+        # history store updates go through yfinance, keep them off the event loop
+        candles = await asyncio.to_thread(daily_candles, symbol, start, interval == "1w")
+    elif range_ == "1D":
+        for _ in range(5):
+            candles = await intraday_candles_async(symbol, interval, end, end)
+            if len(candles["time"]):
+                break
+            end -= timedelta(days=1)
+    else:
+        candles = await intraday_candles_async(symbol, interval, start, end)
+
+    return interval, _downsample(candles, points, downsample)
+
+
+def to_json(candles, columns=False):
+    # one vectorized conversion per column, then plain Python lists
+    dates = np.datetime_as_string(candles["time"])
+    values = {field: candles[field].tolist() for field in CANDLE_FIELDS[1:]}
+    if columns:
+        return {"date": dates.tolist(), **values}
+    return [
+        {"date": d, "open": o, "high": h, "low": l, "close": c, "volume": v}
+        for d, o, h, l, c, v in zip(dates.tolist(), values["open"], values["high"],
+                                    values["low"], values["close"], values["volume"])
+    ]
@@ -0,0 +1,67 @@
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from .profiling import phase
+
+
+FAN_OUT_WORKERS = 16    # upper bound on concurrent upstream calls per process
+FAN_OUT_TIMEOUT = 8     # seconds before a call is given up on
+
+_pool = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix="fan-out")
+
+
+def fan_out(calls, timeout=FAN_OUT_TIMEOUT):
+    """
+    Runs a batch of blocking calls concurrently on a bounded thread pool.
+
+    `calls` maps a key to a zero-argument callable. Returns a dict with the result
+    of every call that finished within `timeout`; failed or timed out calls are
+    left out so callers can build a partial response.
+
+    Callables run in a copy of the caller's context (contextvars) and must not
+    call fan_out themselves, nested batches could exhaust the pool and wait on
+    each other.
+    """
+    results = {}
+    # the wait is upstream time of the request; the calls run in a copy of the
+    # caller's context taken inside this phase, so they keep its upstream
+    # priority (background refreshes) and their own upstream phases are part of it
+    with phase("upstream"):
+        futures = {key: _pool.submit(contextvars.copy_context().run, call) for key, call in calls.items()}
+        deadline = time.monotonic() + timeout
+
+        for key, future in futures.items():
+            try:
+                results[key] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except TimeoutError:
+                future.cancel()
+                print(f"[FanOut] Timed out: {key}")
+            except Exception as e:
+                print(f"[FanOut] Failed: {key}: {e}")
+
+    return results
+
+
+async def fan_out_async(calls, timeout=FAN_OUT_TIMEOUT):
+    """
+    Event loop version of fan_out: `calls` maps a key to a coroutine. All of them
+    run concurrently and the ones that failed or missed `timeout` are left out.
+    """
+    keys = list(calls)
+    with phase("upstream"):
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(call, timeout) for call in calls.values()),
+            return_exceptions=True,
+        )
+
+    results = {}
+    for key, outcome in zip(keys, outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            print(f"[FanOut] Timed out: {key}")
+        elif isinstance(outcome, Exception):
+            print(f"[FanOut] Failed: {key}: {outcome}")
+        else:
+            results[key] = outcome
+    return results
@@ -1,23 +1,39 @@
-import os
+import re
 import json
-import asyncio
-import websockets
-from datetime import datetime
 
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from .bars import RESOLUTIONS, bar_engine
+from .charts import to_json as candles_to_json
+from .feed import HOME_PAGE_SYMBOLS, price_feed
 
-API_KEY = os.getenv("FINNHUB_API_KEY")
-FINNHUB_WS_URL = f"wss://ws.finnhub.io?token={API_KEY}"
 
-# defining 15 ticker symbols to display
-HOME_PAGE_SYMBOLS = [
-    "AAPL", "MSFT", "NVDA", "TSLA", "AMD",         # Tech
-    "JNJ", "PFE", "MRNA", "UNH", "LLY",            # Healthcare
-    "BINANCE:BTCUSDT", "BINANCE:ETHUSDT",  "BINANCE:ADAUSDT", "BINANCE:SOLUSDT", "BINANCE:XRPUSDT" 
-]
+MAX_SYMBOLS_PER_CONNECTION = 100
+_SYMBOL = re.compile(r"^[A-Z0-9.:\-]{1,32}$")
+
+
+@database_sync_to_async
+def _profile_symbols(user, source):
+    from user.models import UserProfile
+    from user.profiles import profile_tickers
+
+    try:
+        return profile_tickers(user, source)
+    except UserProfile.DoesNotExist:
+        return []
+
 
 class HomeStockConsumer(AsyncWebsocketConsumer):
+    """
+    Streams live prices for the home page symbols plus whatever the client asks for.
+
+    Clients send {"action": "subscribe" | "unsubscribe", "symbols": [...]}, or
+    {"action": "subscribe", "source": "watchlist" | "portfolio"} to follow their
+    own lists. {"action": "bars", "symbol": ..., "resolution": "1s" | "1m" | "5m"}
+    returns the intraday bars built from the stream.
+    """
+
     async def connect(self):
         from django.contrib.auth.models import AnonymousUser
 
@@ -30,64 +46,86 @@ class HomeStockConsumer(AsyncWebsocketConsumer):
 
         print(f"[Consumer] WebSocket accepted for: {user.username}")
         await self.accept()
-        self.finnhub_task = asyncio.create_task(self.stream_from_finnhub())
+        self.joined = True
+
+        # home page symbols are the default subscription
+        await price_feed.subscribe(self.channel_name, HOME_PAGE_SYMBOLS)
+        # Send initial response with the latest known prices
+        await self.send(text_data=price_feed.snapshot(HOME_PAGE_SYMBOLS))
 
     async def disconnect(self, close_code):
         print(f"[Consumer] Disconnecting WebSocket.")
-        if hasattr(self, 'finnhub_ws'):
-            try:
-                await self.finnhub_ws.close()
-                print("[Finnhub] WebSocket closed.")
-            except Exception as e:
-                print(f"[Finnhub] Error while closing: {e}")
+        if getattr(self, 'joined', False):
+            await price_feed.remove_channel(self.channel_name)
+            self.joined = False
 
-        if hasattr(self, 'finnhub_task'):
-            self.finnhub_task.cancel()
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or "")
+            action = message["action"]
+        except (ValueError, TypeError, KeyError):
+            await self._error("Expected a JSON object with an action")
+            return
 
-    async def stream_from_finnhub(self):
-        all_prices = {symbol: None for symbol in HOME_PAGE_SYMBOLS}
+        if action == "bars":
+            await self._send_bars(message)
+            return
+        if action not in ("subscribe", "unsubscribe"):
+            await self._error(f"Unknown action: {action}")
+            return
 
-        try:
-            print("[Finnhub] Connecting to Finnhub WebSocket...")
-            self.finnhub_ws = await websockets.connect(FINNHUB_WS_URL)
-            print("[Finnhub] Connected.")
-
-            for symbol in HOME_PAGE_SYMBOLS:
-                await self.finnhub_ws.send(json.dumps({"type": "subscribe", "symbol": symbol}))
-                print(f"[Finnhub] Subscribed to {symbol}")
-
-            # Send initial response with all symbols and no prices
-            await self.send(text_data=json.dumps({
-                "timestamp": datetime.now().isoformat(),
-                "data": [{"symbol": sym, "price": None} for sym in HOME_PAGE_SYMBOLS]
-            }))
-
-            while True:
-                try:
-                    message = await asyncio.wait_for(self.finnhub_ws.recv(), timeout=5)
-                    parsed = json.loads(message)
-
-                    if parsed.get("type") == "trade":
-                        for item in parsed.get("data", []):
-                            symbol = item["s"]
-                            price = item["p"]
-                            all_prices[symbol] = price
-                except asyncio.TimeoutError:
-                    pass  # No updates in 5s
-
-                # Send current prices (including symbols with price=None)
-                formatted = [
-                    {"symbol": sym, "price": all_prices[sym]}
-                    for sym in HOME_PAGE_SYMBOLS
-                ]
-
-                await self.send(text_data=json.dumps({
-                    "timestamp": datetime.now().isoformat(),
-                    "data": formatted
-                }))
-
-                await asyncio.sleep(10)
-
-        except Exception as e:
-            print(f"[Finnhub] Error: {e}")
-            await self.send(text_data=json.dumps({"error": str(e)}))
\ No newline at end of file
+        source = message.get("source")
+        if source is not None:
+            if source not in ("watchlist", "portfolio"):
+                await self._error("source must be watchlist or portfolio")
+                return
+            symbols = await _profile_symbols(self.scope["user"], source)
+        else:
+            symbols = message.get("symbols")
+            if not isinstance(symbols, list) or not all(isinstance(sym, str) for sym in symbols):
+                await self._error("symbols must be a list of tickers")
+                return
+
+        symbols = [sym.strip().upper() for sym in symbols]
+        invalid = [sym for sym in symbols if not _SYMBOL.match(sym)]
+        if invalid:
+            await self._error(f"Invalid symbols: {', '.join(invalid)}")
+            return
+
+        if action == "unsubscribe":
+            await price_feed.unsubscribe(self.channel_name, symbols)
+            await self.send(text_data=json.dumps({"type": "unsubscribed", "symbols": symbols}))
+            return
+
+        owned = price_feed.channels.get(self.channel_name, set())
+        if len(owned | set(symbols)) > MAX_SYMBOLS_PER_CONNECTION:
+            await self._error(f"At most {MAX_SYMBOLS_PER_CONNECTION} symbols per connection")
+            return
+
+        added = await price_feed.subscribe(self.channel_name, symbols)
+        await self.send(text_data=json.dumps({"type": "subscribed", "symbols": added}))
+        if added:
+            await self.send(text_data=price_feed.snapshot(added))
+
+    async def _send_bars(self, message):
+        symbol = str(message.get("symbol", "")).upper()
+        resolution = message.get("resolution", "1m")
+        if resolution not in RESOLUTIONS:
+            await self._error(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+            return
+
+        since = message.get("since")
+        candles = bar_engine.candles(symbol, resolution, since if isinstance(since, int) else None)
+        await self.send(text_data=json.dumps({
+            "type": "bars",
+            "symbol": symbol,
+            "resolution": resolution,
+            "candles": candles_to_json(candles, columns=True) if candles is not None else None,
+        }))
+
+    async def _error(self, detail):
+        await self.send(text_data=json.dumps({"type": "error", "detail": detail}))
+
+    async def price_update(self, event):
+        # payload is serialized once per symbol set by the feed, consumers just forward it
+        await self.send(text_data=event["payload"])
@@ -0,0 +1,216 @@
+import os
+import json
+import asyncio
+import websockets
+from datetime import datetime
+
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from . import metrics
+from .bars import bar_engine
+
+
+API_KEY = os.getenv("FINNHUB_API_KEY")
+FINNHUB_WS_URL = f"wss://ws.finnhub.io?token={API_KEY}"
+
+# defining 15 ticker symbols to display
+HOME_PAGE_SYMBOLS = [
+    "AAPL", "MSFT", "NVDA", "TSLA", "AMD",         # Tech
+    "JNJ", "PFE", "MRNA", "UNH", "LLY",            # Healthcare
+    "BINANCE:BTCUSDT", "BINANCE:ETHUSDT",  "BINANCE:ADAUSDT", "BINANCE:SOLUSDT", "BINANCE:XRPUSDT"
+]
+
+RECONNECT_DELAY = 5     # seconds to wait before reconnecting upstream
+
+dropped_updates = metrics.Counter(
+    "websocket_dropped_updates_total", "Price updates dropped because a connection's channel was full.",
+)
+
+
+class FinnhubFeed:
+    """
+    Single upstream Finnhub socket shared by every websocket consumer in the process.
+
+    Connections subscribe to symbols by channel name. Upstream subscriptions are
+    reference counted: a symbol is subscribed on Finnhub when the first
+    connection asks for it and unsubscribed when the last one lets go. A
+    symbol -> channels index routes each change only to the connections that
+    care about it, so the cost grows with distinct symbols rather than users.
+
+    Two tasks run while anyone is connected: the reader drains the upstream
+    socket and coalesces trades into the latest price per symbol, the pusher
+    wakes up on changes and sends each connection the symbols of its own that
+    moved, at most STREAM_MAX_PUSH_RATE times a second.
+    """
+
+    def __init__(self):
+        self.prices = {}
+        self.subscribers = {}   # symbol -> set of channel names
+        self.channels = {}      # channel name -> set of symbols
+        self._ws = None
+        self._dirty = set()
+        self._changed = asyncio.Event()
+        self._tasks = []
+
+    def snapshot(self, symbols):
+        return json.dumps({
+            "type": "snapshot",
+            "timestamp": datetime.now().isoformat(),
+            "data": [{"symbol": sym, "price": self.prices.get(sym)} for sym in symbols]
+        })
+
+    async def subscribe(self, channel_name, symbols):
+        """Adds symbols to a connection, returns the ones that were new for it."""
+        self._start()
+        owned = self.channels.setdefault(channel_name, set())
+        added = [symbol for symbol in dict.fromkeys(symbols) if symbol not in owned]
+
+        for symbol in added:
+            owned.add(symbol)
+            subscribers = self.subscribers.setdefault(symbol, set())
+            subscribers.add(channel_name)
+            if len(subscribers) == 1:
+                # first interest in this symbol, subscribe upstream
+                self.prices.setdefault(symbol, None)
+                await self._send_upstream("subscribe", symbol)
+        return added
+
+    async def unsubscribe(self, channel_name, symbols):
+        owned = self.channels.get(channel_name, set())
+        for symbol in set(symbols) & owned:
+            owned.discard(symbol)
+            subscribers = self.subscribers[symbol]
+            subscribers.discard(channel_name)
+            if not subscribers:
+                # last interest gone, stop paying for the upstream subscription
+                del self.subscribers[symbol]
+                self.prices.pop(symbol, None)
+                bar_engine.drop(symbol)
+                await self._send_upstream("unsubscribe", symbol)
+
+    async def remove_channel(self, channel_name):
+        await self.unsubscribe(channel_name, list(self.channels.get(channel_name, ())))
+        self.channels.pop(channel_name, None)
+        if not self.channels:
+            # nobody is watching, drop the upstream socket until the next connect
+            self._stop()
+
+    def _start(self):
+        if not self._tasks or any(task.done() for task in self._tasks):
+            self._stop()
+            # the event must belong to the loop the tasks run on
+            self._changed = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._read()), asyncio.create_task(self._push())]
+
+    def _stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._ws = None
+
+    async def _send_upstream(self, action, symbol):
+        # when the socket is down the reader subscribes everything on reconnect
+        if self._ws is not None:
+            try:
+                await self._ws.send(json.dumps({"type": action, "symbol": symbol}))
+            except Exception as e:
+                print(f"[Finnhub] Could not {action} {symbol}: {e}")
+
+    def _on_trades(self, trades):
+        bar_engine.add_trades(trades)
+        for item in trades:
+            symbol = item["s"]
+            if symbol in self.subscribers and self.prices.get(symbol) != item["p"]:
+                self.prices[symbol] = item["p"]
+                self._dirty.add(symbol)
+        if self._dirty:
+            self._changed.set()
+
+    async def _read(self):
+        while True:
+            try:
+                print("[Finnhub] Connecting to Finnhub WebSocket...")
+                async with websockets.connect(FINNHUB_WS_URL) as ws:
+                    print("[Finnhub] Connected.")
+                    self._ws = ws
+                    for symbol in list(self.subscribers):
+                        await ws.send(json.dumps({"type": "subscribe", "symbol": symbol}))
+                    print(f"[Finnhub] Subscribed to {len(self.subscribers)} symbols")
+
+                    async for message in ws:
+                        parsed = json.loads(message)
+                        if parsed.get("type") == "trade":
+                            self._on_trades(parsed.get("data", []))
+
+            except asyncio.CancelledError:
+                print("[Finnhub] Feed stopped.")
+                raise
+            except Exception as e:
+                print(f"[Finnhub] Error: {e}")
+                await self._send_all(json.dumps({"error": str(e)}))
+            finally:
+                self._ws = None
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _send(self, channel_layer, channel_name, payload):
+        # a slow client whose inbox is full misses this update (like group_send
+        # does), it must not stop the feed for every other connection
+        try:
+            await channel_layer.send(channel_name, {"type": "price.update", "payload": payload})
+        except ChannelFull:
+            dropped_updates.inc()
+
+    async def _send_all(self, payload):
+        channel_layer = get_channel_layer()
+        for channel_name in list(self.channels):
+            await self._send(channel_layer, channel_name, payload)
+
+    async def _push(self):
+        min_interval = 1 / settings.STREAM_MAX_PUSH_RATE
+        channel_layer = get_channel_layer()
+
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            changed, self._dirty = self._dirty, set()
+
+            # route every changed symbol to the connections subscribed to it
+            updates = {}
+            for symbol in changed:
+                for channel_name in self.subscribers.get(symbol, ()):
+                    updates.setdefault(channel_name, []).append(symbol)
+
+            timestamp = datetime.now().isoformat()
+            payloads = {}   # connections watching the same symbols share one serialized message
+            for channel_name, symbols in updates.items():
+                key = frozenset(symbols)
+                if key not in payloads:
+                    payloads[key] = json.dumps({
+                        "type": "delta",
+                        "timestamp": timestamp,
+                        "data": [{"symbol": sym, "price": self.prices.get(sym)} for sym in sorted(key)]
+                    })
+                await self._send(channel_layer, channel_name, payloads[key])
+
+            # trades arriving meanwhile are coalesced into the next delta
+            await asyncio.sleep(min_interval)
+
+
+# process-wide feed, started by the first consumer and stopped after the last one leaves
+price_feed = FinnhubFeed()
+
+
+@metrics.collector
+def _feed_metrics():
+    return [
+        ("websocket_connections", "gauge", "Open price stream websocket connections.",
+         [({}, len(price_feed.channels))]),
+        ("websocket_subscriptions", "gauge", "Symbol subscriptions summed over all connections.",
+         [({}, sum(len(symbols) for symbols in price_feed.channels.values()))]),
+        ("upstream_stream_symbols", "gauge", "Distinct symbols subscribed on the Finnhub socket.",
+         [({}, len(price_feed.subscribers))]),
+        ("upstream_stream_connected", "gauge", "Whether the Finnhub socket is currently connected.",
+         [({}, int(price_feed._ws is not None))]),
+    ]
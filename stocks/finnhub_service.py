@@ -1,11 +1,40 @@
 from django.utils import timezone
-import finnhub
-import requests
 from django.conf import settings
-import yfinance as yf
-
-
-client = finnhub.Client(api_key=settings.FINNHUB_API_KEY)
+from functools import partial
+from collections import Counter
+import threading
+
+from . import market_calendar, symbol_index
+from .cache import cached
+from .concurrency import fan_out
+from .upstream import FinnhubClient, finnhub_api
+
+
+_client = None
+_client_lock = threading.Lock()
+
+# details requests per symbol; the refresh scheduler keeps the most requested
+# ones warm and halves the counts every cycle so old interest fades
+DETAIL_REQUESTS_TRACKED = 1000      # distinct symbols counted at most
+_detail_requests = Counter()
+_detail_lock = threading.Lock()
+
+# cache lifetimes in seconds, (ttl, stale_ttl) per upstream lookup
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+QUOTE_TTL = (15, MINUTE)
+PROFILE_TTL = (DAY, 7 * DAY)             # profiles change roughly weekly
+RECOMMENDATION_TTL = (DAY, 30 * DAY)     # recommendation trends are monthly
+INDEX_TTL = (MINUTE, 10 * MINUTE)
+SEARCH_TTL = (DAY, 7 * DAY)
+
+HOME_STOCKS = [
+    "AAPL", "MSFT", "NVDA", "TSLA", "AMD",        # Tech
+    "JNJ", "PFE", "MRNA", "UNH", "LLY",           # Healthcare
+    "JPM", "BRK-B",  "BAC", "WFC", "GS"           # Finance
+]
 
 INDEX_LABELS = {
     "^GSPC": "S&P 500",
@@ -13,36 +42,100 @@ INDEX_LABELS = {
     "^IXIC": "NASDAQ"
 }
 
-def get_index_data():
-    symbols = INDEX_LABELS.keys()
+def index_change(closes):
+    if len(closes) < 2:
+        return None
+
+    current_price = float(closes[-1])
+    previous_close = float(closes[-2])
+    change_percent = ((current_price - previous_close) / previous_close) * 100
+
+    return {
+        "price": round(current_price, 2),
+        "change_percent": round(change_percent, 2)
+    }
+
+def finnhub_client():
+    # built on first use rather than at import, so commands and worker boot don't pay for it
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = FinnhubClient(api_key=settings.FINNHUB_API_KEY)
+    return _client
+
+def get_index_quote(symbol):
+    import yfinance as yf
+
+    ticker = yf.Ticker(symbol)
+    hist = ticker.history(period="2d")
+    return index_change(hist['Close'].tolist())
+
+def collect_index_data(fetched):
+    # fetched: {index symbol: index_change(...) or None}, missing indices are skipped
     data = {}
-    for symbol in symbols:
-        ticker = yf.Ticker(symbol)
-        hist = ticker.history(period="2d")
-        if len(hist) < 2:
-            continue
-
-        current_price = hist['Close'].iloc[-1]
-        previous_close = hist['Close'].iloc[-2]
-        change_percent = ((current_price - previous_close) / previous_close) * 100
-
-        label = INDEX_LABELS[symbol]
-        data[label] = {
-            "price": round(current_price, 2),
-            "change_percent": round(change_percent, 2)
-        }
+    for symbol, label in INDEX_LABELS.items():
+        if fetched.get(symbol) is not None:
+            data[label] = fetched[symbol]
     return data
 
+@cached(*INDEX_TTL, maxsize=1)
+def get_index_data():
+    # the three index histories are fetched concurrently, missing ones are skipped
+    fetched = fan_out({symbol: partial(get_index_quote, symbol) for symbol in INDEX_LABELS})
+    return collect_index_data(fetched)
+
 def is_market_open():
-    market_status = client.market_status(exchange='US').get("isOpen")
-    return market_status
+    # NYSE calendar computed locally, no upstream call
+    return market_calendar.is_open()
+
 
+@cached(*QUOTE_TTL, maxsize=1024)
+def get_quote(symbol):
+    return finnhub_client().quote(symbol)
+
+
+@cached(*PROFILE_TTL, maxsize=2048)
+def get_company_profile(symbol):
+    return finnhub_client().company_profile2(symbol=symbol)
+
+
+@cached(*RECOMMENDATION_TTL, maxsize=2048)
+def get_recommendation_trends(symbol):
+    return finnhub_client().recommendation_trends(symbol)
+
+
+def note_details_request(symbol):
+    # called once a lookup found the company, so made up symbols are never counted
+    with _detail_lock:
+        if symbol not in _detail_requests and len(_detail_requests) >= DETAIL_REQUESTS_TRACKED:
+            # make room by forgetting the least requested symbol
+            del _detail_requests[min(_detail_requests, key=_detail_requests.get)]
+        _detail_requests[symbol] += 1
+
+def popular_symbols(limit):
+    with _detail_lock:
+        return [symbol for symbol, _ in _detail_requests.most_common(limit)]
+
+def decay_details_requests():
+    with _detail_lock:
+        for symbol in list(_detail_requests):
+            _detail_requests[symbol] //= 2
+            if not _detail_requests[symbol]:
+                del _detail_requests[symbol]
 
 def get_company_details(symbol):
-    profile = client.company_profile2(symbol=symbol)
-    recommendation_data = client.recommendation_trends(symbol) # returns a list, we only take the first data
+    symbol = symbol.upper()
+    profile = get_company_profile(symbol)
+    recommendation_data = get_recommendation_trends(symbol)
+    price = get_quote(symbol)    # current price of the stock
+    if profile:     # Finnhub answers unknown symbols with an empty profile
+        note_details_request(symbol)
+    return build_company_details(symbol, profile, recommendation_data, price)
+
+def build_company_details(symbol, profile, recommendation_data, price):
+    # recommendation_data is a list, we only take the first data
     recommendation = recommendation_data[0] if recommendation_data else {}
-    price = client.quote(symbol)    # current price of the stock
 
     buy = recommendation.get("buy", 0)
     sell = recommendation.get("sell", 0)
@@ -77,47 +170,67 @@ def get_company_details(symbol):
         }
     }
 
-def get_stocks(symbol):
+@cached(*SEARCH_TTL, maxsize=4096)
+def search_upstream(query):
     # reverted back to request method, as SDK didn't support exchange filter
-    url = "https://finnhub.io/api/v1/search"
+    url = f"{settings.FINNHUB_API_URL}/search"
     params = {
-        "q": symbol,
+        "q": query,
         "exchange": "US",
         "token": settings.FINNHUB_API_KEY
     }
 
-    response = requests.get(url, params=params)
+    response = finnhub_api.get(url, params=params)
+    response.raise_for_status()     # don't cache rate-limit errors as "not found"
     data = response.json()
-    results = data.get("result", [])
-
+    return [
+        {"description": item.get("description"), "symbol": item.get("symbol")}
+        for item in data.get("result", [])
+    ]
+
+def get_stocks(symbol, limit=10):
+    # type-ahead lookups are answered from the local symbol index, the upstream
+    # search is only used until the index is loaded or when it has no match
+    results = symbol_index.search(symbol, limit)
+    if not results:
+        results = search_upstream(symbol)[:limit]
+    return build_lookup(results)
+
+def build_lookup(results):
     if results:
         first = results[0]
         return {
             "description": first.get("description"),
-            "symbol": first.get("symbol")
+            "symbol": first.get("symbol"),
+            "results": results
         }
 
     return {"detail": "No US-listed stock found"}
 
 def get_home_stocks(HOME_PAGE_SYMBOLS):
-    results = []
+    # quote and profile for every symbol go out as one concurrent batch,
+    # so the request takes as long as the slowest call instead of all 30
+    calls = {}
     for sym in HOME_PAGE_SYMBOLS:
-        try:
-            quote = client.quote(sym)
-            profile = client.company_profile2(symbol=sym)
-            results.append({
-                "symbol": sym,
-                "company": profile.get("name", "N/A"),
-                "price": quote.get("c")  # current price
-            })
-        except Exception as e:
-            results.append({
-                "symbol": sym,
-                "company": "N/A",
-                "price": None
-            })
+        calls[(sym, "quote")] = partial(get_quote, sym)
+        calls[(sym, "profile")] = partial(get_company_profile, sym)
+    fetched = fan_out(calls)
+
+    return build_home_stocks(HOME_PAGE_SYMBOLS, fetched)
+
+def build_home_stocks(symbols, fetched):
+    # fetched: {(symbol, "quote"|"profile"): response}, missing calls show as N/A
+    results = []
+    for sym in symbols:
+        quote = fetched.get((sym, "quote")) or {}
+        profile = fetched.get((sym, "profile")) or {}
+        results.append({
+            "symbol": sym,
+            "company": profile.get("name", "N/A"),
+            "price": quote.get("c")  # current price
+        })
 
     return {
         "timestamp": timezone.now(),
         "data": results
-    }
\ No newline at end of file
+    }
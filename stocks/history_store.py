@@ -0,0 +1,303 @@
+import os
+import re
+import json
+import time
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .metrics import history_download_errors, history_download_seconds
+from .profiling import phase
+
+try:
+    import fcntl
+except ImportError:    # not available on Windows, we only lock within the process there
+    fcntl = None
+
+
+# Daily OHLCV bars are stored per symbol as one raw binary file per column under
+# HISTORY_DIR/<symbol>/. Every column is a flat little-endian 8 byte array, so a
+# file can be appended to without rewriting it and read back with np.memmap
+# without copying. `date` holds days since the epoch.
+
+HISTORY_START = "2020-01-01"
+HISTORY_COLUMNS = {
+    "date": "<i8",
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "volume": "<f8",
+}
+
+UPDATE_INTERVAL = 15 * 60    # seconds between upstream checks for new bars
+REBUILD_DAYS = 7             # full re-download so split/dividend adjustments don't drift
+
+_checked = {}                # symbol -> monotonic time of the last upstream check
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _symbol_dir(symbol):
+    return os.path.join(settings.HISTORY_DIR, re.sub(r"[^A-Za-z0-9._-]", "_", symbol.upper()))
+
+
+def _column_path(symbol, column):
+    return os.path.join(_symbol_dir(symbol), f"{column}.bin")
+
+
+def _lock(symbol):
+    with _locks_guard:
+        return _locks.setdefault(symbol.upper(), threading.Lock())
+
+
+class _FileLock:
+    # serializes writers across processes (e.g. the forecast worker pool)
+    def __init__(self, symbol):
+        self.path = os.path.join(_symbol_dir(symbol), ".lock")
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "w")
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+def read(symbol):
+    """
+    Returns the stored bars as a dict of read-only arrays mapped straight from disk.
+    `date` is returned as datetime64[D].
+    """
+    arrays = {}
+    for column, dtype in HISTORY_COLUMNS.items():
+        path = _column_path(symbol, column)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size == 0:
+            arrays[column] = np.empty(0, dtype=dtype)
+        else:
+            arrays[column] = np.memmap(path, dtype=dtype, mode="r")
+
+    # a writer interrupted mid-append can leave columns of different lengths
+    length = min(len(values) for values in arrays.values())
+    arrays = {column: values[:length] for column, values in arrays.items()}
+    arrays["date"] = arrays["date"].view("datetime64[D]")
+    return arrays
+
+
+def last_date(symbol):
+    dates = read(symbol)["date"]
+    return dates[-1].item() if len(dates) else None
+
+
+def _read_meta(symbol):
+    try:
+        with open(os.path.join(_symbol_dir(symbol), "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(symbol, **changes):
+    # meta.json is shared by every process, so forecast workers see each other's checks
+    meta = _read_meta(symbol)
+    meta.update(changes)
+    # swapped in like the columns, a reader never sees a half written file
+    path = os.path.join(_symbol_dir(symbol), "meta.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _to_columns(df):
+    import pandas as pd
+
+    if df.empty:
+        return {column: np.empty(0, dtype=dtype) for column, dtype in HISTORY_COLUMNS.items()}
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df = df.dropna(subset=["Close"])
+
+    return {
+        "date": df.index.values.astype("datetime64[D]").astype("<i8"),
+        "open": df["Open"].to_numpy("<f8"),
+        "high": df["High"].to_numpy("<f8"),
+        "low": df["Low"].to_numpy("<f8"),
+        "close": df["Close"].to_numpy("<f8"),
+        "volume": df["Volume"].to_numpy("<f8"),
+    }
+
+
+def _yf_download(kind, tickers, start, **kwargs):
+    # yfinance (and pandas with it) take a good part of a second to import, load them on first download
+    import yfinance as yf
+
+    try:
+        with phase("upstream"), history_download_seconds.time(kind):
+            return yf.download(tickers, start=start, end=datetime.today(), progress=False, auto_adjust=True, **kwargs)
+    except Exception:
+        history_download_errors.inc(kind)
+        raise
+
+
+def download(symbol, start):
+    df = _yf_download("single", symbol, start)
+    return _to_columns(df)
+
+
+def _write(symbol, columns, append):
+    os.makedirs(_symbol_dir(symbol), exist_ok=True)
+    for column, dtype in HISTORY_COLUMNS.items():
+        data = np.ascontiguousarray(columns[column], dtype=dtype).tobytes()
+        path = _column_path(symbol, column)
+        if append:
+            # existing maps keep their old length, so appending is safe for readers
+            with open(path, "ab") as f:
+                f.write(data)
+        else:
+            # swap in a new file instead of truncating one that may be mapped
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(data)
+            os.replace(f"{path}.tmp", path)
+
+
+def _column_rows(symbol):
+    rows = set()
+    for column, dtype in HISTORY_COLUMNS.items():
+        path = _column_path(symbol, column)
+        rows.add(os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+    return rows
+
+
+def _consistent(symbol, meta):
+    # a writer that died between columns leaves them at different lengths, and
+    # every later append would keep them misaligned; meta.json is written last
+    rows = _column_rows(symbol)
+    return len(rows) == 1 and meta.get("rows", next(iter(rows))) == next(iter(rows))
+
+
+def _plan(symbol):
+    """Returns (start, rebuild) for the download a symbol needs, or None if it's current."""
+    meta = _read_meta(symbol)
+    if not _consistent(symbol, meta):
+        return HISTORY_START, True
+    if time.time() - meta.get("checked_at", 0) < UPDATE_INTERVAL:
+        return None
+
+    stored_last = last_date(symbol)
+    built_on = meta.get("built_on")
+    if stored_last is None or built_on is None or (date.today() - date.fromisoformat(built_on)).days >= REBUILD_DAYS:
+        return HISTORY_START, True
+    if stored_last >= date.today() - timedelta(days=1):
+        return None     # already up to date, nothing to ask upstream for
+    return stored_last + timedelta(days=1), False
+
+
+def _store(symbol, columns, rebuild):
+    # called with the symbol's file lock held
+    if rebuild and len(columns["date"]) == 0:
+        # an empty or failed download must not replace good history, retry the
+        # rebuild at the next check
+        _write_meta(symbol, checked_at=time.time())
+        return 0
+    if rebuild:
+        _write(symbol, columns, append=False)
+        rows = len(columns["date"])
+        _write_meta(symbol, built_on=date.today().isoformat(), checked_at=time.time(), rows=rows)
+        return rows
+
+    # only keep rows that are newer than what's already on disk
+    stored = read(symbol)["date"]
+    keep = columns["date"] > np.datetime64(stored[-1].item(), "D").astype("<i8")
+    if keep.any():
+        _write(symbol, {column: values[keep] for column, values in columns.items()}, append=True)
+    _write_meta(symbol, checked_at=time.time(), rows=len(stored) + int(keep.sum()))
+    return int(keep.sum())
+
+
+def _recently_checked(symbol):
+    return time.monotonic() - _checked.get(symbol, float("-inf")) < UPDATE_INTERVAL
+
+
+def update(symbol, force=False):
+    """Appends the daily bars missing since the last stored date, returns the number added."""
+    symbol = symbol.upper()
+    with _lock(symbol):
+        if not force and _recently_checked(symbol):
+            return 0
+
+        added = 0
+        with _FileLock(symbol):
+            if force:
+                _write_meta(symbol, checked_at=0)
+            plan = _plan(symbol)
+            if plan is not None:
+                start, rebuild = plan
+                added = _store(symbol, download(symbol, start), rebuild)
+
+        _checked[symbol] = time.monotonic()
+        return added
+
+
+def download_many(symbols, start):
+    if len(symbols) == 1:
+        return {symbols[0]: download(symbols[0], start)}
+
+    df = _yf_download("bulk", symbols, start, group_by="ticker")
+    return {symbol: _to_columns(df[symbol].copy()) for symbol in symbols
+            if not df.empty and symbol in df.columns.get_level_values(0)}
+
+
+def update_many(symbols):
+    """
+    Brings several symbols up to date with at most two bulk downloads: one full
+    history for symbols being (re)built and one delta from the oldest stored date.
+    """
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    rebuilds, deltas = [], {}
+    for symbol in symbols:
+        if _recently_checked(symbol):
+            continue
+        plan = _plan(symbol)
+        if plan is None:
+            _checked[symbol] = time.monotonic()
+        elif plan[1]:
+            rebuilds.append(symbol)
+        else:
+            deltas[symbol] = plan[0]
+
+    batches = []
+    if rebuilds:
+        batches.append((rebuilds, HISTORY_START, True))
+    if deltas:
+        batches.append((list(deltas), min(deltas.values()), False))
+
+    for batch, start, rebuild in batches:
+        downloaded = download_many(batch, start)
+        for symbol, columns in downloaded.items():
+            with _lock(symbol), _FileLock(symbol):
+                _store(symbol, columns, rebuild)
+            _checked[symbol] = time.monotonic()
+
+
+def load(symbol):
+    """Brings the symbol up to date (at most once per UPDATE_INTERVAL) and returns its arrays."""
+    update(symbol)
+    return read(symbol)
+
+
+def frame(symbol, start=None):
+    import pandas as pd
+
+    arrays = load(symbol)
+    if start is not None:
+        first = np.searchsorted(arrays["date"], np.datetime64(start, "D"))
+        arrays = {column: values[first:] for column, values in arrays.items()}
+    return pd.DataFrame(arrays, copy=False)
@@ -0,0 +1,197 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import history_store
+from .cache import TTLCache
+from .charts import DAILY_INTERVALS, _resolve, daily_candles, get_candles
+from .profiling import phase
+
+
+INDICATORS = ("sma", "ema", "rsi", "macd", "bollinger", "atr")
+
+SMA_PERIOD = 20
+EMA_PERIOD = 20
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLLINGER_PERIOD, BOLLINGER_WIDTH = 20, 2
+ATR_PERIOD = 14
+
+# computed series per (symbol, interval[, range]); refreshed incrementally as bars are appended
+_series = TTLCache("indicators", ttl=24 * 60 * 60, maxsize=512)
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _ema(values, alpha, previous=None, start=0):
+    """
+    Exponential moving average seeded with the first value.
+
+    With `previous` (an earlier result over the same leading values) only the
+    entries from `start` on are computed, continuing from previous[start - 1].
+    """
+    if previous is None or start == 0:
+        return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+    out = np.empty(len(values))
+    out[:start] = previous[:start]
+    last = out[start - 1]
+    for i in range(start, len(values)):
+        last = out[i] = last + alpha * (values[i] - last)
+    return out
+
+
+def _rolling(values, window, reducer, previous=None, start=0):
+    """Rolling `reducer` over full windows (NaN before), only recomputing windows that end at or after `start`."""
+    out = np.full(len(values), np.nan)
+    if previous is not None:
+        out[:start] = previous[:start]
+    else:
+        start = 0
+
+    first = max(start, window - 1)
+    if first < len(values):
+        windows = sliding_window_view(values[first - window + 1:], window)
+        out[first:] = reducer(windows, axis=1)
+    return out
+
+
+class IndicatorSeries:
+    """
+    Indicator values for one candle series.
+
+    Recursive indicators (EMA, RSI, MACD, ATR) only depend on the previous value,
+    window ones (SMA, Bollinger) on the last few bars, so when candles are
+    appended or the last bar changes only the tail past the first changed bar is
+    computed again; everything before it is reused.
+    """
+
+    def __init__(self, candles, previous=None):
+        # copies, the next comparison must not see candles that changed underneath
+        self.time = np.array(candles["time"])
+        close = np.array(candles["close"], dtype=float)
+        high = np.array(candles["high"], dtype=float)
+        low = np.array(candles["low"], dtype=float)
+        self.close, self.high, self.low = close, high, low
+
+        start = self._first_change(previous)
+        old = previous.values if start else {}
+
+        def ema(key, values, alpha):
+            return _ema(values, alpha, old.get(key), start)
+
+        def rolling(key, values, window, reducer):
+            return _rolling(values, window, reducer, old.get(key), start)
+
+        v = {}
+        v["sma"] = rolling("sma", close, SMA_PERIOD, np.mean)
+        v["ema"] = ema("ema", close, 2 / (EMA_PERIOD + 1))
+
+        # Wilder smoothing is an EMA with alpha = 1 / period
+        change = np.diff(close, prepend=close[:1])
+        v["avg_gain"] = ema("avg_gain", np.clip(change, 0, None), 1 / RSI_PERIOD)
+        v["avg_loss"] = ema("avg_loss", np.clip(-change, 0, None), 1 / RSI_PERIOD)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            v["rsi"] = np.where(v["avg_loss"] == 0, 100.0, 100 - 100 / (1 + v["avg_gain"] / v["avg_loss"]))
+        v["rsi"][:RSI_PERIOD] = np.nan
+
+        v["ema_fast"] = ema("ema_fast", close, 2 / (MACD_FAST + 1))
+        v["ema_slow"] = ema("ema_slow", close, 2 / (MACD_SLOW + 1))
+        v["macd"] = v["ema_fast"] - v["ema_slow"]
+        v["macd_signal"] = ema("macd_signal", v["macd"], 2 / (MACD_SIGNAL + 1))
+
+        v["bollinger_std"] = rolling("bollinger_std", close, BOLLINGER_PERIOD, np.std)
+        middle = v["sma"] if BOLLINGER_PERIOD == SMA_PERIOD else rolling("bollinger_mid", close, BOLLINGER_PERIOD, np.mean)
+        v["bollinger_mid"] = middle
+
+        previous_close = np.concatenate([close[:1], close[:-1]])
+        true_range = np.maximum(high - low, np.maximum(np.abs(high - previous_close), np.abs(low - previous_close)))
+        v["atr"] = ema("atr", true_range, 1 / ATR_PERIOD)
+
+        self.values = v
+
+    def _first_change(self, previous):
+        """Index of the first candle that differs from `previous`, 0 when it can't be reused."""
+        if previous is None:
+            return 0
+        return _first_difference(previous, self.time, self.close, self.high, self.low)
+
+    def matches(self, candles):
+        return len(candles["time"]) == len(self.time) and _first_difference(
+            self, candles["time"], candles["close"], candles["high"], candles["low"]) == len(self.time)
+
+    def to_json(self, names, first=0):
+        def column(values):
+            values = np.round(values[first:], 4)
+            return [None if np.isnan(x) else x for x in values.tolist()]
+
+        v = self.values
+        body = {}
+        if "sma" in names:
+            body[f"sma_{SMA_PERIOD}"] = column(v["sma"])
+        if "ema" in names:
+            body[f"ema_{EMA_PERIOD}"] = column(v["ema"])
+        if "rsi" in names:
+            body[f"rsi_{RSI_PERIOD}"] = column(v["rsi"])
+        if "macd" in names:
+            body["macd"] = {
+                "macd": column(v["macd"]),
+                "signal": column(v["macd_signal"]),
+                "histogram": column(v["macd"] - v["macd_signal"]),
+            }
+        if "bollinger" in names:
+            body["bollinger"] = {
+                "upper": column(v["bollinger_mid"] + BOLLINGER_WIDTH * v["bollinger_std"]),
+                "middle": column(v["bollinger_mid"]),
+                "lower": column(v["bollinger_mid"] - BOLLINGER_WIDTH * v["bollinger_std"]),
+            }
+        if "atr" in names:
+            body[f"atr_{ATR_PERIOD}"] = column(v["atr"])
+
+        return {"date": np.datetime_as_string(self.time[first:]).tolist(), **body}
+
+
+def _first_difference(series, time, close, high, low):
+    n = min(len(series.time), len(time))
+    same = (
+        (series.time[:n] == time[:n])
+        & (series.close[:n] == close[:n])
+        & (series.high[:n] == high[:n])
+        & (series.low[:n] == low[:n])
+    )
+    return n if same.all() else int(np.argmin(same))
+
+
+def _lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def get_indicators(symbol, range_="1M", interval=None, names=INDICATORS):
+    """
+    Indicators for the candles `get_stock_chart` would return. Daily and weekly
+    ones are computed over the whole stored history, so even a 1M range starts
+    with warmed up averages.
+    """
+    symbol = symbol.upper()
+    interval, start, _ = _resolve(range_, interval)
+
+    key = (symbol, interval) if interval in DAILY_INTERVALS else (symbol, interval, range_)
+
+    # one computation per series at a time, concurrent requests reuse its result
+    with _lock(key):
+        if interval in DAILY_INTERVALS:
+            candles = daily_candles(symbol, history_store.HISTORY_START, weekly=interval == "1w")
+        else:
+            _, candles = get_candles(symbol, range_, interval)
+
+        series = _series.get(key)
+        if series is None or not series.matches(candles):
+            with phase("compute"):
+                series = IndicatorSeries(candles, previous=series)
+            _series.set(key, series)
+
+    first = int(np.searchsorted(series.time, np.datetime64(start, "D"))) if interval in DAILY_INTERVALS else 0
+    return interval, series.to_json(names, first)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.warmup import DISK_STEPS, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates the home symbols' history and the symbol index snapshot on disk. Imports, "
+        "caches and forecast workers are per process, WARMUP_ON_STARTUP warms those in each worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only", help=f"comma separated steps to run, default all of: {', '.join(DISK_STEPS)}",
+        )
+        parser.add_argument(
+            "--strict", action="store_true", help="exit with an error when any step fails",
+        )
+
+    def handle(self, *args, **options):
+        steps = options["only"].split(",") if options["only"] else list(DISK_STEPS)
+        unknown = [step for step in steps if step not in DISK_STEPS]
+        if unknown:
+            raise CommandError(f"Unknown steps: {', '.join(unknown)}")
+
+        timings = warm_up(steps, log=self.stdout.write)
+
+        failed = [step for step in steps if step not in timings]
+        if failed and options["strict"]:
+            raise CommandError(f"Warmup failed: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS(f"Warmed up {len(timings)} of {len(steps)} steps in {sum(timings.values()):.2f}s"))
@@ -0,0 +1,135 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+
+# NYSE trading calendar computed locally: regular hours, extended sessions,
+# full holidays and early closes. Rules as published by NYSE; one-off closures
+# (national days of mourning, weather) are not known in advance and not covered.
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+PRE_MARKET_OPEN = time(4, 0)
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+POST_MARKET_CLOSE = time(20, 0)
+EARLY_POST_MARKET_CLOSE = time(17, 0)
+
+# session names, from the point of view of data freshness
+REGULAR, EXTENDED, CLOSED = "regular", "extended", "closed"
+
+
+def _nth_weekday(year, month, weekday, n):
+    # n-th (1 based) weekday of the month, n=-1 for the last one
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    # anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(day):
+    # Saturday holidays move to Friday, Sunday ones to Monday
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=16)
+def holidays(year):
+    days = {
+        _nth_weekday(year, 1, 0, 3),        # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),        # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),       # Memorial Day
+        _observed(date(year, 7, 4)),        # Independence Day
+        _nth_weekday(year, 9, 0, 1),        # Labor Day
+        _nth_weekday(year, 11, 3, 4),       # Thanksgiving
+        _observed(date(year, 12, 25)),      # Christmas
+    }
+    # New Year's Day on a Saturday is not made up on the Friday before (the 31st)
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))     # Juneteenth
+    return frozenset(days)
+
+
+@lru_cache(maxsize=16)
+def early_closes(year):
+    days = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}     # day after Thanksgiving
+    # July 3rd and Christmas Eve close early when they are ordinary weekdays
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() < 4:
+            days.add(day)
+    return frozenset(days - holidays(year))
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+
+def _hours(day):
+    """(pre-market open, regular open, regular close, post-market close) for a trading day."""
+    early = day in early_closes(day.year)
+    return (
+        PRE_MARKET_OPEN,
+        REGULAR_OPEN,
+        EARLY_CLOSE if early else REGULAR_CLOSE,
+        EARLY_POST_MARKET_CLOSE if early else POST_MARKET_CLOSE,
+    )
+
+
+def _now(now):
+    return (now or datetime.now(NEW_YORK)).astimezone(NEW_YORK)
+
+
+def session(now=None):
+    """REGULAR, EXTENDED (pre- or post-market) or CLOSED at `now` (an aware datetime, default now)."""
+    now = _now(now)
+    if not is_trading_day(now.date()):
+        return CLOSED
+    pre_open, open_, close, post_close = _hours(now.date())
+    clock = now.time()
+    if open_ <= clock < close:
+        return REGULAR
+    if pre_open <= clock < post_close:
+        return EXTENDED
+    return CLOSED
+
+
+def is_open(now=None):
+    """Whether the regular session is on, what Finnhub's market-status `isOpen` reports."""
+    return session(now) == REGULAR
+
+
+def next_change(now=None):
+    """The next moment `session()` changes, as an aware datetime in New York time."""
+    now = _now(now)
+    day = now.date()
+    for _ in range(10):     # at most a long weekend plus holidays ahead
+        if is_trading_day(day):
+            for boundary in _hours(day):
+                moment = datetime.combine(day, boundary, NEW_YORK)
+                if moment > now:
+                    return moment
+        day += timedelta(days=1)
+    return datetime.combine(day, PRE_MARKET_OPEN, NEW_YORK)
@@ -0,0 +1,166 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# Minimal Prometheus instrumentation: counters and histograms kept in plain
+# dicts, plus collectors read at scrape time, rendered in the text exposition format by /metrics. Recording is
+# a dict lookup and an add under a lock, cheap enough for every upstream call.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FIT_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+_metrics = []
+_collectors = []
+_scrape_hooks = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines += self._samples(labels, value)
+        return lines
+
+    def _samples(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._forward = None
+
+    def forward_to(self, queue):
+        """In a worker process: send observations to `queue` for the parent to record instead."""
+        self._forward = queue
+
+    def observe(self, value, *labels):
+        if self._forward is not None:
+            self._forward.put((self.name, value, labels))
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per bucket counts (non-cumulative, the last one is +Inf), sum
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def _samples(self, labels, state):
+        counts, total = state[0][:], state[1]
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = _format_labels(self.labelnames, labels, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        plain = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{plain} {_format_value(total)}")
+        lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+def collector(function):
+    """
+    Registers a function called at scrape time that returns
+    (name, kind, documentation, [(labels dict, value), ...]) tuples, for values
+    that are cheaper to read when scraped than to keep updated.
+    """
+    _collectors.append(function)
+    return function
+
+
+def on_scrape(function):
+    """Registers a function run before every scrape, e.g. to drain observations from worker processes."""
+    _scrape_hooks.append(function)
+    return function
+
+
+def record_forwarded(name, value, labels):
+    for metric in _metrics:
+        if metric.name == name:
+            metric.observe(value, *labels)
+
+
+def render():
+    for function in _scrape_hooks:
+        function()
+
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    for function in _collectors:
+        try:
+            families = function()
+        except Exception as e:
+            print(f"[Metrics] Collector {function.__name__} failed: {e}")
+            continue
+        for name, kind, documentation, samples in families:
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+upstream_seconds = Histogram(
+    "upstream_request_duration_seconds", "Upstream API call latency, rate limit waits excluded.",
+    ("provider", "endpoint"),
+)
+upstream_errors = Counter(
+    "upstream_request_errors_total", "Upstream API calls that failed, by reason (HTTP status or exception).",
+    ("provider", "endpoint", "reason"),
+)
+history_download_seconds = Histogram(
+    "history_download_duration_seconds", "yfinance daily history downloads.", ("kind",),
+)
+history_download_errors = Counter(
+    "history_download_errors_total", "yfinance daily history downloads that raised.", ("kind",),
+)
+forecast_fit_seconds = Histogram(
+    "forecast_fit_duration_seconds", "Prophet model fit time.", ("mode",), buckets=FIT_BUCKETS,
+)
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+
+DATE_FORMAT = "%Y-%m-%d"     # `ds` in API responses
+
+
+class ForecastUnavailable(Exception):
+    pass
+
+
+def build_analysis(symbol, today_price, forecast, days_ahead=7):
+    # Get the prediction for 7 days ahead
+    today = datetime.today().date()
+    target_date = today + timedelta(days=days_ahead)
+    target_row = forecast[forecast['ds'].dt.date == target_date]
+
+    if target_row.empty:
+        # Fallback: pick the next available forecast
+        fallback_row = forecast[forecast['ds'].dt.date > today].head(1)
+        if fallback_row.empty:
+            raise ForecastUnavailable(f"No forecast available for {target_date}")
+        target_row = fallback_row
+        target_date = target_row.iloc[0]['ds'].date()
+
+    predicted_price = float(target_row.iloc[0]['yhat'])
+    today_price = float(today_price)
+    change_percent = ((predicted_price - today_price) / today_price) * 100
+
+    # Recommendation logic
+    if change_percent >= 3:
+        recommendation = "buy"
+    elif change_percent <= -3:
+        recommendation = "sell"
+    else:
+        recommendation = "hold"
+
+    # Cleaned 7-day forecast for frontend charting
+    future_forecast = forecast[forecast['ds'].dt.date > today].head(7)
+    future_forecast = future_forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].copy()
+    # daily forecasts, dates only: the same format the batch endpoint returns
+    future_forecast['ds'] = future_forecast['ds'].dt.strftime(DATE_FORMAT)
+    forecast_list = future_forecast.to_dict(orient='records')
+
+    return {
+        "symbol": symbol.upper(),
+        "forecast": forecast_list,
+        "recommendation": recommendation,
+        "message": f"{symbol.upper()} is expected to change by {round(change_percent, 2)}% in {days_ahead} days, going from ${round(today_price,2)} to ${round(predicted_price,2)}. Recommended action: {recommendation.upper()}.",
+        "current_price": round(today_price, 2),
+        "predicted_price": round(predicted_price, 2),
+        "change_percent": round(change_percent, 2)
+    }
@@ -0,0 +1,50 @@
+from concurrent.futures import wait
+
+from .. import history_store
+from .analysis import build_analysis, ForecastUnavailable
+from .jobs import submit_forecast, QueueFull, WAIT_TIMEOUT
+from .predictor import peek_forecast
+
+
+MAX_BATCH_SYMBOLS = 50
+
+
+def analyze_batch(symbols, days=14):
+    """
+    Returns (results, errors, pending) for a list of symbols.
+
+    Cached forecasts are answered right away, the rest are fitted in parallel on
+    the forecast pool. Like the single-symbol endpoint this waits at most
+    WAIT_TIMEOUT: fits still running then come back as job entries to poll.
+    """
+    symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols))
+
+    # one bulk history download for the whole list before any fitting starts
+    history_store.update_many(symbols)
+
+    results, errors, jobs = {}, {}, {}
+    for symbol in symbols:
+        cached = peek_forecast(symbol, days)
+        if cached is None:
+            try:
+                jobs[symbol] = submit_forecast(symbol, days)
+            except QueueFull as e:
+                errors[symbol] = str(e)
+            continue
+        try:
+            results[symbol] = build_analysis(symbol, *cached)
+        except ForecastUnavailable as e:
+            errors[symbol] = str(e)
+
+    wait([job.future for job in jobs.values()], timeout=WAIT_TIMEOUT)
+
+    pending = []
+    for symbol, job in jobs.items():
+        if not job.future.done():
+            pending.append(job.to_dict())
+        elif job.future.exception() is not None:
+            errors[symbol] = str(job.future.exception())
+        else:
+            # the worker ran build_analysis already
+            results[symbol] = job.future.result()
+    return results, errors, pending
@@ -0,0 +1,181 @@
+import os
+import time
+import queue
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .. import metrics
+
+
+JOB_RESULT_TTL = 10 * 60    # seconds a finished job stays pollable
+MAX_PENDING_JOBS = 100      # beyond this new forecasts are refused instead of queued
+WAIT_TIMEOUT = 30           # seconds a request waits on its fit before handing out the job instead
+
+_executor = None
+_worker_metrics = None  # queue the pool processes report their metric observations on
+_jobs = {}          # job_id -> Job
+_inflight = {}      # (symbol, days) -> job_id of the queued/running job
+_lock = threading.Lock()
+_executor_lock = threading.Lock()
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _init_worker(metrics_queue):
+    # spawned workers start with a bare interpreter, bring Django up once per process
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stockInsights.settings")
+    import django
+    django.setup()
+
+    # nobody scrapes the workers, their fit timings are recorded by the parent
+    metrics.forecast_fit_seconds.forward_to(metrics_queue)
+
+
+@metrics.on_scrape
+def _drain_worker_metrics():
+    if _worker_metrics is None:
+        return
+    while True:
+        try:
+            metrics.record_forwarded(*_worker_metrics.get_nowait())
+        except queue.Empty:
+            return
+
+
+def _run_forecast(symbol, days):
+    # runs inside a pool process
+    from .predictor import generate_forecast
+    from .analysis import build_analysis
+
+    today_price, forecast = generate_forecast(symbol, days=days)
+    return build_analysis(symbol, today_price, forecast)
+
+
+def _warm_worker(barrier, timeout):
+    # runs inside a pool process: load Prophet and cmdstan with a throwaway fit
+    # so the first real forecast doesn't pay for them
+    import numpy as np
+    import pandas as pd
+    from .predictor import fit_model
+
+    # hold on to this task until every worker has one, so none takes two
+    try:
+        barrier.wait(timeout)
+    except threading.BrokenBarrierError:
+        pass
+
+    started = time.perf_counter()
+    days = pd.date_range(end=pd.Timestamp.today().normalize(), periods=60)
+    fit_model("__warmup__", pd.DataFrame({"ds": days, "y": np.linspace(100, 110, len(days))}))
+    return os.getpid(), time.perf_counter() - started
+
+
+def warm_workers(timeout=120):
+    """Starts the forecast pool and warms every worker. Returns {pid: seconds} of the warm fits that finished."""
+    executor = _get_executor()
+    workers = settings.FORECAST_WORKERS
+    with multiprocessing.get_context("spawn").Manager() as manager:
+        barrier = manager.Barrier(workers)
+        futures = [executor.submit(_warm_worker, barrier, timeout) for _ in range(workers)]
+        warmed = {}
+        for future in futures:
+            try:
+                pid, seconds = future.result(timeout=timeout)
+                warmed[pid] = seconds
+            except Exception as e:
+                print(f"[Forecast] Worker warmup failed: {e}")
+    return warmed
+
+
+def _get_executor():
+    global _executor, _worker_metrics
+    with _executor_lock:
+        if _executor is not None and _executor._broken:
+            # a worker died (OOM kill, segfault in cmdstan): the pool refuses all
+            # further work, so replace it; jobs it held have already failed
+            print(f"[Forecast] Process pool broken ({_executor._broken}), starting a new one")
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        if _executor is None:
+            # spawn rather than fork: the parent runs threads and an event loop
+            context = multiprocessing.get_context("spawn")
+            if _worker_metrics is None:
+                _worker_metrics = context.Queue()
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.FORECAST_WORKERS,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(_worker_metrics,),
+            )
+        return _executor
+
+
+class Job:
+    def __init__(self, symbol, days, future):
+        self.id = uuid.uuid4().hex
+        self.symbol = symbol
+        self.days = days
+        self.future = future
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def status(self):
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        return "failed" if self.future.exception() else "done"
+
+    def to_dict(self):
+        data = {"job_id": self.id, "symbol": self.symbol, "status": self.status}
+        if self.status == "done":
+            data["result"] = self.future.result()
+        elif self.status == "failed":
+            data["error"] = str(self.future.exception())
+        return data
+
+
+def _finished(job):
+    job.finished_at = time.time()
+    with _lock:
+        if _inflight.get((job.symbol, job.days)) == job.id:
+            del _inflight[(job.symbol, job.days)]
+
+
+def _prune():
+    # drop finished jobs nobody polled for a while, called with _lock held
+    cutoff = time.time() - JOB_RESULT_TTL
+    for job_id in [job_id for job_id, job in _jobs.items() if job.finished_at and job.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def submit_forecast(symbol, days=14):
+    """Queues a forecast on the process pool, or returns the job already computing it."""
+    symbol = symbol.upper()
+    key = (symbol, days)
+
+    with _lock:
+        _prune()
+        job_id = _inflight.get(key)
+        if job_id is not None:
+            return _jobs[job_id]
+
+        if len(_inflight) >= MAX_PENDING_JOBS:
+            raise QueueFull("Too many forecasts in progress, try again shortly")
+
+        job = Job(symbol, days, _get_executor().submit(_run_forecast, symbol, days))
+        _jobs[job.id] = job
+        _inflight[key] = job.id
+
+    job.future.add_done_callback(lambda _: _finished(job))
+    return job
+
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
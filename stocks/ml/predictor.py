@@ -1,21 +1,213 @@
-import yfinance as yf
+import os
+import json
+import time
+import pickle
+import tempfile
+from contextlib import contextmanager
+
 import pandas as pd
-from prophet import Prophet
-from datetime import datetime, timedelta
+from django.conf import settings
+
+from .. import history_store
+from ..cache import TTLCache
+from ..metrics import forecast_fit_seconds
+from ..singleflight import SingleFlight
+
+try:
+    import fcntl
+except ImportError:    # not available on Windows, fits are only coalesced within the process there
+    fcntl = None
+
+
+# how long a forecast is trusted before we check upstream for new daily bars
+FORECAST_RECHECK = 60 * 60
+
+FORECAST_COLUMNS = ['ds', 'yhat', 'yhat_lower', 'yhat_upper']
+
+# Prophet (and cmdstanpy under it) is only imported where a model is fitted or
+# (de)serialized: serving cached forecasts in the web process never needs it
+
+# hot forecasts stay in memory, everything else falls back to FORECAST_CACHE_DIR
+_forecasts = TTLCache("forecasts", ttl=FORECAST_RECHECK, maxsize=256)
+_fits = SingleFlight("forecast")
+
 
 def fetch_stock_data(symbol):
-    df = yf.download(symbol, start="2020-01-01", end=datetime.today())
-    df = df.reset_index()[['Date', 'Close']]
-    df.columns = ['ds', 'y']
-    return df
+    # daily closes come from the local history store, which only asks
+    # upstream for the days it is missing
+    history = history_store.load(symbol)
+    return pd.DataFrame({
+        'ds': pd.to_datetime(history['date']),
+        'y': history['close'],
+    }, copy=False)
 
-def generate_forecast(symbol, days=14):
-    df = fetch_stock_data(symbol)
+
+def _cache_path(symbol, name):
+    return os.path.join(settings.FORECAST_CACHE_DIR, f"{symbol}.{name}")
+
+
+def _write_atomic(path, write):
+    # a temp file of our own, forecast workers may write the same path at once
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _load_entry(symbol, days):
+    # a missing, truncated or foreign entry is a cache miss, the caller refits
+    try:
+        with open(_cache_path(symbol, f"{days}.meta.json")) as f:
+            meta = json.load(f)
+        entry = {
+            "last_date": meta["last_date"],
+            "today_price": float(meta["today_price"]),
+            "checked_at": float(meta["checked_at"]),
+        }
+        entry["forecast"] = pd.read_pickle(_cache_path(symbol, f"{days}.forecast.pkl"))
+    except (OSError, ValueError, TypeError, KeyError, EOFError, pickle.UnpicklingError):
+        return None
+    return entry
+
+
+def _save_entry(symbol, days, entry):
+    meta = {key: value for key, value in entry.items() if key != "forecast"}
+    _write_atomic(_cache_path(symbol, f"{days}.forecast.pkl"), entry["forecast"].to_pickle)
+
+    def write_meta(path):
+        with open(path, "w") as f:
+            json.dump(meta, f)
+    _write_atomic(_cache_path(symbol, f"{days}.meta.json"), write_meta)
+
+
+def _load_model(symbol):
+    from prophet.serialize import model_from_json
+
+    try:
+        with open(_cache_path(symbol, "model.json")) as f:
+            return model_from_json(f.read())
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+
+@contextmanager
+def _fit_lock(symbol):
+    # one fit per symbol across processes, they share the model file
+    os.makedirs(settings.FORECAST_CACHE_DIR, exist_ok=True)
+    with open(_cache_path(symbol, "lock"), "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _save_model(symbol, model):
+    from prophet.serialize import model_to_json
+
+    def write(path):
+        with open(path, "w") as f:
+            f.write(model_to_json(model))
+    _write_atomic(_cache_path(symbol, "model.json"), write)
+
+
+def fit_model(symbol, df):
+    from prophet import Prophet
+    from prophet.utilities import warm_start_params
+
+    # warm-start from yesterday's parameters when we have them, the optimizer
+    # then only needs a few iterations to absorb the new bars
+    previous = _load_model(symbol)
+    if previous is not None:
+        try:
+            started = time.perf_counter()
+            model = Prophet()
+            model.fit(df, init=warm_start_params(previous))
+            forecast_fit_seconds.observe(time.perf_counter() - started, "warm")
+            return model
+        except Exception as e:
+            print(f"[Forecast] Warm start failed for {symbol}, refitting: {e}")
+
+    started = time.perf_counter()
     model = Prophet()
     model.fit(df)
+    forecast_fit_seconds.observe(time.perf_counter() - started, "cold")
+    return model
+
+
+def peek_forecast(symbol, days=14):
+    """Returns (today_price, forecast) if a fresh forecast is cached, otherwise None. Never fits."""
+    symbol = symbol.upper()
+    key = (symbol, days)
+
+    entry = _forecasts.get(key)
+    if entry is not None:
+        return entry["today_price"], entry["forecast"]
+
+    # after a restart (or when another process did the fit) the forecast on disk
+    # is as good as the in-memory one
+    entry = _load_entry(symbol, days)
+    if entry is not None and time.time() - entry["checked_at"] < FORECAST_RECHECK:
+        _forecasts.set(key, entry)
+        return entry["today_price"], entry["forecast"]
+    return None
+
+
+def generate_forecast(symbol, days=14):
+    symbol = symbol.upper()
+    key = (symbol, days)
+
+    cached = peek_forecast(symbol, days)
+    if cached is not None:
+        return cached
+
+    # concurrent requests for a symbol share one fit: threads here wait on the
+    # running call, other processes on the file lock and then find its result
+    # on disk
+    return _fits.do(key, lambda: _fit_forecast(symbol, days))
+
+
+def _fit_forecast(symbol, days):
+    key = (symbol, days)
+
+    with _fit_lock(symbol):
+        # another process may have finished the fit while we waited for the lock
+        cached = peek_forecast(symbol, days)
+        if cached is not None:
+            return cached
+
+        # a stale entry still tells us which bars it was fitted on
+        entry = _load_entry(symbol, days)
+
+        df = fetch_stock_data(symbol)
+        last_date = str(df.iloc[-1]['ds'].date())
+
+        if entry is None or entry["last_date"] != last_date:
+            # new daily bars arrived (or first request for the symbol), refit
+            model = fit_model(symbol, df)
+            future = model.make_future_dataframe(periods=days)
+            forecast = model.predict(future)[FORECAST_COLUMNS]
+            _save_model(symbol, model)
+
+            entry = {
+                "last_date": last_date,
+                "today_price": float(df.iloc[-1]['y']),
+                "forecast": forecast,
+            }
 
-    future = model.make_future_dataframe(periods=days)
-    forecast = model.predict(future)
-    today_price = df.iloc[-1]['y']
+        entry["checked_at"] = time.time()
+        _save_entry(symbol, days, entry)
+        _forecasts.set(key, entry)
 
-    return today_price, forecast
\ No newline at end of file
+    return entry["today_price"], entry["forecast"]
@@ -0,0 +1,93 @@
+from functools import partial
+
+import numpy as np
+from django.utils import timezone
+
+from .concurrency import fan_out
+from .feed import price_feed
+from .finnhub_service import get_quote
+
+
+def _latest_prices(symbols):
+    """(current, previous close) per symbol; NaN where no quote could be fetched."""
+    # cached quotes come back immediately, only the missing ones go upstream, all at once
+    fetched = fan_out({sym: partial(get_quote, sym) for sym in symbols})
+
+    current = np.full(len(symbols), np.nan)
+    previous = np.full(len(symbols), np.nan)
+    for i, sym in enumerate(symbols):
+        quote = fetched.get(sym) or {}
+        if quote.get("c"):
+            current[i] = quote["c"]
+        if quote.get("pc"):
+            previous[i] = quote["pc"]
+        # a trade seen on the live stream is newer than any REST quote
+        live = price_feed.prices.get(sym)
+        if live is not None:
+            current[i] = live
+    return current, previous
+
+
+def value_portfolio(positions):
+    """
+    Values a list of (ticker, name, shares) positions.
+
+    Positions without a price are listed with null values and left out of the
+    totals, so one missing quote doesn't fail the whole portfolio.
+    """
+    symbols = [ticker for ticker, _, _ in positions]
+    shares = np.array([quantity for _, _, quantity in positions], dtype=float)
+    current, previous = _latest_prices(symbols)
+
+    values = current * shares
+    day_changes = (current - previous) * shares
+    priced = ~np.isnan(values)
+    total = values[priced].sum()
+    weights = values / total if total else np.full(len(symbols), np.nan)
+
+    # day change only over positions that have both prices
+    comparable = priced & ~np.isnan(previous)
+    day_change = day_changes[comparable].sum()
+    previous_total = (previous * shares)[comparable].sum()
+
+    def _num(x, digits=2):
+        return None if np.isnan(x) else round(float(x), digits)
+
+    return {
+        "timestamp": timezone.now(),
+        "total_value": round(float(total), 2),
+        "day_change": round(float(day_change), 2),
+        "day_change_percent": round(float(day_change / previous_total * 100), 2) if previous_total else None,
+        "positions": [
+            {
+                "symbol": sym,
+                "name": name,
+                "shares": float(shares[i]),
+                "price": _num(current[i]),
+                "value": _num(values[i]),
+                "weight": _num(weights[i], 4),
+                "day_change": _num(day_changes[i]),
+                "day_change_percent": _num((current[i] / previous[i] - 1) * 100),
+            }
+            for i, (sym, name, _) in enumerate(positions)
+        ],
+        "missing": [sym for sym, ok in zip(symbols, priced) if not ok],
+    }
+
+
+def parse_shares(raw):
+    """Parses "AAPL:10,MSFT:2.5" into {"AAPL": 10.0, "MSFT": 2.5}."""
+    shares = {}
+    for item in filter(None, (raw or "").split(",")):
+        ticker, sep, quantity = item.partition(":")
+        ticker = ticker.strip().upper()
+        if not sep or not ticker:
+            raise ValueError(f"Expected TICKER:SHARES, got {item!r}")
+        try:
+            quantity = float(quantity)
+        except ValueError:
+            raise ValueError(f"Invalid share count for {ticker}") from None
+        if not np.isfinite(quantity) or quantity < 0:
+            raise ValueError(f"Invalid share count for {ticker}")
+        shares[ticker] = quantity
+    return shares
@@ -0,0 +1,279 @@
+import io
+import os
+import json
+import time
+import pstats
+import cProfile
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import exceptions
+
+
+# Per-request profiling for the stocks endpoints. Staff users opt in with
+# ?profile=1 (or the X-Profile header) and get a Server-Timing breakdown, or
+# ?profile=text for the cProfile report in place of the response; every
+# PROFILE_SAMPLE_RATE-th request is profiled as well. Profiles are kept in
+# PROFILE_DIR as .prof files (pstats, snakeviz) with a .json summary, the
+# newest PROFILE_KEEP of them.
+
+PHASES = ("auth", "upstream", "compute", "serialize")
+PROFILED_PREFIXES = ("/stocks/",)
+REPORT_LINES = 40
+
+_profile = contextvars.ContextVar("request_profile", default=None)
+_current_phase = contextvars.ContextVar("request_phase", default=None)
+
+# one cProfile at a time: Python 3.12+ refuses a second active profiler, and
+# overlapping ones would only add overhead; the other request gets phases only
+_profiler_lock = threading.Lock()
+_requests = itertools.count(1)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def breakdown(self):
+        total = time.perf_counter() - self.started
+        with self._lock:
+            phases = dict(self.phases)
+        phases["other"] = max(total - sum(phases.values()), 0.0)
+        phases["total"] = total
+        return phases
+
+
+@contextmanager
+def phase(name):
+    """
+    Charges the time spent in the block to `name` when the current request is
+    profiled. Nested phases are taken out of the enclosing one, so the phases of
+    a request add up to its wall time; a phase inside the same phase (e.g. a
+    fan out of upstream calls) is just part of it. Costs one contextvar lookup
+    otherwise.
+    """
+    profile = _profile.get()
+    parent = _current_phase.get()
+    if profile is None or (parent is not None and parent[0] == name):
+        yield
+        return
+
+    frame = [name, 0.0]     # name, seconds spent in nested phases
+    token = _current_phase.set(frame)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _current_phase.reset(token)
+        profile.add(name, elapsed - frame[1])
+        if parent is not None:
+            parent[1] += elapsed
+
+
+def _requested(request):
+    return request.GET.get("profile") or request.headers.get("X-Profile")
+
+
+def _is_staff(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+
+    from user.authentication import CachedTokenAuthentication
+    try:
+        user_auth_tuple = CachedTokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return False
+    return bool(user_auth_tuple and user_auth_tuple[0].is_staff)
+
+
+def _sampled():
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and next(_requests) % rate == 0
+
+
+def _server_timing(phases):
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases.items())
+
+
+def _report(profiler, phases, sort="cumulative"):
+    out = io.StringIO()
+    out.write("phase          ms\n")
+    for name, seconds in phases.items():
+        out.write(f"{name:<12}{seconds * 1000:>8.1f}\n")
+    if profiler is not None:
+        out.write("\n")
+        pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(REPORT_LINES)
+    return out.getvalue()
+
+
+def _store(request, response, profiler, phases, sampled):
+    """Writes <id>.prof and <id>.json to PROFILE_DIR, drops the oldest beyond PROFILE_KEEP. Returns the id."""
+    directory = settings.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    slug = request.path.strip("/").replace("/", "_")[:80] or "root"
+    profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{slug}"
+    if profiler is not None:
+        profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as f:
+        json.dump({
+            "id": profile_id,
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "sampled": sampled,
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in phases.items()},
+        }, f, indent=2)
+
+    # ids start with a timestamp, so name order is age order
+    summaries = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    for name in summaries[:max(len(summaries) - settings.PROFILE_KEEP, 0)]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(directory, name[:-len(".json")] + suffix))
+            except FileNotFoundError:
+                pass
+    return profile_id
+
+
+class ProfilingMiddleware:
+    """
+    Profiles opted-in and sampled requests under PROFILED_PREFIXES.
+
+    Every profiled request gets the phase timer, and sync views also run under
+    cProfile when no other request holds the profiler. Under WSGI the profiler
+    wraps the whole request. Under ASGI the middleware runs on the event loop,
+    where a profiler would mostly measure other requests, so process_view
+    calls the sync view under cProfile in the worker thread it runs on.
+    Async views get the phase breakdown only.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _mode(self, request):
+        """None, or (explicit flag value or None, sampled)."""
+        if not request.path.startswith(PROFILED_PREFIXES):
+            return None
+        flag = _requested(request)
+        if flag and _is_staff(request):
+            return flag, False
+        if _sampled():
+            return None, True
+        return None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        mode = self._mode(request)
+        if mode is None:
+            return self.get_response(request)
+        flag, sampled = mode
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        profiler = cProfile.Profile() if _profiler_lock.acquire(blocking=False) else None
+        try:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        finally:
+            if profiler is not None:
+                _profiler_lock.release()
+            _profile.reset(token)
+
+        return self._finish(request, response, profile, profiler, flag, sampled)
+
+    async def __acall__(self, request):
+        mode = None
+        if request.path.startswith(PROFILED_PREFIXES):
+            flag = _requested(request)
+            if flag and await sync_to_async(_is_staff)(request):
+                mode = flag, False
+            elif _sampled():
+                mode = None, True
+        if mode is None:
+            return await self.get_response(request)
+        flag, sampled = mode
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        request._profile_view = True
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+
+        profiler = getattr(request, "_profiler", None)
+        return await sync_to_async(self._finish)(request, response, profile, profiler, flag, sampled)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Under ASGI Django runs this, like the sync view after it, in a worker
+        # thread, and cProfile only sees the thread it is enabled in. So the view
+        # is called from here and its response returned, which skips the
+        # process_view of the middleware below this one (none of them has one).
+        if not getattr(request, "_profile_view", False) or iscoroutinefunction(view_func):
+            return None
+        if not _profiler_lock.acquire(blocking=False):
+            return None
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                response = view_func(request, *view_args, **view_kwargs)
+            finally:
+                profiler.disable()
+        finally:
+            _profiler_lock.release()
+        request._profiler = profiler
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF renders its Response after the view returned, time that as serialize
+        profile = _profile.get()
+        if profile is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda r: profile.add("serialize", time.perf_counter() - started))
+        return response
+
+    def _finish(self, request, response, profile, profiler, flag, sampled):
+        phases = profile.breakdown()
+        try:
+            profile_id = _store(request, response, profiler, phases, sampled)
+        except OSError as e:
+            print(f"[Profiling] Could not store profile for {request.path}: {e}")
+            profile_id = None
+
+        if flag == "text":
+            return HttpResponse(_report(profiler, phases), content_type="text/plain; charset=utf-8")
+        if flag:
+            response["Server-Timing"] = _server_timing(phases)
+            if profile_id:
+                response["X-Profile-Id"] = profile_id
+        return response
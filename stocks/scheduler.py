@@ -0,0 +1,251 @@
+import os
+import time
+import pickle
+import tempfile
+import threading
+from datetime import datetime
+from functools import partial
+
+from django.conf import settings
+
+from . import finnhub_service, market_calendar, metrics, upstream
+from .concurrency import fan_out
+from .market_calendar import CLOSED, EXTENDED, REGULAR
+
+try:
+    import fcntl
+except ImportError:    # not available on Windows, every worker refreshes for itself there
+    fcntl = None
+
+
+# Background refresh of the data behind the home page, the index bar and the
+# most requested details pages, on a cadence that follows the NYSE session:
+# every minute while the market trades, every few minutes around it and hourly
+# when it is closed. Entries are stored with a TTL of two refresh intervals, so
+# requests read them from memory and only go upstream when the scheduler falls
+# behind. Caches are per process: one worker, holding the lock file in
+# SCHEDULER_DIR, refreshes and writes a snapshot of them after each run, the
+# others load that snapshot into their own caches and take over the lock when
+# the refreshing worker exits.
+
+POPULAR_SYMBOLS = 10    # most requested details pages kept warm besides HOME_STOCKS
+
+# seconds between refreshes per session; quotes for ~25 symbols a minute stay
+# well inside the default Finnhub quota
+QUOTE_INTERVALS = {REGULAR: 60, EXTENDED: 5 * 60, CLOSED: 60 * 60}
+INDEX_INTERVALS = {REGULAR: 60, EXTENDED: 10 * 60, CLOSED: 60 * 60}
+PROFILE_INTERVALS = dict.fromkeys((REGULAR, EXTENDED, CLOSED), 12 * 60 * 60)
+FOLLOW_INTERVAL = 15    # seconds between snapshot checks (and lock attempts) of the other workers
+
+# the cached functions the jobs refresh, what the snapshot carries
+SNAPSHOT_FUNCTIONS = (
+    finnhub_service.get_index_data,
+    finnhub_service.get_quote,
+    finnhub_service.get_company_profile,
+    finnhub_service.get_recommendation_trends,
+)
+
+refreshes = metrics.Counter(
+    "scheduler_refreshes_total", "Background cache refreshes by job and outcome.", ("job", "result"),
+)
+
+
+def _symbols():
+    return list(dict.fromkeys(finnhub_service.HOME_STOCKS + finnhub_service.popular_symbols(POPULAR_SYMBOLS)))
+
+
+def _refresh_each(functions, symbols, ttl=None):
+    calls = {(fn.__name__, sym): partial(fn.refresh, sym, ttl=ttl) for fn in functions for sym in symbols}
+    fetched = fan_out(calls)
+    if len(fetched) < len(calls):
+        raise RuntimeError(f"{len(calls) - len(fetched)} of {len(calls)} calls failed")
+
+
+def refresh_quotes(interval):
+    try:
+        _refresh_each([finnhub_service.get_quote], _symbols(), ttl=2 * interval)
+    finally:
+        # even when a quote failed, or one bad symbol would stay popular forever
+        finnhub_service.decay_details_requests()
+
+
+def refresh_indices(interval):
+    finnhub_service.get_index_data.refresh(ttl=2 * interval)
+
+
+def refresh_profiles(interval):
+    # profiles and recommendation trends keep their own (day long) TTLs
+    _refresh_each([finnhub_service.get_company_profile, finnhub_service.get_recommendation_trends], _symbols())
+
+
+def _snapshot_path():
+    return os.path.join(settings.SCHEDULER_DIR, "snapshot.pkl")
+
+
+def write_snapshot():
+    """Writes the fresh entries of SNAPSHOT_FUNCTIONS' caches for the other workers."""
+    snapshot = {
+        "written_at": time.time(),
+        "entries": {fn.__name__: fn.cache.fresh_items() for fn in SNAPSHOT_FUNCTIONS},
+    }
+    path = _snapshot_path()
+    os.makedirs(settings.SCHEDULER_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=settings.SCHEDULER_DIR, prefix="snapshot.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(snapshot, f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def load_snapshot():
+    """Stores the snapshot's entries in this process' caches, returns how many were still fresh."""
+    try:
+        with open(_snapshot_path(), "rb") as f:
+            snapshot = pickle.load(f)
+        age = time.time() - snapshot["written_at"]
+        entries = snapshot["entries"]
+    except (OSError, ValueError, TypeError, KeyError, EOFError, pickle.UnpicklingError):
+        return 0
+
+    loaded = 0
+    for fn in SNAPSHOT_FUNCTIONS:
+        for key, value, ttl in entries.get(fn.__name__, ()):
+            if ttl > age:
+                fn.cache.set(key, value, ttl=ttl - age)
+                loaded += 1
+    return loaded
+
+
+class Leadership:
+    """Non-blocking exclusive lock on a file, held until the process exits or release() is called."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        if self._file is not None or fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class Job:
+    def __init__(self, name, run, intervals):
+        self.name = name
+        self.run = run
+        self.intervals = intervals
+        self.follows_session = len(set(intervals.values())) > 1
+        self.next_run = 0       # time.monotonic() deadline
+
+
+class RefreshScheduler:
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._stop = threading.Event()
+        self._thread = None
+        self._leadership = None
+        self._snapshot_mtime = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="refresh-scheduler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, job, session):
+        interval = job.intervals[session]
+        try:
+            # scheduled refreshes yield to interactive requests for upstream quota
+            with upstream.background():
+                job.run(interval)
+            refreshes.inc(job.name, "ok")
+        except Exception as e:
+            refreshes.inc(job.name, "error")
+            print(f"[Scheduler] {job.name} refresh failed: {e}")
+        return interval
+
+    def run_due(self):
+        """Runs the jobs that are due, returns the seconds until the next one is."""
+        session = market_calendar.session()
+        # a session change (e.g. the opening bell) brings the session driven jobs forward
+        until_change = (market_calendar.next_change() - datetime.now(market_calendar.NEW_YORK)).total_seconds()
+        for job in self.jobs:
+            if job.next_run <= time.monotonic():
+                interval = self._run(job, session)
+                if job.follows_session:
+                    interval = min(interval, until_change + 1)
+                job.next_run = time.monotonic() + interval
+        return min(job.next_run for job in self.jobs) - time.monotonic()
+
+    def follow(self):
+        """Loads the refreshing worker's snapshot when it changed since the last call."""
+        try:
+            mtime = os.stat(_snapshot_path()).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._snapshot_mtime:
+            self._snapshot_mtime = mtime
+            load_snapshot()
+
+    def step(self):
+        """One round of the loop, returns the seconds to wait before the next."""
+        if self._leadership is None:
+            self._leadership = Leadership(os.path.join(settings.SCHEDULER_DIR, "leader.lock"))
+        if not self._leadership.acquire():
+            self.follow()
+            return FOLLOW_INTERVAL
+        wait = self.run_due()
+        try:
+            write_snapshot()
+        except Exception as e:
+            print(f"[Scheduler] Writing the snapshot failed: {e}")
+        return wait
+
+    def _loop(self):
+        try:
+            while not self._stop.is_set():
+                self._stop.wait(max(self.step(), 1))
+        finally:
+            if self._leadership is not None:
+                self._leadership.release()
+
+
+scheduler = RefreshScheduler([
+    Job("indices", refresh_indices, INDEX_INTERVALS),
+    Job("profiles", refresh_profiles, PROFILE_INTERVALS),
+    Job("quotes", refresh_quotes, QUOTE_INTERVALS),     # last, it decays the request counts
+])
+
+
+def start_on_startup():
+    # called by wsgi.py/asgi.py after the application is built
+    if settings.REFRESH_SCHEDULER:
+        scheduler.start()
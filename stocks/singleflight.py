@@ -0,0 +1,75 @@
+import asyncio
+import weakref
+import threading
+from concurrent.futures import Future
+
+from . import metrics
+
+
+coalesced = metrics.Counter(
+    "singleflight_coalesced_total", "Calls that shared the result of an identical call already in flight.", ("name",),
+)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key runs the
+    function, everyone arriving while it runs waits for it and gets the same
+    result or exception. Nothing is kept once the call returns, caching the
+    result is up to the caller.
+
+    Threads share calls through do(), coroutines on one event loop through
+    do_async(); the two don't wait on each other.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}                                # key -> Future of the running call
+        self._tasks = weakref.WeakKeyDictionary()       # event loop -> {key: Task}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            coalesced.inc(self.name)
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key, fn):
+        """Like do(), `fn` returns a coroutine. It runs as its own task, a cancelled waiter doesn't cancel it for the rest."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.get(loop)
+            if tasks is None:
+                tasks = self._tasks[loop] = {}
+
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = loop.create_task(fn())
+
+            def done(task):
+                tasks.pop(key, None)
+                # retrieve the exception, every waiter may have been cancelled
+                # and asyncio would log it as never retrieved
+                if not task.cancelled():
+                    task.exception()
+            task.add_done_callback(done)
+        else:
+            coalesced.inc(self.name)
+        return await asyncio.shield(task)
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import time
+import tempfile
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+from . import upstream
+
+
+REFRESH_INTERVAL = 24 * 60 * 60    # the US symbol list only changes with listings/delistings
+MAX_FUZZY_LENGTH = 8               # typo matching only makes sense for ticker-like queries
+MAX_CANDIDATES = 200               # per match kind, keeps one-letter queries cheap
+RETRY_INTERVAL = 5 * 60            # seconds between refresh attempts after a failure
+
+_TOKEN = re.compile(r"[A-Z0-9]+")
+_END = "\uffff"
+
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class SymbolIndex:
+    """
+    Immutable in-memory index over the US symbol list.
+
+    Tickers and the words of every company name are kept in sorted arrays, so a
+    prefix lookup is two bisects. Typos in tickers are matched through a
+    single-deletion table (the SymSpell trick) instead of scanning every symbol.
+    """
+
+    def __init__(self, entries):
+        # entries: list of (symbol, description)
+        self.symbols = [symbol.upper() for symbol, _ in entries]
+        self.descriptions = [description for _, description in entries]
+        self.tokens = [tuple(_TOKEN.findall(description.upper())) for description in self.descriptions]
+
+        by_ticker = sorted(range(len(self.symbols)), key=self.symbols.__getitem__)
+        self.ticker_keys = [self.symbols[i] for i in by_ticker]
+        self.ticker_ids = by_ticker
+
+        words = sorted(
+            (token, position, i)
+            for i, tokens in enumerate(self.tokens)
+            for position, token in enumerate(tokens)
+        )
+        self.word_keys = [token for token, _, _ in words]
+        self.word_ids = [(position, i) for _, position, i in words]
+
+        self.deletes = {}
+        for i, symbol in enumerate(self.symbols):
+            if len(symbol) <= MAX_FUZZY_LENGTH:
+                for key in _deletes(symbol) | {symbol}:
+                    self.deletes.setdefault(key, []).append(i)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @staticmethod
+    def _range(keys, prefix):
+        return bisect_left(keys, prefix), bisect_left(keys, prefix + _END)
+
+    def search(self, query, limit=10):
+        words = _TOKEN.findall(query.upper())
+        if not words:
+            return []
+        ticker = query.strip().upper()
+        scored = {}
+
+        def offer(i, score):
+            if i not in scored or score < scored[i]:
+                scored[i] = score
+
+        # 1. ticker exact / prefix, shorter tickers first
+        lo, hi = self._range(self.ticker_keys, ticker)
+        for i in self.ticker_ids[lo:min(hi, lo + MAX_CANDIDATES)]:
+            offer(i, (0 if self.symbols[i] == ticker else 1, len(self.symbols[i])))
+
+        # 2. company name words, every query word has to prefix some word of the name
+        lo, hi = self._range(self.word_keys, words[0])
+        for position, i in self.word_ids[lo:min(hi, lo + MAX_CANDIDATES)]:
+            if all(any(token.startswith(word) for token in self.tokens[i]) for word in words[1:]):
+                offer(i, (2, position, len(self.symbols[i])))
+
+        # 3. tickers one typo away
+        if not scored and len(ticker) <= MAX_FUZZY_LENGTH:
+            for key in _deletes(ticker) | {ticker}:
+                for i in self.deletes.get(key, ()):
+                    offer(i, (3, len(self.symbols[i])))
+
+        best = sorted(scored, key=lambda i: (scored[i], self.symbols[i]))[:limit]
+        return [{"description": self.descriptions[i], "symbol": self.symbols[i]} for i in best]
+
+
+_index = None
+_loaded_at = 0
+_next_attempt = 0
+_loading = threading.Lock()
+
+
+def _fetch_entries():
+    url = f"{settings.FINNHUB_API_URL}/stock/symbol"
+    response = upstream.finnhub_api.get(url, params={"exchange": "US", "token": settings.FINNHUB_API_KEY})
+    response.raise_for_status()
+    return [(item["symbol"], item.get("description") or "") for item in response.json() if item.get("symbol")]
+
+
+def _read_snapshot():
+    try:
+        with open(settings.SYMBOL_INDEX_PATH) as f:
+            snapshot = json.load(f)
+        return snapshot["fetched_at"], [tuple(entry) for entry in snapshot["entries"]]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_snapshot(fetched_at, entries):
+    # a temp file of our own, every worker process refreshes the same snapshot
+    path = settings.SYMBOL_INDEX_PATH
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"fetched_at": fetched_at, "entries": entries}, f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def refresh():
+    """Loads the symbol list (disk snapshot first, upstream when it's stale) and swaps the index in."""
+    global _index, _loaded_at
+    if not _loading.acquire(blocking=False):
+        return  # another thread is already on it
+
+    try:
+        snapshot = _read_snapshot() if _index is None else None
+        if snapshot is not None:
+            fetched_at, entries = snapshot
+            _index, _loaded_at = SymbolIndex(entries), fetched_at
+
+        if time.time() - _loaded_at >= REFRESH_INTERVAL:
+            with upstream.background():
+                entries = _fetch_entries()
+            fetched_at = time.time()
+            _index, _loaded_at = SymbolIndex(entries), fetched_at
+            _write_snapshot(fetched_at, entries)
+            print(f"[SymbolIndex] Loaded {len(entries)} US symbols")
+    except Exception as e:
+        print(f"[SymbolIndex] Refresh failed: {e}")
+    finally:
+        _loading.release()
+
+
+def search(query, limit=10):
+    """
+    Ranked local matches for a query. Returns None while no index is loaded yet,
+    so callers can fall back to the upstream search.
+    """
+    global _next_attempt
+    now = time.time()
+    if (_index is None or now - _loaded_at >= REFRESH_INTERVAL) and now >= _next_attempt:
+        _next_attempt = now + RETRY_INTERVAL
+        threading.Thread(target=refresh, daemon=True).start()
+    if _index is None:
+        return None
+    return _index.search(query, limit)
@@ -1,3 +1,1275 @@
-from django.test import TestCase
+import gc
+import io
+import os
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import date, datetime, timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from . import (
+    bars, charts, finnhub_service, history_store, indicators, market_calendar, portfolio, scheduler,
+    symbol_index, upstream, warmup,
+)
+from .cache import TTLCache, cached
+from .concurrency import fan_out
+from .feed import FinnhubFeed, dropped_updates
+from .ml import jobs, predictor
+from .singleflight import SingleFlight, coalesced
+
+
+class FeedSendTests(SimpleTestCase):
+    def setUp(self):
+        self.layer = InMemoryChannelLayer(capacity=1)
+        patcher = mock.patch("stocks.feed.get_channel_layer", return_value=self.layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("stocks.feed.bar_engine")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.feed = FinnhubFeed()
+        self.feed.channels = {"slow": {"AAPL"}, "fast": {"AAPL"}}
+        self.feed.subscribers = {"AAPL": {"slow", "fast"}}
+
+    async def _fill(self, channel_name):
+        await self.layer.send(channel_name, {"type": "price.update", "payload": "backlog"})
+
+    async def test_full_channel_does_not_stop_send_all(self):
+        await self._fill("slow")
+        before = dropped_updates._values.get((), 0)
+
+        await self.feed._send_all('{"error": "down"}')
+
+        self.assertEqual((await self.layer.receive("fast"))["payload"], '{"error": "down"}')
+        self.assertEqual((await self.layer.receive("slow"))["payload"], "backlog")
+        self.assertEqual(dropped_updates._values.get((), 0), before + 1)
+
+    async def test_full_channel_does_not_stop_push(self):
+        await self._fill("slow")
+        push = asyncio.create_task(self.feed._push())
+        try:
+            self.feed._on_trades([{"s": "AAPL", "p": 101.5}])
+            message = await asyncio.wait_for(self.layer.receive("fast"), timeout=1)
+            self.assertIn('"price": 101.5', message["payload"])
+
+            # the pusher survived the full channel and delivers the next change
+            await self.layer.receive("slow")
+            self.feed._on_trades([{"s": "AAPL", "p": 102.0}])
+            message = await asyncio.wait_for(self.layer.receive("slow"), timeout=3)
+            self.assertIn('"price": 102.0', message["payload"])
+            self.assertFalse(push.done())
+        finally:
+            push.cancel()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("stocks.cache.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire_after_ttl(self):
+        cache = TTLCache("test", ttl=10, stale_ttl=5)
+        cache.set("key", "value")
+        self.clock.now += 9
+        self.assertEqual(cache.lookup("key"), ("value", True))
+        self.clock.now += 2
+        self.assertEqual(cache.lookup("key"), ("value", False))     # stale
+        self.clock.now += 5
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache("test", ttl=10, maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def _wait_for_refresh(self, cache):
+        deadline = time.monotonic() + 5
+        while cache._refreshing and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_stale_hits_share_one_background_refresh(self):
+        release, calls = threading.Event(), []
+
+        @cached(ttl=10, stale_ttl=60, name="test-swr")
+        def lookup(symbol):
+            calls.append(symbol)
+            if len(calls) > 1:
+                release.wait(5)
+            return len(calls)
+
+        self.assertEqual(lookup("AAPL"), 1)
+        self.clock.now += 15
+        # stale hits answer the old value straight away, one refresh runs
+        self.assertEqual([lookup("AAPL") for _ in range(3)], [1, 1, 1])
+        release.set()
+        self._wait_for_refresh(lookup.cache)
+
+        self.assertEqual(calls, ["AAPL", "AAPL"])
+        self.assertEqual(lookup("AAPL"), 2)
+
+    def test_failed_refresh_keeps_stale_value(self):
+        calls = []
+
+        @cached(ttl=10, stale_ttl=60, name="test-swr-errors")
+        def lookup(symbol):
+            calls.append(symbol)
+            if len(calls) > 1:
+                raise RuntimeError("upstream down")
+            return "old"
+
+        lookup("AAPL")
+        self.clock.now += 15
+        self.assertEqual(lookup("AAPL"), "old")
+        self._wait_for_refresh(lookup.cache)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(lookup.cache.lookup(("AAPL",)), ("old", False))
+
+    def test_exceptions_are_not_cached(self):
+        calls = []
+
+        @cached(ttl=10, name="test-errors")
+        def lookup(symbol):
+            calls.append(symbol)
+            raise RuntimeError("upstream down")
+
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                lookup("AAPL")
+        self.assertEqual(len(calls), 2)
+
+
+def _ny(*args):
+    return datetime(*args, tzinfo=market_calendar.NEW_YORK)
+
+
+class MarketCalendarTests(SimpleTestCase):
+    def test_new_year_on_saturday_is_not_observed_on_friday(self):
+        # 2022-01-01 and 2028-01-01 fall on a Saturday
+        self.assertTrue(market_calendar.is_trading_day(date(2021, 12, 31)))
+        self.assertTrue(market_calendar.is_trading_day(date(2027, 12, 31)))
+        # a Sunday New Year's Day moves to Monday
+        self.assertFalse(market_calendar.is_trading_day(date(2023, 1, 2)))
+
+    def test_juneteenth_from_2022(self):
+        self.assertTrue(market_calendar.is_trading_day(date(2021, 6, 18)))
+        self.assertFalse(market_calendar.is_trading_day(date(2022, 6, 20)))     # observed, the 19th was a Sunday
+        self.assertFalse(market_calendar.is_trading_day(date(2023, 6, 19)))
+
+    def test_early_closes(self):
+        self.assertEqual(market_calendar.early_closes(2025), {date(2025, 7, 3), date(2025, 11, 28), date(2025, 12, 24)})
+        # July 3rd 2026 is the observed Independence Day, Christmas Eve 2027 the observed Christmas
+        self.assertEqual(market_calendar.early_closes(2026), {date(2026, 11, 27), date(2026, 12, 24)})
+        self.assertEqual(market_calendar.early_closes(2027), {date(2027, 11, 26)})
+
+        self.assertEqual(market_calendar.session(_ny(2025, 7, 3, 12, 59)), market_calendar.REGULAR)
+        self.assertEqual(market_calendar.session(_ny(2025, 7, 3, 13, 0)), market_calendar.EXTENDED)
+        self.assertEqual(market_calendar.session(_ny(2025, 12, 24, 17, 0)), market_calendar.CLOSED)
+
+    def test_next_change_across_holiday_weekend(self):
+        # Independence Day 2025 is a Friday, after the early close the next change is Monday's pre-market
+        self.assertEqual(market_calendar.next_change(_ny(2025, 7, 3, 18, 0)), _ny(2025, 7, 7, 4, 0))
+        self.assertEqual(market_calendar.next_change(_ny(2026, 12, 24, 12, 0)), _ny(2026, 12, 24, 13, 0))
+        self.assertEqual(market_calendar.next_change(_ny(2026, 12, 24, 18, 0)), _ny(2026, 12, 28, 4, 0))
+        # Good Friday 2026
+        self.assertEqual(market_calendar.next_change(_ny(2026, 4, 2, 20, 0)), _ny(2026, 4, 6, 4, 0))
+
+
+class RefreshSchedulerTests(SimpleTestCase):
+    def test_session_change_brings_session_jobs_forward(self):
+        ran = []
+        quotes = scheduler.Job("quotes", ran.append, scheduler.QUOTE_INTERVALS)
+        profiles = scheduler.Job("profiles", ran.append, scheduler.PROFILE_INTERVALS)
+        refresh = scheduler.RefreshScheduler([quotes, profiles])
+
+        # Monday morning, ten minutes before the pre-market opens
+        now = _ny(2025, 7, 7, 3, 50)
+        with mock.patch.object(market_calendar, "session", return_value=market_calendar.session(now)), \
+                mock.patch.object(market_calendar, "next_change", return_value=market_calendar.next_change(now)), \
+                mock.patch.object(scheduler, "datetime", mock.Mock(now=mock.Mock(return_value=now))):
+            refresh.run_due()
+
+        self.assertEqual(ran, [60 * 60, 12 * 60 * 60])
+        # the hourly quotes job runs right after the change, the profiles job keeps its interval
+        self.assertAlmostEqual(quotes.next_run - time.monotonic(), 10 * 60 + 1, delta=5)
+        self.assertAlmostEqual(profiles.next_run - time.monotonic(), 12 * 60 * 60, delta=5)
+
+
+class SchedulerLeadershipTests(SimpleTestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(SCHEDULER_DIR=directory))
+
+        @cached(ttl=60, name="scheduler-test")
+        def quote(symbol):
+            return {"c": len(symbol)}
+        self.quote = quote
+        self.enterContext(mock.patch.object(scheduler, "SNAPSHOT_FUNCTIONS", (quote,)))
+
+    def _scheduler(self, ran):
+        refresh = scheduler.RefreshScheduler([scheduler.Job("quotes", ran.append, scheduler.QUOTE_INTERVALS)])
+        self.addCleanup(lambda: refresh._leadership and refresh._leadership.release())
+        return refresh
+
+    def test_lock_is_held_by_one_process_at_a_time(self):
+        path = os.path.join(settings.SCHEDULER_DIR, "leader.lock")
+        first, second = scheduler.Leadership(path), scheduler.Leadership(path)
+        self.addCleanup(first.release)
+        self.addCleanup(second.release)
+
+        self.assertTrue(first.acquire())
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        first.release()
+        self.assertTrue(second.acquire())
+
+    def test_only_the_leader_runs_jobs_and_the_others_load_its_snapshot(self):
+        leader_ran, follower_ran = [], []
+        leader, follower = self._scheduler(leader_ran), self._scheduler(follower_ran)
+
+        self.quote.refresh("AAPL")
+        leader.step()
+        self.quote.cache.clear()
+
+        self.assertEqual(follower.step(), scheduler.FOLLOW_INTERVAL)
+        self.assertEqual(len(leader_ran), 1)
+        self.assertEqual(follower_ran, [])
+        self.assertEqual(self.quote.cache.get(("AAPL",)), {"c": 4})
+
+        # the follower takes over once the leader is gone
+        leader._leadership.release()
+        follower.step()
+        self.assertEqual(len(follower_ran), 1)
+
+    def test_snapshot_entries_keep_their_remaining_ttl(self):
+        self.quote.refresh("AAPL", ttl=30)
+        self.quote.refresh("MSFT", ttl=90)
+        scheduler.write_snapshot()
+        self.quote.cache.clear()
+
+        with mock.patch.object(scheduler.time, "time", return_value=time.time() + 60):
+            self.assertEqual(scheduler.load_snapshot(), 1)
+        self.assertIsNone(self.quote.cache.get(("AAPL",)))
+        self.assertEqual(self.quote.cache.get(("MSFT",)), {"c": 4})
+        self.assertLess(self.quote.cache.fresh_items()[0][2], 31)
+
+    def test_missing_or_corrupt_snapshots_load_nothing(self):
+        self.assertEqual(scheduler.load_snapshot(), 0)
+        with open(os.path.join(settings.SCHEDULER_DIR, "snapshot.pkl"), "wb") as f:
+            f.write(b"not a pickle")
+        self.assertEqual(scheduler.load_snapshot(), 0)
+
+
+class FanOutTests(SimpleTestCase):
+    def test_failed_calls_are_left_out(self):
+        def fail():
+            raise RuntimeError("upstream down")
+
+        self.assertEqual(fan_out({"ok": lambda: 1, "failed": fail, "also_ok": lambda: 2}), {"ok": 1, "also_ok": 2})
+
+    def test_slow_calls_are_given_up_after_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        started = time.monotonic()
+        results = fan_out({"fast": lambda: "fast", "slow": lambda: release.wait(5)}, timeout=0.2)
+        self.assertEqual(results, {"fast": "fast"})
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_timeout_is_shared_by_the_batch(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        started = time.monotonic()
+        fan_out({i: lambda: release.wait(5) for i in range(3)}, timeout=0.3)
+        # one deadline for all calls, not 0.3s per call
+        self.assertLess(time.monotonic() - started, 0.8)
+
+
+class FanOutContextTests(SimpleTestCase):
+    def test_calls_keep_callers_upstream_priority(self):
+        calls = {i: upstream._priority.get for i in range(4)}
+        with upstream.background():
+            self.assertEqual(set(fan_out(calls).values()), {upstream.LOW})
+        self.assertEqual(set(fan_out(calls).values()), {upstream.HIGH})
+
+
+class PopularSymbolsTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(finnhub_service, "_detail_requests", finnhub_service.Counter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counts_decay_when_a_quote_refresh_fails(self):
+        for _ in range(4):
+            finnhub_service.note_details_request("BAD")
+        with mock.patch.object(scheduler, "_refresh_each", side_effect=RuntimeError("1 of 16 calls failed")):
+            with self.assertRaises(RuntimeError):
+                scheduler.refresh_quotes(60)
+        self.assertEqual(finnhub_service._detail_requests["BAD"], 2)
+
+    @mock.patch.object(finnhub_service, "DETAIL_REQUESTS_TRACKED", 3)
+    def test_tracked_symbols_are_capped(self):
+        for symbol, count in (("AAPL", 3), ("MSFT", 2), ("TSLA", 1), ("NVDA", 1)):
+            for _ in range(count):
+                finnhub_service.note_details_request(symbol)
+        self.assertEqual(finnhub_service.popular_symbols(10), ["AAPL", "MSFT", "NVDA"])
+
+    def test_unknown_symbols_are_not_counted(self):
+        lookups = {"get_company_profile": {}, "get_recommendation_trends": [], "get_quote": {"c": 0}}
+        with mock.patch.multiple(finnhub_service, **{name: mock.Mock(return_value=value)
+                                                      for name, value in lookups.items()}):
+            finnhub_service.get_company_details("NOPE")
+        self.assertEqual(finnhub_service.popular_symbols(10), [])
+
+
+class MetricsAccessTests(TestCase):
+    def _get(self, user=None, authorization=None):
+        if user is not None:
+            authorization = f"Token {Token.objects.create(user=user).key}"
+        headers = {"Authorization": authorization} if authorization else {}
+        return self.client.get("/metrics", headers=headers)
+
+    def test_requires_staff(self):
+        self.assertIn(self._get().status_code, (401, 403))
+        self.assertEqual(self._get(User.objects.create_user("user")).status_code, 403)
+        self.assertEqual(self._get(User.objects.create_user("staff", is_staff=True)).status_code, 200)
+
+    @override_settings(METRICS_TOKEN="scrape-me")
+    def test_bearer_token(self):
+        self.assertEqual(self._get(authorization="Bearer scrape-me").status_code, 200)
+        self.assertIn(self._get(authorization="Bearer wrong").status_code, (401, 403))
+
+
+@override_settings(PROFILE_DIR=tempfile.mkdtemp(), PROFILE_SAMPLE_RATE=0)
+class AsgiProfilingTests(TestCase):
+    async def test_sync_view_runs_under_cprofile(self):
+        user = await sync_to_async(User.objects.create_user)("staff", is_staff=True)
+        token = await sync_to_async(Token.objects.create)(user=user)
+
+        # the async client builds the middleware chain in async mode, as under Channels' ASGI handler
+        response = await self.async_client.get(
+            "/stocks/analysis/jobs/missing/", {"profile": "text"}, headers={"Authorization": f"Token {token.key}"},
+        )
+        report = response.content.decode()
+        self.assertIn("function calls", report)
+        self.assertIn("analysis_job", report)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def _run_threads(self, flight, fn, count=5):
+        outcomes = []
+
+        def call():
+            try:
+                outcomes.append(flight.do("key", fn))
+            except Exception as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, outcomes
+
+    def _wait_for_followers(self, flight, count):
+        # everyone but the leader joined the running call before it is released
+        deadline = time.monotonic() + 5
+        while coalesced._values.get((flight.name,), 0) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_threads_share_one_call(self):
+        flight, release, calls = SingleFlight("test-threads"), threading.Event(), []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return "value"
+
+        threads, outcomes = self._run_threads(flight, fn)
+        self._wait_for_followers(flight, 4)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(outcomes, ["value"] * 5)
+        self.assertEqual(flight._calls, {})
+
+    def test_exception_reaches_every_thread(self):
+        flight, release = SingleFlight("test-thread-errors"), threading.Event()
+
+        def fn():
+            release.wait(5)
+            raise ValueError("upstream down")
+
+        threads, outcomes = self._run_threads(flight, fn)
+        self._wait_for_followers(flight, 4)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(outcomes), 5)
+        self.assertTrue(all(isinstance(outcome, ValueError) for outcome in outcomes))
+
+    async def test_coroutines_share_one_task(self):
+        flight, release, calls = SingleFlight("test"), asyncio.Event(), []
+
+        async def fn():
+            calls.append(1)
+            await release.wait()
+            return "value"
+
+        waiters = [asyncio.create_task(flight.do_async("key", fn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        self.assertEqual(await asyncio.gather(*waiters), ["value"] * 3)
+        self.assertEqual(calls, [1])
+
+    async def test_exception_reaches_every_coroutine(self):
+        flight = SingleFlight("test")
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        outcomes = await asyncio.gather(*(flight.do_async("key", fn) for _ in range(3)), return_exceptions=True)
+        self.assertTrue(all(isinstance(outcome, ValueError) for outcome in outcomes))
+
+    async def test_cancelled_waiter_does_not_cancel_the_call(self):
+        flight, release = SingleFlight("test"), asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return "value"
+
+        first = asyncio.create_task(flight.do_async("key", fn))
+        second = asyncio.create_task(flight.do_async("key", fn))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await second, "value")
+        self.assertTrue(first.cancelled())
+
+    async def test_failure_after_all_waiters_cancelled_is_not_logged(self):
+        flight, release, unhandled = SingleFlight("test"), asyncio.Event(), []
+        loop = asyncio.get_running_loop()
+        previous = loop.get_exception_handler()
+        loop.set_exception_handler(lambda loop, context: unhandled.append(context))
+        self.addCleanup(loop.set_exception_handler, previous)
+
+        async def fn():
+            await release.wait()
+            raise ValueError("upstream down")
+
+        waiter = asyncio.create_task(flight.do_async("key", fn))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        # the call fails once nobody waits for it any more
+        release.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        del waiter
+        gc.collect()
+
+        self.assertEqual(unhandled, [])
+
+
+class FakeProphet:
+    fits = []
+
+    def fit(self, df, init=None):
+        FakeProphet.fits.append((len(df), init))
+
+    def make_future_dataframe(self, periods):
+        return pd.DataFrame({"ds": pd.date_range(pd.Timestamp.today().normalize(), periods=periods)})
+
+    def predict(self, future):
+        return future.assign(yhat=100.0, yhat_lower=95.0, yhat_upper=105.0)
+
+
+class ForecastCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        for context in (
+            override_settings(FORECAST_CACHE_DIR=directory),
+            mock.patch.object(predictor, "_forecasts", TTLCache("test-forecasts", ttl=60)),
+            mock.patch.object(predictor, "fit_model", side_effect=lambda symbol, df: FakeProphet()),
+            mock.patch.object(predictor, "_save_model"),
+            mock.patch.object(predictor, "fetch_stock_data", side_effect=lambda symbol: self.history),
+        ):
+            self.enterContext(context)
+        self.directory = directory
+        self.history = pd.DataFrame({"ds": pd.date_range("2026-01-01", periods=30), "y": 100.0})
+
+    def _expire(self, symbol="AAPL"):
+        # forget the in-memory entry and age the one on disk past FORECAST_RECHECK
+        predictor._forecasts.clear()
+        path = predictor._cache_path(symbol, "14.meta.json")
+        with open(path) as f:
+            meta = json.load(f)
+        meta["checked_at"] -= predictor.FORECAST_RECHECK + 1
+        with open(path, "w") as f:
+            json.dump(meta, f)
+
+    def test_fits_are_keyed_on_the_last_bar(self):
+        predictor.generate_forecast("AAPL")
+        self.assertEqual(predictor.fit_model.call_count, 1)
+
+        # recheck without new bars: the stored forecast is kept
+        self._expire()
+        predictor.generate_forecast("AAPL")
+        self.assertEqual(predictor.fit_model.call_count, 1)
+
+        # a new daily bar refits
+        self._expire()
+        self.history = pd.DataFrame({"ds": pd.date_range("2026-01-01", periods=31), "y": 101.0})
+        today_price, _ = predictor.generate_forecast("AAPL")
+        self.assertEqual(predictor.fit_model.call_count, 2)
+        self.assertEqual(today_price, 101.0)
+
+    def test_disk_entry_survives_restart(self):
+        predictor.generate_forecast("AAPL")
+        predictor._forecasts.clear()
+        self.assertIsNotNone(predictor.peek_forecast("AAPL"))
+        # writes go through temp files that are swapped in, none are left behind
+        self.assertFalse([name for name in os.listdir(self.directory) if name.endswith(".tmp")])
+
+    def test_corrupt_entries_are_misses(self):
+        predictor.generate_forecast("AAPL")
+        predictor._forecasts.clear()
+        with open(predictor._cache_path("AAPL", "14.forecast.pkl"), "wb") as f:
+            f.write(b"\x80\x04truncated")
+        self.assertIsNone(predictor.peek_forecast("AAPL"))
+
+        predictor.generate_forecast("AAPL")
+        predictor._forecasts.clear()
+        with open(predictor._cache_path("AAPL", "14.meta.json"), "w") as f:
+            f.write('{"last_date": "2026-01-30"}')
+        self.assertIsNone(predictor.peek_forecast("AAPL"))
+
+
+class WarmStartTests(SimpleTestCase):
+    def test_previous_model_seeds_the_fit(self):
+        df = pd.DataFrame({"ds": pd.date_range("2026-01-01", periods=30), "y": 100.0})
+        FakeProphet.fits = []
+        with mock.patch("prophet.Prophet", FakeProphet), \
+                mock.patch("prophet.utilities.warm_start_params", return_value={"k": 0.1}), \
+                mock.patch.object(predictor, "_load_model", side_effect=[None, object()]):
+            predictor.fit_model("AAPL", df)     # nothing stored, cold fit
+            predictor.fit_model("AAPL", df)     # yesterday's model, warm fit
+        self.assertEqual(FakeProphet.fits, [(30, None), (30, {"k": 0.1})])
+
+
+def _bars(first_day, count, close=100.0):
+    days = np.arange(count) + np.datetime64(first_day, "D").astype("<i8")
+    return {
+        "date": days, "open": np.full(count, close), "high": np.full(count, close + 1),
+        "low": np.full(count, close - 1), "close": np.full(count, close), "volume": np.full(count, 1000.0),
+    }
+
+
+class HistoryStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(override_settings(HISTORY_DIR=tempfile.mkdtemp()))
+        self.enterContext(mock.patch.dict(history_store._checked, clear=True))
+        self.download = self.enterContext(mock.patch.object(history_store, "download"))
+
+    def _update(self, bars):
+        self.download.return_value = bars
+        return history_store.update("AAPL", force=True)
+
+    def test_rebuild_then_append(self):
+        self.assertEqual(self._update(_bars("2026-01-01", 5)), 5)
+        # the delta download overlaps the stored days, only newer bars are appended
+        self.assertEqual(self._update(_bars("2026-01-04", 4, close=101.0)), 2)
+
+        stored = history_store.read("AAPL")
+        self.assertEqual(len(stored["date"]), 7)
+        self.assertEqual(str(stored["date"][-1]), "2026-01-07")
+        self.assertEqual(stored["close"].tolist(), [100.0] * 5 + [101.0] * 2)
+        self.assertEqual(history_store._read_meta("AAPL")["rows"], 7)
+
+    def test_empty_rebuild_keeps_history(self):
+        self._update(_bars("2026-01-01", 5))
+        with mock.patch.object(history_store, "_plan", return_value=(history_store.HISTORY_START, True)):
+            self.assertEqual(self._update(_bars("2026-01-01", 0)), 0)
+        self.assertEqual(len(history_store.read("AAPL")["close"]), 5)
+
+    def test_misaligned_columns_are_rebuilt(self):
+        self._update(_bars("2026-01-01", 5))
+        # a writer that died after appending to one column only
+        with open(history_store._column_path("AAPL", "close"), "ab") as f:
+            f.write(np.array([102.0], dtype="<f8").tobytes())
+        self.assertEqual(history_store._plan("AAPL"), (history_store.HISTORY_START, True))
+
+        self._update(_bars("2026-01-01", 6, close=103.0))
+        self.assertEqual(self.download.call_args[0][1], history_store.HISTORY_START)
+        self.assertEqual(history_store._column_rows("AAPL"), {6})
+        self.assertEqual(history_store.read("AAPL")["close"].tolist(), [103.0] * 6)
+
+
+class StubPool:
+    """In-process stand-in for the forecast ProcessPoolExecutor, futures stay pending until resolved."""
+
+    def __init__(self, **kwargs):
+        self._broken = False
+        self.submitted = []
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.submitted.append((args, future))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+class ForecastJobTests(SimpleTestCase):
+    def setUp(self):
+        self.pools = []
+
+        def new_pool(**kwargs):
+            self.pools.append(StubPool(**kwargs))
+            return self.pools[-1]
+
+        self.enterContext(mock.patch.object(jobs, "ProcessPoolExecutor", side_effect=new_pool))
+        self.enterContext(mock.patch.object(jobs, "_executor", None))
+        self.enterContext(mock.patch.object(jobs, "_worker_metrics", object()))
+        self.enterContext(mock.patch.dict(jobs._jobs, clear=True))
+        self.enterContext(mock.patch.dict(jobs._inflight, clear=True))
+
+    def test_identical_forecasts_share_a_job(self):
+        first = jobs.submit_forecast("aapl")
+        self.assertIs(jobs.submit_forecast("AAPL"), first)
+        self.assertEqual(len(self.pools[0].submitted), 1)
+        self.assertEqual(first.status, "queued")
+
+        first.future.set_result({"symbol": "AAPL"})
+        self.assertEqual(jobs.get_job(first.id).to_dict()["result"], {"symbol": "AAPL"})
+        # once finished the next request starts a new fit
+        self.assertIsNot(jobs.submit_forecast("AAPL"), first)
+
+    @mock.patch.object(jobs, "MAX_PENDING_JOBS", 2)
+    def test_queue_full(self):
+        jobs.submit_forecast("AAPL")
+        jobs.submit_forecast("MSFT")
+        with self.assertRaises(jobs.QueueFull):
+            jobs.submit_forecast("TSLA")
+        # a symbol already in flight is still answered with its job
+        self.assertEqual(jobs.submit_forecast("AAPL").symbol, "AAPL")
+
+    def test_broken_pool_is_replaced(self):
+        job = jobs.submit_forecast("AAPL")
+        self.pools[0]._broken = "A child process terminated abruptly"
+        job.future.set_exception(RuntimeError("worker died"))
+        self.assertEqual(job.to_dict()["status"], "failed")
+
+        retry = jobs.submit_forecast("AAPL")
+        self.assertEqual(len(self.pools), 2)
+        self.assertTrue(self.pools[0].shut_down)
+        self.assertEqual(self.pools[1].submitted[0][0], ("AAPL", 14))
+        self.assertIsNot(retry, job)
+
+
+class BatchAnalysisViewTests(TestCase):
+    def setUp(self):
+        token = Token.objects.create(user=User.objects.create_user("alice"))
+        self.headers = {"Authorization": f"Token {token.key}"}
+
+    def _post(self, body):
+        return self.client.post("/stocks/analysis/batch/", body, content_type="application/json", headers=self.headers)
+
+    def test_rejects_invalid_symbols(self):
+        for symbols in ([1, None], ["AAPL", ""], ["AAPL", "  "], [], "AAPL"):
+            with self.subTest(symbols=symbols):
+                self.assertEqual(self._post({"symbols": symbols}).status_code, 400)
+
+    def _forecast(self, start, periods):
+        ds = pd.date_range(start, periods=periods)
+        return pd.DataFrame({"ds": ds, "yhat": 110.0, "yhat_lower": 105.0, "yhat_upper": 115.0})
+
+    def test_mixes_cached_finished_and_pending_forecasts(self):
+        from .ml import batch
+
+        today = pd.Timestamp.today().normalize()
+        done, running = Future(), Future()
+        done.set_result({"symbol": "MSFT"})
+        submitted = {"MSFT": jobs.Job("MSFT", 14, done), "TSLA": jobs.Job("TSLA", 14, running)}
+        cached = {
+            # a frame shorter than the requested horizon is summarized like any other
+            "AAPL": (100.0, self._forecast(today, 3)),
+            "OLD": (100.0, self._forecast(today - pd.Timedelta(days=30), 5)),
+        }
+        self.enterContext(mock.patch.object(batch.history_store, "update_many"))
+        self.enterContext(mock.patch.object(batch, "peek_forecast", lambda symbol, days: cached.get(symbol)))
+        self.enterContext(mock.patch.object(batch, "submit_forecast", lambda symbol, days: submitted[symbol]))
+        self.enterContext(mock.patch.object(batch, "WAIT_TIMEOUT", 0))
+
+        response = self._post({"symbols": ["aapl", "msft", "tsla", "old", "AAPL "]})
+
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(set(body["results"]), {"AAPL", "MSFT"})
+        aapl = body["results"]["AAPL"]
+        self.assertEqual(aapl["symbol"], "AAPL")
+        self.assertIn("message", aapl)
+        self.assertEqual(len(aapl["forecast"]), 2)
+        self.assertEqual(aapl["predicted_price"], 110.0)
+        self.assertEqual(aapl["recommendation"], "buy")
+        self.assertEqual(body["results"]["MSFT"], {"symbol": "MSFT"})
+        self.assertEqual(set(body["errors"]), {"OLD"})
+        self.assertEqual(body["pending"], [{"job_id": submitted["TSLA"].id, "symbol": "TSLA", "status": "queued"}])
+
+    def test_answers_200_when_nothing_is_pending(self):
+        from .ml import batch
+
+        today = pd.Timestamp.today().normalize()
+        self.enterContext(mock.patch.object(batch.history_store, "update_many"))
+        self.enterContext(mock.patch.object(batch, "peek_forecast", lambda symbol, days: (100.0, self._forecast(today, 10))))
+
+        response = self._post({"symbols": ["AAPL"]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["pending"], [])
+
+
+def _candles(close, start="2024-01-01"):
+    close = np.asarray(close, dtype=float)
+    return {
+        "time": np.arange(np.datetime64(start, "D"), np.datetime64(start, "D") + len(close)),
+        "open": close - 0.5,
+        "high": close + 1,
+        "low": close - 1,
+        "close": close,
+        "volume": np.full(len(close), 10.0),
+    }
+
+
+class DownsampleTests(SimpleTestCase):
+    def test_returns_candles_untouched_when_points_cover_them(self):
+        candles = _candles(range(10))
+        for points in (10, 11, 500):
+            with self.subTest(points=points):
+                self.assertIs(charts.lttb(candles, points), candles)
+                self.assertIs(charts.bucket_ohlc(candles, points), candles)
+
+    def test_lttb_keeps_first_and_last_and_the_extremes(self):
+        close = np.sin(np.linspace(0, 4 * np.pi, 200)) * 10 + 100
+        close[77] = 150
+        candles = _candles(close)
+
+        sampled = charts.lttb(candles, 20)
+
+        self.assertEqual(len(sampled["time"]), 20)
+        self.assertEqual(sampled["time"][0], candles["time"][0])
+        self.assertEqual(sampled["time"][-1], candles["time"][-1])
+        self.assertTrue(np.all(np.diff(sampled["time"].astype("int64")) > 0))
+        self.assertIn(150, sampled["close"])
+        # whole candles are selected, not just closes
+        index = np.searchsorted(candles["time"], sampled["time"])
+        for field in charts.CANDLE_FIELDS:
+            np.testing.assert_array_equal(sampled[field], candles[field][index])
+
+    def test_lttb_needs_three_points(self):
+        candles = _candles(range(10))
+        self.assertIs(charts.lttb(candles, 2), candles)
+
+    def test_bucket_ohlc_merges_consecutive_candles(self):
+        candles = _candles([5, 7, 3, 4, 9, 8, 6, 2, 1, 10])
+
+        buckets = charts.bucket_ohlc(candles, 3)
+
+        # 10 candles into 3 buckets start at 0, 3 and 6
+        np.testing.assert_array_equal(buckets["time"], candles["time"][[0, 3, 6]])
+        np.testing.assert_array_equal(buckets["open"], [4.5, 3.5, 5.5])
+        np.testing.assert_array_equal(buckets["high"], [8, 10, 11])
+        np.testing.assert_array_equal(buckets["low"], [2, 3, 0])
+        np.testing.assert_array_equal(buckets["close"], [3, 8, 10])
+        np.testing.assert_array_equal(buckets["volume"], [30, 30, 40])
+        self.assertEqual(buckets["volume"].sum(), candles["volume"].sum())
+
+    def test_weekly_candles_start_on_monday(self):
+        # Wednesday 2024-01-03 to Tuesday 2024-01-16, weekends included
+        candles = _candles(np.arange(14) + 100.0, start="2024-01-03")
+        bars = {"date": candles["time"], **{field: candles[field] for field in charts.CANDLE_FIELDS[1:]}}
+        self.enterContext(mock.patch.object(charts.history_store, "load", return_value=bars))
+
+        weekly = charts.daily_candles("AAPL", date(2024, 1, 1), weekly=True)
+
+        np.testing.assert_array_equal(
+            weekly["time"], np.array(["2024-01-03", "2024-01-08", "2024-01-15"], dtype="datetime64[D]"))
+        np.testing.assert_array_equal(weekly["open"], [99.5, 104.5, 111.5])
+        np.testing.assert_array_equal(weekly["close"], [104, 111, 113])
+        np.testing.assert_array_equal(weekly["high"], [105, 112, 114])
+        np.testing.assert_array_equal(weekly["low"], [99, 104, 111])
+        np.testing.assert_array_equal(weekly["volume"], [50, 70, 20])
+
+    def test_weekly_candles_of_an_empty_range(self):
+        bars = {"date": np.array(["2024-01-03"], dtype="datetime64[D]"),
+                **{field: np.ones(1) for field in charts.CANDLE_FIELDS[1:]}}
+        self.enterContext(mock.patch.object(charts.history_store, "load", return_value=bars))
+
+        weekly = charts.daily_candles("AAPL", date(2024, 2, 1), weekly=True)
+
+        self.assertEqual(len(weekly["time"]), 0)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def _queue(self, bucket, priorities):
+        # each thread waits for a token and records the order they were handed out
+        served = []
+        threads = [threading.Thread(target=lambda p=p: (bucket.acquire(p, timeout=5), served.append(p)))
+                   for p in priorities]
+        for count, thread in enumerate(threads, 1):
+            thread.start()
+            while len(bucket._waiters) < count:
+                time.sleep(0.001)
+        return served, threads
+
+    def test_waiters_are_served_by_priority_then_arrival(self):
+        bucket = upstream.TokenBucket(rate=50, capacity=1)
+        bucket.pause(0.2)     # hold every waiter until all of them are queued
+
+        served, threads = self._queue(bucket, [upstream.LOW, upstream.HIGH, upstream.LOW + 1, upstream.HIGH])
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(served, [upstream.HIGH, upstream.HIGH, upstream.LOW, upstream.LOW + 1])
+
+    def test_acquire_times_out_while_paused(self):
+        bucket = upstream.TokenBucket(rate=100, capacity=5)
+        bucket.pause(10)
+
+        with self.assertRaises(upstream.UpstreamBusy):
+            bucket.acquire(timeout=0.05)
+        self.assertEqual(bucket._waiters, [])
+
+
+class RetryAfterTests(SimpleTestCase):
+    def setUp(self):
+        self.provider = upstream.Provider("test", requests_per_minute=6000, burst=10)
+        self.pause = self.enterContext(mock.patch.object(self.provider.bucket, "pause"))
+        self.enterContext(mock.patch.object(upstream, "upstream_errors"))
+        self.enterContext(mock.patch.object(upstream, "upstream_seconds"))
+
+    def _responses(self, *responses):
+        self.enterContext(mock.patch.object(self.provider.session, "request", side_effect=responses))
+
+    def _response(self, status, **headers):
+        return mock.Mock(status_code=status, headers=headers)
+
+    def test_pauses_the_bucket_on_429_and_retries(self):
+        ok = self._response(200)
+        self._responses(self._response(429, **{"Retry-After": "2"}), ok)
+
+        self.assertIs(self.provider.get("https://example.com/quote"), ok)
+        self.pause.assert_called_once_with(2.0)
+
+    def test_gives_up_after_a_second_429(self):
+        self._responses(self._response(429), self._response(429))
+
+        with self.assertRaises(upstream.UpstreamBusy):
+            self.provider.get("https://example.com/quote")
+        self.assertEqual(self.pause.call_args_list, [mock.call(1.0), mock.call(1.0)])
+
+    def test_parses_http_dates(self):
+        now = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        with mock.patch.object(upstream, "datetime", wraps=datetime) as clock:
+            clock.now.return_value = now
+            delay = upstream._retry_after(self._response(429, **{"Retry-After": "Tue, 02 Jan 2024 03:04:35 GMT"}))
+            past = upstream._retry_after(self._response(429, **{"Retry-After": "Tue, 02 Jan 2024 03:00:00 GMT"}))
+        self.assertEqual(delay, 30)
+        self.assertEqual(past, 0)
+
+    def test_falls_back_on_unparseable_values(self):
+        self.assertEqual(upstream._retry_after(self._response(429, **{"Retry-After": "soon"})), 1.0)
+        self.assertEqual(upstream._retry_after(self._response(429, **{"Retry-After": "-5"})), 0.0)
+
+
+class FinnhubClientTests(SimpleTestCase):
+    def test_token_goes_with_each_call_not_on_the_shared_session(self):
+        response = mock.Mock(ok=True, headers={"Content-Type": "application/json"})
+        response.json.return_value = {"c": 1}
+        request = self.enterContext(mock.patch.object(upstream.finnhub_api, "request", return_value=response))
+
+        first, second = upstream.FinnhubClient("key-1"), upstream.FinnhubClient("key-2")
+        first.quote("AAPL")
+        second.quote("MSFT")
+
+        self.assertNotIn("token", upstream.finnhub_api.session.params)
+        self.assertEqual([call.kwargs["params"]["token"] for call in request.call_args_list], ["key-1", "key-2"])
+        self.assertEqual(request.call_args_list[0].kwargs["params"]["symbol"], "AAPL")
+
+
+class SymbolIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = symbol_index.SymbolIndex([
+            ("AAPL", "Apple Inc"),
+            ("AAP", "Advance Auto Parts Inc"),
+            ("AA", "Alcoa Corp"),
+            ("APLE", "Apple Hospitality REIT Inc"),
+            ("MSFT", "Microsoft Corp"),
+            ("GOOGL", "Alphabet Inc Class A"),
+            ("GOOG", "Alphabet Inc Class C"),
+            ("BAC", "Bank of America Corp"),
+        ])
+
+    def _symbols(self, query, limit=10):
+        return [match["symbol"] for match in self.index.search(query, limit)]
+
+    def test_exact_ticker_first_then_shorter_prefixes(self):
+        self.assertEqual(self._symbols("AA"), ["AA", "AAP", "AAPL"])
+        self.assertEqual(self._symbols("aap"), ["AAP", "AAPL"])
+
+    def test_ticker_matches_rank_above_company_names(self):
+        # APLE is a ticker prefix, AAPL only matches through "Apple"
+        self.assertEqual(self._symbols("apple"), ["AAPL", "APLE"])
+        self.assertEqual(self._symbols("APL"), ["APLE"])
+
+    def test_company_names_earlier_words_first(self):
+        self.assertEqual(self._symbols("inc"), ["AAPL", "GOOG", "GOOGL", "AAP", "APLE"])
+        # every query word has to prefix a word of the name, in any position
+        self.assertEqual(self._symbols("alphabet class"), ["GOOG", "GOOGL"])
+        self.assertEqual(self._symbols("corp alcoa"), ["AA"])
+        self.assertEqual(self._symbols("america"), ["BAC"])
+        self.assertEqual(self._symbols("hospitality apple"), ["APLE"])
+
+    def test_fuzzy_ticker_fallback(self):
+        self.assertEqual(self._symbols("MSTF"), ["MSFT"])
+        self.assertEqual(self._symbols("MSF"), ["MSFT"])
+        # only when nothing matched exactly or by prefix
+        self.assertEqual(self._symbols("GOOG"), ["GOOG", "GOOGL"])
+
+    def test_limit_and_empty_queries(self):
+        self.assertEqual(self._symbols("A", limit=2), ["AA", "AAP"])
+        self.assertEqual(self.index.search("  ", 10), [])
+        self.assertEqual(self.index.search("?!", 10), [])
+        self.assertEqual(self.index.search("ZZZZZZ", 10), [])
+
+    def test_results_carry_descriptions(self):
+        self.assertEqual(self.index.search("MSFT", 1), [{"description": "Microsoft Corp", "symbol": "MSFT"}])
+
+    def test_snapshot_round_trip_leaves_no_temp_files(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, "symbols", "index.json")
+        with override_settings(SYMBOL_INDEX_PATH=path):
+            symbol_index._write_snapshot(123.0, [("AAPL", "Apple Inc")])
+            symbol_index._write_snapshot(456.0, [("MSFT", "Microsoft Corp")])
+            self.assertEqual(symbol_index._read_snapshot(), (456.0, [("MSFT", "Microsoft Corp")]))
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["index.json"])
+
+
+class PortfolioTests(SimpleTestCase):
+    def setUp(self):
+        self.quotes = {
+            "AAPL": {"c": 110.0, "pc": 100.0},
+            "MSFT": {"c": 200.0, "pc": 0},          # no previous close
+            "TSLA": {"c": 0, "pc": 250.0},          # no current price
+        }
+        self.enterContext(mock.patch.object(portfolio, "get_quote", self._quote))
+        self.live = self.enterContext(mock.patch.dict(portfolio.price_feed.prices, clear=True))
+
+    def _quote(self, symbol):
+        if symbol not in self.quotes:
+            raise upstream.UpstreamBusy("rate limited")
+        return self.quotes[symbol]
+
+    def test_totals_and_weights(self):
+        valuation = portfolio.value_portfolio([("AAPL", "Apple", 10), ("MSFT", "Microsoft", 5)])
+
+        self.assertEqual(valuation["total_value"], 2100.0)
+        # the day change only counts positions with both prices
+        self.assertEqual(valuation["day_change"], 100.0)
+        self.assertEqual(valuation["day_change_percent"], 10.0)
+        aapl, msft = valuation["positions"]
+        self.assertEqual(aapl, {
+            "symbol": "AAPL", "name": "Apple", "shares": 10.0, "price": 110.0, "value": 1100.0,
+            "weight": 0.5238, "day_change": 100.0, "day_change_percent": 10.0,
+        })
+        self.assertEqual((msft["value"], msft["weight"], msft["day_change"]), (1000.0, 0.4762, None))
+        self.assertEqual(valuation["missing"], [])
+
+    def test_missing_quotes_are_listed_and_left_out_of_the_totals(self):
+        valuation = portfolio.value_portfolio([("AAPL", "Apple", 1), ("TSLA", "Tesla", 3), ("NOPE", "Failing", 2)])
+
+        self.assertEqual(valuation["total_value"], 110.0)
+        self.assertEqual(valuation["missing"], ["TSLA", "NOPE"])
+        tsla = valuation["positions"][1]
+        self.assertEqual((tsla["price"], tsla["value"], tsla["weight"]), (None, None, None))
+
+    def test_nothing_priced(self):
+        valuation = portfolio.value_portfolio([("NOPE", "Failing", 2)])
+
+        self.assertEqual((valuation["total_value"], valuation["day_change"]), (0.0, 0.0))
+        self.assertIsNone(valuation["day_change_percent"])
+        self.assertEqual(valuation["missing"], ["NOPE"])
+
+    def test_live_trades_override_the_quote(self):
+        self.live.update({"AAPL": 120.0, "MSFT": None})
+
+        aapl, msft = portfolio.value_portfolio([("AAPL", "Apple", 1), ("MSFT", "Microsoft", 1)])["positions"]
+
+        self.assertEqual(aapl["price"], 120.0)
+        self.assertEqual(msft["price"], 200.0)
+
+    def test_parse_shares(self):
+        self.assertEqual(portfolio.parse_shares(None), {})
+        self.assertEqual(portfolio.parse_shares(""), {})
+        self.assertEqual(portfolio.parse_shares(" aapl :10,MSFT:2.5,"), {"AAPL": 10.0, "MSFT": 2.5})
+        self.assertEqual(portfolio.parse_shares("AAPL:0"), {"AAPL": 0.0})
+
+    def test_parse_shares_rejects_malformed_input(self):
+        for raw in ("AAPL", "AAPL:", "AAPL:ten", ":5", "AAPL:-1", "AAPL:nan", "AAPL:inf"):
+            with self.subTest(raw=raw), self.assertRaises(ValueError):
+                portfolio.parse_shares(raw)
+
+
+class PortfolioViewTests(TestCase):
+    def setUp(self):
+        token = Token.objects.create(user=User.objects.create_user("dave"))
+        self.headers = {"Authorization": f"Token {token.key}"}
+
+    def test_malformed_shares_are_a_400(self):
+        response = self.client.get("/stocks/portfolio/valuation/", {"shares": "AAPL:ten"}, headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Invalid share count for AAPL"})
+
+
+class BarRingTests(SimpleTestCase):
+    def test_trades_in_one_bucket_update_the_bar(self):
+        ring = bars.BarRing(60)
+        for ts, price, volume in ((120, 10.0, 1), (130, 12.0, 2), (150, 9.0, 3), (179, 11.0, 4)):
+            ring.add(ts, price, volume)
+
+        candles = ring.candles()
+
+        self.assertEqual(candles["time"].tolist(), [np.datetime64(120, "s")])
+        self.assertEqual([candles[f][0] for f in ("open", "high", "low", "close", "volume")], [10, 12, 9, 11, 10])
+
+    def test_rollover_starts_a_new_bar_and_drops_late_trades(self):
+        ring = bars.BarRing(60)
+        ring.add(59, 10.0, 1)
+        ring.add(60, 11.0, 1)       # first second of the next bar
+        ring.add(30, 99.0, 5)       # older than the newest bar
+        ring.add(200, 12.0, 1)      # skips an empty minute, no bar is made up for it
+
+        candles = ring.candles()
+
+        self.assertEqual(candles["time"].astype("int64").tolist(), [0, 60, 180])
+        self.assertEqual(candles["close"].tolist(), [10, 11, 12])
+        self.assertEqual(candles["volume"].tolist(), [1, 1, 1])
+
+    def test_wraparound_keeps_the_newest_bars_oldest_first(self):
+        ring = bars.BarRing(1, capacity=4)
+        for ts in range(10):
+            ring.add(ts, float(ts), 1)
+
+        candles = ring.candles()
+
+        self.assertEqual(ring.count, 4)
+        self.assertEqual(candles["time"].astype("int64").tolist(), [6, 7, 8, 9])
+        self.assertEqual(candles["open"].tolist(), [6, 7, 8, 9])
+        # updating the newest bar after wrapping
+        ring.add(9, 20.0, 2)
+        self.assertEqual(ring.candles()["high"].tolist(), [6, 7, 8, 20])
+
+    def test_since_filters_on_bar_start(self):
+        ring = bars.BarRing(1, capacity=4)
+        for ts in range(10):
+            ring.add(ts, float(ts), 1)
+
+        self.assertEqual(ring.candles(since=8)["time"].astype("int64").tolist(), [8, 9])
+        self.assertEqual(ring.candles(since=0)["time"].astype("int64").tolist(), [6, 7, 8, 9])
+        self.assertEqual(len(ring.candles(since=100)["time"]), 0)
+
+    def test_empty_ring(self):
+        candles = bars.BarRing(60).candles()
+
+        self.assertEqual(set(candles), set(charts.CANDLE_FIELDS))
+        self.assertEqual(candles["time"].dtype, np.dtype("datetime64[s]"))
+        self.assertEqual(len(candles["close"]), 0)
+
+
+class BarEngineTests(SimpleTestCase):
+    def test_trades_roll_into_every_resolution(self):
+        engine = bars.BarEngine()
+        # 09:59:58 to 10:04:58 UTC
+        start = 10 * 3600 - 2
+        engine.add_trades([
+            {"s": "AAPL", "p": 10.0, "t": start * 1000, "v": 1},
+            {"s": "AAPL", "p": 12.0, "t": (start + 1) * 1000 + 500, "v": 2},
+            {"s": "AAPL", "p": 11.0, "t": (start + 2) * 1000, "v": 3},
+            {"s": "MSFT", "p": 50.0, "t": (start + 2) * 1000},
+            {"s": "AAPL", "p": 9.0, "t": (start + 300) * 1000, "v": 4},
+        ])
+
+        seconds = engine.candles("AAPL", "1s")
+        self.assertEqual(len(seconds["time"]), 4)
+        self.assertEqual(seconds["close"].tolist(), [10, 12, 11, 9])
+
+        minutes = engine.candles("AAPL", "1m")
+        self.assertEqual(minutes["time"].astype("int64").tolist(), [start - 58, start + 2, start + 242])
+        self.assertEqual(minutes["high"].tolist(), [12, 11, 9])
+        self.assertEqual(minutes["volume"].tolist(), [3, 3, 4])
+
+        five = engine.candles("AAPL", "5m")
+        self.assertEqual(five["time"].astype("int64").tolist(), [start - 298, start + 2])
+        self.assertEqual(five["open"].tolist(), [10, 11])
+        self.assertEqual(five["close"].tolist(), [12, 9])
+        self.assertEqual(five["volume"].tolist(), [3, 7])
+
+        # trades without a volume count as zero
+        self.assertEqual(engine.candles("MSFT", "5m")["volume"].tolist(), [0])
+
+    def test_unknown_and_dropped_symbols(self):
+        engine = bars.BarEngine()
+        engine.add_trades([{"s": "AAPL", "p": 10.0, "t": 0, "v": 1}])
+        self.assertIsNone(engine.candles("MSFT", "1m"))
+
+        engine.drop("AAPL")
+        self.assertIsNone(engine.candles("AAPL", "1m"))
+
+
+def _random_candles(count, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 1, count).cumsum()
+    spread = rng.uniform(0.1, 2, count)
+    return {
+        "time": np.arange(np.datetime64("2020-01-01", "D"), np.datetime64("2020-01-01", "D") + count),
+        "open": close,
+        "high": close + spread,
+        "low": close - spread,
+        "close": close,
+        "volume": np.ones(count),
+    }
+
+
+class IndicatorSeriesTests(SimpleTestCase):
+    def assertSameValues(self, series, expected):
+        self.assertEqual(set(series.values), set(expected.values))
+        for name, values in expected.values.items():
+            with self.subTest(indicator=name):
+                np.testing.assert_allclose(series.values[name], values, rtol=1e-10, atol=1e-10, equal_nan=True)
+
+    def test_appending_matches_a_full_recompute(self):
+        candles = _random_candles(300)
+        for cut in (1, 10, 35, 299):
+            with self.subTest(cut=cut):
+                previous = indicators.IndicatorSeries({field: values[:cut] for field, values in candles.items()})
+                appended = indicators.IndicatorSeries(candles, previous=previous)
+                self.assertSameValues(appended, indicators.IndicatorSeries(candles))
+
+    def test_changed_last_bar_matches_a_full_recompute(self):
+        candles = _random_candles(120)
+        previous = indicators.IndicatorSeries(candles)
+
+        changed = {field: values.copy() for field, values in candles.items()}
+        changed["close"][-1] += 5
+        changed["high"][-1] += 6
+        updated = indicators.IndicatorSeries(changed, previous=previous)
+
+        self.assertSameValues(updated, indicators.IndicatorSeries(changed))
+        self.assertFalse(updated.matches(candles))
+        self.assertTrue(updated.matches(changed))
+
+    def test_rewritten_history_is_recomputed(self):
+        previous = indicators.IndicatorSeries(_random_candles(80, seed=1))
+        candles = _random_candles(90, seed=2)
+
+        self.assertSameValues(indicators.IndicatorSeries(candles, previous=previous),
+                              indicators.IndicatorSeries(candles))
+
+    def test_warmup_lengths(self):
+        body = indicators.IndicatorSeries(_random_candles(60)).to_json(indicators.INDICATORS)
+
+        def leading_nulls(values):
+            return next(i for i, value in enumerate(values) if value is not None)
+
+        self.assertEqual(leading_nulls(body[f"sma_{indicators.SMA_PERIOD}"]), indicators.SMA_PERIOD - 1)
+        self.assertEqual(leading_nulls(body[f"ema_{indicators.EMA_PERIOD}"]), 0)
+        self.assertEqual(leading_nulls(body[f"rsi_{indicators.RSI_PERIOD}"]), indicators.RSI_PERIOD)
+        self.assertEqual(leading_nulls(body["macd"]["signal"]), 0)
+        for band in ("upper", "middle", "lower"):
+            self.assertEqual(leading_nulls(body["bollinger"][band]), indicators.BOLLINGER_PERIOD - 1)
+        self.assertEqual(len(body["date"]), 60)
+
+    def test_reference_values(self):
+        candles = _random_candles(60)
+        close = pd.Series(candles["close"])
+        v = indicators.IndicatorSeries(candles).values
+
+        np.testing.assert_allclose(v["sma"], close.rolling(indicators.SMA_PERIOD).mean(), equal_nan=True)
+        np.testing.assert_allclose(v["ema"], close.ewm(span=indicators.EMA_PERIOD, adjust=False).mean())
+        np.testing.assert_allclose(v["bollinger_std"], close.rolling(indicators.BOLLINGER_PERIOD).std(ddof=0),
+                                   equal_nan=True)
+        macd = close.ewm(span=indicators.MACD_FAST, adjust=False).mean() - close.ewm(span=indicators.MACD_SLOW, adjust=False).mean()
+        np.testing.assert_allclose(v["macd"], macd)
+        self.assertTrue(np.all((v["rsi"][indicators.RSI_PERIOD:] >= 0) & (v["rsi"][indicators.RSI_PERIOD:] <= 100)))
+
+    def test_empty_candles(self):
+        series = indicators.IndicatorSeries(charts.empty_candles())
+        body = series.to_json(indicators.INDICATORS)
+
+        self.assertEqual(body["date"], [])
+        self.assertEqual(body["macd"], {"macd": [], "signal": [], "histogram": []})
+        self.assertTrue(series.matches(charts.empty_candles()))
+
+        # and appending to an empty series
+        candles = _random_candles(30)
+        self.assertSameValues(indicators.IndicatorSeries(candles, previous=series),
+                              indicators.IndicatorSeries(candles))
+
+
+class WarmupCommandTests(SimpleTestCase):
+    def setUp(self):
+        self.steps = {name: mock.Mock() for name in warmup.STEPS}
+        self.enterContext(mock.patch.dict(warmup.STEPS, self.steps))
+
+    def test_runs_only_the_steps_that_persist(self):
+        call_command("warmup", stdout=io.StringIO())
+
+        self.assertEqual([name for name, step in self.steps.items() if step.called], ["history", "symbol_index"])
+
+    def test_refuses_per_process_steps(self):
+        with self.assertRaises(CommandError):
+            call_command("warmup", only="caches", stdout=io.StringIO())
+        self.assertFalse(any(step.called for step in self.steps.values()))
+
+    def test_strict_fails_on_a_failed_step(self):
+        self.steps["history"].side_effect = RuntimeError("offline")
+        with self.assertRaises(CommandError):
+            call_command("warmup", strict=True, stdout=io.StringIO())
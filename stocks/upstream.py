@@ -0,0 +1,283 @@
+import re
+import time
+import heapq
+import asyncio
+import weakref
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import finnhub
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+from .metrics import upstream_errors, upstream_seconds
+from .profiling import phase
+
+
+# Shared HTTP clients for the third party APIs. Every provider gets one pooled
+# keep-alive session and a token bucket sized to its quota, so bursts queue up
+# here instead of turning into 429s.
+
+HIGH, LOW = 0, 10       # request priorities, lower goes first
+
+_priority = contextvars.ContextVar("upstream_priority", default=HIGH)
+
+
+class UpstreamBusy(Exception):
+    """Raised when a call can't get a rate limit slot in time or the provider keeps answering 429."""
+
+
+@contextmanager
+def background():
+    # calls made inside this block yield to interactive requests
+    token = _priority.set(LOW)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Token bucket where waiters are served by priority, then arrival order."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate                # tokens per second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._async_locks = weakref.WeakKeyDictionary()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds):
+        # the provider told us to back off, hold every caller until then
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+    def acquire(self, priority=HIGH, timeout=None):
+        with self._cond:
+            waiter = (priority, next(self._counter))
+            heapq.heappush(self._waiters, waiter)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == waiter and now >= self._paused_until and self._tokens >= 1:
+                        self._tokens -= 1
+                        heapq.heappop(self._waiters)
+                        self._cond.notify_all()
+                        return
+
+                    if self._waiters[0] == waiter:
+                        wait = max(self._paused_until - now, (1 - self._tokens) / self.rate, 0)
+                    else:
+                        wait = None
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            raise UpstreamBusy("Upstream rate limit reached, try again shortly")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    def _try_take(self, priority):
+        # returns 0 once a token is taken, otherwise how long to sleep before retrying
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if self._waiters and self._waiters[0][0] <= priority:
+                return 0.05     # a blocked thread with the same or higher priority goes first
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire_async(self, priority=HIGH, timeout=None):
+        """Same quota as acquire(), but waits on the event loop instead of blocking a thread."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # coroutines on one loop line up behind an asyncio.Lock (FIFO) so they
+        # don't all wake up for the same token
+        loop = asyncio.get_running_loop()
+        lock = self._async_locks.get(loop)
+        if lock is None:
+            lock = self._async_locks[loop] = asyncio.Lock()
+
+        try:
+            await asyncio.wait_for(lock.acquire(), None if deadline is None else max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            raise UpstreamBusy("Upstream rate limit reached, try again shortly")
+        try:
+            while True:
+                wait = self._try_take(priority)
+                if wait == 0:
+                    return
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    raise UpstreamBusy("Upstream rate limit reached, try again shortly")
+                await asyncio.sleep(wait)
+        finally:
+            lock.release()
+
+
+def _retry_after(response, default=1.0):
+    """Seconds a 429 asks us to wait; Retry-After is either a number of seconds or an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class Provider:
+    def __init__(self, name, requests_per_minute, burst, endpoint=None):
+        self.name = name
+        self.endpoint = endpoint or (lambda url: "other")    # url -> metrics label
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+
+        self.session = requests.Session()
+        # retry connection failures only, a read may already have hit the quota
+        retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.UPSTREAM_POOL_SIZE, max_retries=retries)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # httpx clients are bound to the event loop that created them
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _record(self, endpoint, started, response=None, error=None):
+        upstream_seconds.observe(time.perf_counter() - started, self.name, endpoint)
+        if error is not None:
+            upstream_errors.inc(self.name, endpoint, type(error).__name__)
+        elif response.status_code >= 400:
+            upstream_errors.inc(self.name, endpoint, str(response.status_code))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", settings.UPSTREAM_TIMEOUT)
+        priority = _priority.get()
+        endpoint = self.endpoint(url)
+
+        # rate limit waits included, from the caller's side they are upstream time too
+        with phase("upstream"):
+            for attempt in range(2):
+                self.bucket.acquire(priority, timeout=settings.UPSTREAM_QUEUE_TIMEOUT)
+                started = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except Exception as e:
+                    self._record(endpoint, started, error=e)
+                    raise
+                self._record(endpoint, started, response)
+                if response.status_code != 429:
+                    return response
+
+                delay = _retry_after(response)
+                print(f"[Upstream] {self.name} returned 429, backing off {delay}s")
+                self.bucket.pause(delay)
+
+            raise UpstreamBusy(f"{self.name} rate limit reached, try again shortly")
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=settings.UPSTREAM_TIMEOUT,
+                headers={"User-Agent": "stock-insights"},
+                limits=httpx.Limits(max_connections=settings.UPSTREAM_POOL_SIZE),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def arequest(self, method, url, **kwargs):
+        priority = _priority.get()
+        endpoint = self.endpoint(url)
+
+        with phase("upstream"):
+            for attempt in range(2):
+                await self.bucket.acquire_async(priority, timeout=settings.UPSTREAM_QUEUE_TIMEOUT)
+                started = time.perf_counter()
+                try:
+                    response = await self._async_client().request(method, url, **kwargs)
+                except Exception as e:
+                    self._record(endpoint, started, error=e)
+                    raise
+                self._record(endpoint, started, response)
+                if response.status_code != 429:
+                    return response
+
+                delay = _retry_after(response)
+                print(f"[Upstream] {self.name} returned 429, backing off {delay}s")
+                self.bucket.pause(delay)
+
+            raise UpstreamBusy(f"{self.name} rate limit reached, try again shortly")
+
+    async def aget(self, url, **kwargs):
+        return await self.arequest("GET", url, **kwargs)
+
+
+def _finnhub_endpoint(url):
+    # "quote", "stock/profile2", ... relative to the API root; the SDK joins paths with a double slash
+    path = re.sub("/+", "/", urlsplit(url).path)
+    return path[len(urlsplit(settings.FINNHUB_API_URL).path):].strip("/")
+
+
+finnhub_api = Provider("finnhub", settings.FINNHUB_RATE_LIMIT, burst=settings.FINNHUB_BURST,
+                       endpoint=_finnhub_endpoint)
+polygon_api = Provider("polygon", settings.POLYGON_RATE_LIMIT, burst=settings.POLYGON_BURST,
+                       endpoint=lambda url: "aggs" if "/aggs/" in url else "other")
+yahoo_api = Provider("yahoo", settings.YAHOO_RATE_LIMIT, burst=settings.YAHOO_BURST,
+                     endpoint=lambda url: "chart")
+
+
+class FinnhubClient(finnhub.Client):
+    """finnhub SDK client whose calls go through the shared, throttled finnhub session."""
+
+    def __init__(self, api_key):
+        super().__init__(api_key)
+        self.API_URL = settings.FINNHUB_API_URL
+
+    def _request(self, method, path, **kwargs):
+        # the SDK's own session only keeps the token and headers, they go out with
+        # every call so the shared session never carries one client's key
+        uri = "{}/{}".format(self.API_URL, path)
+        kwargs["timeout"] = kwargs.get("timeout", settings.UPSTREAM_TIMEOUT)
+        kwargs["params"] = {**self._session.params, **self._format_params(kwargs.get("params", {}))}
+        kwargs["headers"] = {**self._session.headers, **kwargs.get("headers", {})}
+
+        response = finnhub_api.request(method.upper(), uri, **kwargs)
+        return self._handle_response(response)
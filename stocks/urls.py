@@ -1,11 +1,23 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
+    # async-native variants of the read-only endpoints, for ASGI deployments
+    path('async/index/', async_views.index_data, name='async_market_index'),
+    path('async/home/', async_views.home_stocks, name='async_home_stocks'),
+    path('async/<str:symbol>/details/', async_views.stock_details, name='async_stock_details'),
+    path('async/<str:symbol>/search/', async_views.stock_lookup, name='async_stock_lookup'),
+    path('async/<str:symbol>/chart/', async_views.get_stock_chart, name='async_stock_chart'),
     path('<str:symbol>/details/', views.stock_details, name='stock_details'),
     path('<str:symbol>/search/', views.stock_lookup, name='stock_lookup'),
     path('<str:symbol>/chart/', views.get_stock_chart, name="stock_chart"),
+    path('<str:symbol>/indicators/', views.get_stock_indicators, name="stock_indicators"),
+    path('<str:symbol>/intraday/', views.get_intraday_chart, name="intraday_chart"),
     path('home/', views.home_stocks, name="home_stocks"),
     path('<str:symbol>/analysis/', views.stock_analysis, name='stock_analysis'),
+    path('<str:symbol>/analysis/jobs/', views.enqueue_analysis, name='enqueue_analysis'),
+    path('analysis/jobs/<str:job_id>/', views.analysis_job, name='analysis_job'),
+    path('analysis/batch/', views.batch_analysis, name='batch_analysis'),
+    path('portfolio/valuation/', views.portfolio_valuation, name='portfolio_valuation'),
     path('index/', views.index_data, name='market_index')
 ]
@@ -1,19 +1,19 @@
-from django.shortcuts import render
-
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import BasePermission, IsAuthenticated
 from rest_framework.response import Response
-from .finnhub_service import get_company_details, get_stocks, get_home_stocks, get_index_data, is_market_open
+from user.authentication import CachedTokenAuthentication
+from .finnhub_service import get_company_details, get_stocks, get_home_stocks, get_index_data, is_market_open, HOME_STOCKS
+from .charts import get_candles, to_json as candles_to_json, ChartError
+from .profiling import phase
+from .upstream import UpstreamBusy
 
-from datetime import datetime, timedelta
-from django.utils import timezone
+import hmac
 from django.conf import settings
-import requests
 
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def index_data(request):
     try:
@@ -23,126 +23,287 @@ def index_data(request):
             "indices_data": indices_data,
             "market_status": market_status
             })
+    except UpstreamBusy as e:
+        return Response({"detail": str(e)}, status=503)
     except Exception as e:
         return Response({"detail": f"Error fetching index data: {str(e)}"}, status=500)
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def stock_details(request, symbol):
     try:
         data = get_company_details(symbol)
         return Response(data)
+    except UpstreamBusy as e:
+        return Response({"detail": str(e)}, status=503)
     except Exception as e:
         return Response({"detail": f"Error fetching stock data: {str(e)}"}, status=500)
     
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def stock_lookup(request, symbol):
     try:
-        data = get_stocks(symbol)
+        limit = min(max(int(request.query_params.get("limit", 10)), 1), 50)
+    except ValueError:
+        return Response({"detail": "limit must be an integer"}, status=400)
+
+    try:
+        data = get_stocks(symbol, limit)
         return Response(data)
+    except UpstreamBusy as e:
+        return Response({"detail": str(e)}, status=503)
     except Exception as e:
         return Response({"detail": f"Error fetching stock data: {str(e)}"}, status=500)
 
 @api_view(["GET"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def home_stocks(request):
-    HOME_PAGE_SYMBOLS = [
-        "AAPL", "MSFT", "NVDA", "TSLA", "AMD",        # Tech
-        "JNJ", "PFE", "MRNA", "UNH", "LLY",           # Healthcare
-        "JPM", "BRK-B",  "BAC", "WFC", "GS"           # Finance
-    ]
-
     try:
-        data = get_home_stocks(HOME_PAGE_SYMBOLS)
+        data = get_home_stocks(HOME_STOCKS)
         return Response(data)
+    except UpstreamBusy as e:
+        return Response({"detail": str(e)}, status=503)
     except Exception as e:
         return Response({"detail": f"Error fetching stocks: {str(e)}"}, status=500)
 
     
 @api_view(["GET"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def get_stock_chart(request, symbol):
-    API_KEY = settings.POLYGON_API_KEY
+    params = request.query_params
 
-    end_date = datetime.today()
-    start_date = end_date - timedelta(days=30)
-
-    url = f"https://api.polygon.io/v2/aggs/ticker/{symbol}/range/1/day/{start_date.date()}/{end_date.date()}?adjusted=true&sort=asc&limit=5000&apiKey={API_KEY}"
+    try:
+        points = int(params["points"]) if params.get("points") else None
+    except ValueError:
+        points = 0
+    if points is not None and points < 2:
+        return Response({"error": "points must be an integer of at least 2"}, status=400)
 
     try:
-        resp = requests.get(url)
-        data = resp.json()
-
-        candles = [
-            {
-                "date": datetime.fromtimestamp(item["t"] / 1000).strftime("%Y-%m-%d"),
-                "open": item["o"],
-                "high": item["h"],
-                "low": item["l"],
-                "close": item["c"],
-                "volume": item["v"]
-            }
-            for item in data.get("results", [])
-        ]
-
-        return Response({"symbol": symbol, "candles": candles})
+        with phase("compute"):
+            interval, candles = get_candles(
+                symbol,
+                range_=params.get("range", "1M"),
+                interval=params.get("interval"),
+                points=points,
+                downsample=params.get("downsample", "ohlc"),
+            )
+            candles = candles_to_json(candles, columns=params.get("format") == "columns")
+        return Response({
+            "symbol": symbol,
+            "range": params.get("range", "1M"),
+            "interval": interval,
+            "candles": candles
+        })
 
+    except ChartError as e:
+        return Response({"error": str(e)}, status=400)
+    except UpstreamBusy as e:
+        return Response({"error": str(e)}, status=503)
     except Exception as e:
         return Response({"error": str(e)}, status=500)
     
 @api_view(["GET"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
-def stock_analysis(request, symbol):
-    from .ml.predictor import generate_forecast
+def get_stock_indicators(request, symbol):
+    from .indicators import get_indicators, INDICATORS
+
+    params = request.query_params
+    names = params.get("indicators")
+    names = [name.strip().lower() for name in names.split(",")] if names else list(INDICATORS)
+    unknown = [name for name in names if name not in INDICATORS]
+    if unknown:
+        return Response({"error": f"Unknown indicators: {', '.join(unknown)}, expected any of {', '.join(INDICATORS)}"}, status=400)
+
+    try:
+        interval, indicators = get_indicators(symbol, range_=params.get("range", "1M"), interval=params.get("interval"), names=names)
+        return Response({
+            "symbol": symbol,
+            "range": params.get("range", "1M"),
+            "interval": interval,
+            "indicators": indicators
+        })
+
+    except ChartError as e:
+        return Response({"error": str(e)}, status=400)
+    except UpstreamBusy as e:
+        return Response({"error": str(e)}, status=503)
+    except Exception as e:
+        return Response({"error": str(e)}, status=500)
 
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def get_intraday_chart(request, symbol):
+    from .bars import bar_engine, RESOLUTIONS
+    from .charts import INTRADAY_INTERVALS
+
+    params = request.query_params
+    symbol = symbol.upper()
+    resolution = params.get("resolution", "1m")
+    if resolution not in RESOLUTIONS:
+        return Response({"error": f"Unknown resolution '{resolution}', expected one of {', '.join(RESOLUTIONS)}"}, status=400)
     try:
-        days_ahead = 7
-        today_price, forecast = generate_forecast(symbol, days=14)
-
-        # Get the prediction for 7 days ahead
-        target_date = datetime.today().date() + timedelta(days=days_ahead)
-        target_row = forecast[forecast['ds'].dt.date == target_date]
-
-        if target_row.empty:
-            # Fallback: pick the next available forecast
-            fallback_row = forecast[forecast['ds'].dt.date > datetime.today().date()].head(1)
-            if fallback_row.empty:
-                return Response({"error": f"No forecast available for {target_date}"}, status=404)
-            target_row = fallback_row
-            target_date = target_row.iloc[0]['ds'].date()
-
-        predicted_price = target_row.iloc[0]['yhat']
-        change_percent = ((predicted_price - today_price) / today_price) * 100
-
-        # Recommendation logic
-        if change_percent >= 3:
-            recommendation = "buy"
-        elif change_percent <= -3:
-            recommendation = "sell"
-        else:
-            recommendation = "hold"
-
-        # Cleaned 7-day forecast for frontend charting
-        future_forecast = forecast[forecast['ds'].dt.date > datetime.today().date()].head(7)
-        future_forecast = future_forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
-        future_forecast['ds'] = future_forecast['ds'].astype(str)
-        forecast_list = future_forecast.to_dict(orient='records')
+        since = int(params["since"]) if params.get("since") else None
+    except ValueError:
+        return Response({"error": "since must be a unix timestamp in seconds"}, status=400)
+
+    try:
+        # bars built from the live stream, Polygon only for symbols nobody is streaming
+        candles, source = bar_engine.candles(symbol, resolution, since), "stream"
+        if candles is None and resolution in INTRADAY_INTERVALS:
+            _, candles = get_candles(symbol, range_="1D", interval=resolution)
+            source = "polygon"
+        if candles is None:
+            return Response({"error": f"No live trades for {symbol} at {resolution} resolution"}, status=404)
 
         return Response({
-            "symbol": symbol.upper(),
-            "forecast": forecast_list,
-            "recommendation": recommendation,
-            "message": f"{symbol.upper()} is expected to change by {round(change_percent, 2)}% in {days_ahead} days, going from ${round(today_price,2)} to ${round(predicted_price,2)}. Recommended action: {recommendation.upper()}.",
-            "current_price": round(today_price, 2),
-            "predicted_price": round(predicted_price, 2),
-            "change_percent": round(change_percent, 2)
+            "symbol": symbol,
+            "resolution": resolution,
+            "source": source,
+            "candles": candles_to_json(candles, columns=params.get("format") == "columns")
         })
 
+    except UpstreamBusy as e:
+        return Response({"error": str(e)}, status=503)
+    except Exception as e:
+        return Response({"error": str(e)}, status=500)
+
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def stock_analysis(request, symbol):
+    from .ml.predictor import peek_forecast
+    from .ml.analysis import build_analysis, ForecastUnavailable
+    from .ml.jobs import submit_forecast, QueueFull, WAIT_TIMEOUT
+    from concurrent.futures import TimeoutError as FitTimeout
+
+    try:
+        cached = peek_forecast(symbol, days=14)
+        if cached is not None:
+            today_price, forecast = cached
+            with phase("compute"):
+                analysis = build_analysis(symbol, today_price, forecast)
+            return Response(analysis)
+
+        # the fit runs on the forecast process pool, identical requests share one job
+        job = submit_forecast(symbol, days=14)
+        if request.query_params.get("async") in ("1", "true"):
+            return Response(job.to_dict(), status=202)
+
+        # waiting on the fit in the worker process, a slow one is handed back as a job to poll
+        try:
+            with phase("compute"):
+                analysis = job.future.result(timeout=WAIT_TIMEOUT)
+        except FitTimeout:
+            return Response(job.to_dict(), status=202)
+        return Response(analysis)
+
+    except ForecastUnavailable as e:
+        return Response({"error": str(e)}, status=404)
+    except QueueFull as e:
+        return Response({"error": str(e)}, status=503)
     except Exception as e:
-        return Response({"error": str(e)}, status=500)
\ No newline at end of file
+        return Response({"error": str(e)}, status=500)
+
+@api_view(["POST"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def enqueue_analysis(request, symbol):
+    from .ml.jobs import submit_forecast, QueueFull
+
+    try:
+        job = submit_forecast(symbol, days=14)
+        return Response(job.to_dict(), status=202)
+    except QueueFull as e:
+        return Response({"error": str(e)}, status=503)
+
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def analysis_job(request, job_id):
+    from .ml.jobs import get_job
+
+    job = get_job(job_id)
+    if job is None:
+        return Response({"error": "Job not found or expired"}, status=404)
+    return Response(job.to_dict())
+
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def portfolio_valuation(request):
+    from user.profiles import profile_data
+    from .portfolio import parse_shares, value_portfolio
+
+    # portfolios don't store quantities yet, every position counts as one share
+    # unless ?shares=AAPL:10,MSFT:2 says otherwise
+    try:
+        shares = parse_shares(request.query_params.get("shares"))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    positions = [
+        (stock["ticker"], stock["name"], shares.get(stock["ticker"].upper(), 1.0))
+        for stock in profile_data(request.user)["portfolio"]
+    ]
+
+    try:
+        with phase("compute"):
+            valuation = value_portfolio(positions)
+        return Response(valuation)
+    except Exception as e:
+        return Response({"error": str(e)}, status=500)
+
+@api_view(["POST"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def batch_analysis(request):
+    from user.profiles import profile_tickers
+    from .ml.batch import analyze_batch, MAX_BATCH_SYMBOLS
+
+    source = request.data.get("source")
+    if source in ("watchlist", "portfolio"):
+        symbols = profile_tickers(request.user, source)
+    else:
+        symbols = request.data.get("symbols")
+
+    if not isinstance(symbols, list) or not symbols:
+        return Response({"detail": "Provide a list of symbols or a source of 'watchlist' or 'portfolio'"}, status=400)
+    if not all(isinstance(symbol, str) and symbol.strip() for symbol in symbols):
+        return Response({"detail": "Symbols must be non-empty strings"}, status=400)
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return Response({"detail": f"At most {MAX_BATCH_SYMBOLS} symbols per request"}, status=400)
+
+    try:
+        results, errors, pending = analyze_batch(symbols, days=14)
+        # anything still fitting is polled through /analysis/jobs/<id>
+        return Response({"results": results, "errors": errors, "pending": pending},
+                        status=202 if pending else 200)
+    except Exception as e:
+        return Response({"error": str(e)}, status=500)
+
+
+class CanScrapeMetrics(BasePermission):
+    """Scrapers present METRICS_TOKEN as a bearer token, people need a staff account."""
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return True
+        return bool(request.user and request.user.is_staff)
+
+@api_view(["GET"])
+@authentication_classes([SessionAuthentication, CachedTokenAuthentication])
+@permission_classes([CanScrapeMetrics])
+def metrics(request):
+    # a plain HttpResponse: Prometheus wants text, not DRF content negotiation
+    from django.http import HttpResponse
+    from .metrics import render
+
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,92 @@
+import time
+import importlib
+
+from django.conf import settings
+
+
+# Heavy dependencies load on first use so worker boot and manage.py stay fast;
+# warm_up() pays for them (and fills the caches behind the home page) up front,
+# before a worker takes traffic. Imports, caches and forecast workers live in
+# the process that warms them, so only WARMUP_ON_STARTUP (from wsgi.py/asgi.py)
+# warms a serving worker; `manage.py warmup` runs the steps that leave their
+# result on disk.
+
+HEAVY_MODULES = (
+    "pandas",
+    "yfinance",
+    "prophet",
+    "stocks.indicators",
+    "stocks.ml.predictor",
+    "stocks.ml.analysis",
+)
+
+
+def _imports():
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+
+
+def _caches():
+    from .finnhub_service import HOME_STOCKS, finnhub_client, get_home_stocks, get_index_data
+
+    finnhub_client()
+    get_index_data()
+    get_home_stocks(HOME_STOCKS)
+
+
+def _history():
+    # daily charts, indicators and forecasts of the home symbols then read from disk
+    from . import history_store
+    from .finnhub_service import HOME_STOCKS
+
+    history_store.update_many(HOME_STOCKS)
+
+
+def _symbol_index():
+    from . import symbol_index
+
+    symbol_index.refresh()
+
+
+def _forecaster():
+    from .ml.jobs import warm_workers
+
+    if not warm_workers():
+        raise RuntimeError("no forecast worker finished its warmup fit")
+
+
+STEPS = {
+    "imports": _imports,
+    "caches": _caches,
+    "history": _history,
+    "symbol_index": _symbol_index,
+    "forecaster": _forecaster,
+}
+
+# steps whose result outlives the process: history files and the symbol index snapshot
+DISK_STEPS = ("history", "symbol_index")
+
+
+def warm_up(steps=None, log=print):
+    """
+    Runs the warmup steps in order (all of them by default) and returns
+    {step: seconds} for the ones that succeeded. A failing step is logged and
+    skipped, an upstream outage must not keep a worker from starting.
+    """
+    timings = {}
+    for name in steps or STEPS:
+        started = time.perf_counter()
+        try:
+            STEPS[name]()
+        except Exception as e:
+            log(f"[Warmup] {name} failed: {e}")
+            continue
+        timings[name] = time.perf_counter() - started
+        log(f"[Warmup] {name} done in {timings[name]:.2f}s")
+    return timings
+
+
+def warm_up_on_startup():
+    # called by wsgi.py/asgi.py after the application is built
+    if settings.WARMUP_ON_STARTUP:
+        warm_up()
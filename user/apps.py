@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user'
+
+    def ready(self):
+        from . import authentication, profiles  # noqa: F401, registers the cache invalidation signals
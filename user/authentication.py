@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from stocks.cache import SharedCache
+from stocks.profiling import phase
+
+
+TOKEN_CACHE_TTL = 5 * 60    # bounds how long a deactivated user keeps access
+TOKEN_LOCAL_TTL = 30        # same without a shared CACHE_URL, where a logout only evicts in its own worker
+
+# with a shared backend a logout evicts the token in every worker at once
+_tokens = SharedCache("auth-tokens", TOKEN_CACHE_TTL, local_ttl=TOKEN_LOCAL_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers token -> (user, token), so only the
+    first request with a token in TOKEN_CACHE_TTL goes to the database.
+    Deleting a token (logout) or saving its user drops it from the cache
+    straight away; for every worker when CACHE_URL is shared, otherwise other
+    workers follow within TOKEN_LOCAL_TTL.
+    """
+
+    def authenticate(self, request):
+        with phase("auth"):
+            return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        credentials = cached_credentials(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            _tokens.set(key, credentials)
+        return credentials
+
+
+def cached_credentials(key):
+    """The cached (user, token) for a key, or None; never touches the database."""
+    return _tokens.get(key)
+
+
+async def acached_credentials(key):
+    return await _tokens.aget(key)
+
+
+def forget_token(key):
+    _tokens.delete(key)
+
+
+@receiver(post_delete, sender=Token)
+def _token_deleted(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance, **kwargs):
+    # deactivated, or changed in a way the cached user object wouldn't show
+    for key in Token.objects.filter(user_id=instance.pk).values_list("key", flat=True):
+        forget_token(key)
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def merge_duplicate_stocks(apps, schema_editor):
+    # get_or_create without a unique constraint may have left several rows per
+    # ticker, keep the oldest and move every portfolio/watchlist entry onto it
+    Stock = apps.get_model('user', 'Stock')
+    UserProfile = apps.get_model('user', 'UserProfile')
+
+    duplicates = (
+        Stock.objects.values('ticker')
+        .annotate(count=models.Count('id'), keep=models.Min('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        extra = list(Stock.objects.filter(ticker=row['ticker']).exclude(id=row['keep']).values_list('id', flat=True))
+        for field in ('portfolio', 'watchlist'):
+            through = getattr(UserProfile, field).through
+            profiles = set(through.objects.filter(stock_id__in=extra).values_list('userprofile_id', flat=True))
+            profiles -= set(through.objects.filter(stock_id=row['keep']).values_list('userprofile_id', flat=True))
+            through.objects.bulk_create([through(userprofile_id=pid, stock_id=row['keep']) for pid in profiles])
+            through.objects.filter(stock_id__in=extra).delete()
+        Stock.objects.filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_userprofile_avatar'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_stocks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stock',
+            name='ticker',
+            field=models.CharField(max_length=10, unique=True),
+        ),
+    ]
@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 from django.db import models
 
 class Stock(models.Model):
-    ticker = models.CharField(max_length=10)
+    ticker = models.CharField(max_length=10, unique=True)
     name = models.CharField(max_length=100)
 
 class UserProfile(models.Model):
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.db.models import CharField, Value
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from stocks.cache import SharedCache
+
+from .models import UserProfile
+from .serializers import ProfileHeaderSerializer
+
+
+PROFILE_CACHE_TTL = 10 * 60   # changes through the API evict straight away, the TTL is a backstop
+PROFILE_LOCAL_TTL = 30        # without a shared CACHE_URL evictions only reach their own worker
+
+# with a shared backend an eviction from the signal receivers reaches every worker
+_profiles = SharedCache("profiles", PROFILE_CACHE_TTL, local_ttl=PROFILE_LOCAL_TTL)
+
+_LISTS = ("portfolio", "watchlist")
+
+
+def _stock_lists(user_id):
+    """Portfolio and watchlist rows of a user in a single UNION query, in the order they were added."""
+    queries = [
+        getattr(UserProfile, kind).through.objects
+        .filter(userprofile__user_id=user_id)
+        .annotate(kind=Value(kind, output_field=CharField()))
+        .values_list("kind", "id", "stock__ticker", "stock__name")
+        for kind in _LISTS
+    ]
+    lists = {kind: [] for kind in _LISTS}
+    for kind, _, ticker, name in queries[0].union(*queries[1:], all=True).order_by("kind", "id"):
+        lists[kind].append({"ticker": ticker, "name": name})
+    return lists
+
+
+def profile_data(user):
+    """
+    Serialized profile of a user: avatar (relative url), name, portfolio, watchlist,
+    username and email. Served from the profile cache after the first read, which
+    costs two queries whatever the length of the lists.
+    """
+    data = _profiles.get(user.pk)
+    if data is None:
+        profile = UserProfile.objects.select_related("user").get(user_id=user.pk)
+        data = dict(ProfileHeaderSerializer(profile).data)
+        data.update(_stock_lists(user.pk))
+        data["username"] = profile.user.username
+        data["email"] = profile.user.email
+        _profiles.set(user.pk, data)
+    return data
+
+
+def profile_tickers(user, kind):
+    return [stock["ticker"] for stock in profile_data(user)[kind]]
+
+
+def forget_profile(user_id):
+    _profiles.delete(user_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def _profile_saved(sender, instance, **kwargs):
+    forget_profile(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance, **kwargs):
+    forget_profile(instance.pk)
+
+
+def _lists_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        forget_profile(instance.user_id)
+        return
+    # changed from the Stock side, evict every profile that was touched
+    profiles = UserProfile.objects.all() if pk_set is None else UserProfile.objects.filter(pk__in=pk_set)
+    for user_id in profiles.values_list("user_id", flat=True):
+        forget_profile(user_id)
+
+
+for _kind in _LISTS:
+    m2m_changed.connect(_lists_changed, sender=getattr(UserProfile, _kind).through)
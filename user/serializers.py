@@ -30,10 +30,14 @@ class UserProfileSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if obj.avatar and request:
             return request.build_absolute_uri(obj.avatar.url)
+        if obj.avatar:
+            return obj.avatar.url
         return None
 
     def get_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}"
 
-
-
+class ProfileHeaderSerializer(UserProfileSerializer):
+    # the profile without its stock lists, those are loaded separately in one query
+    class Meta(UserProfileSerializer.Meta):
+        fields = ['avatar', 'name']
@@ -1,3 +1,228 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import TOKEN_LOCAL_TTL, CachedTokenAuthentication, _tokens, cached_credentials
+from .models import Stock, UserProfile
+from .profiles import PROFILE_LOCAL_TTL, _profiles, profile_data
+from .views import MAX_BULK_STOCKS
+
+
+SHARED_CACHE = {"default": {
+    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+    "LOCATION": tempfile.mkdtemp(),
+}}
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="secret")
+        self.token = Token.objects.create(user=self.user)
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_logout_evicts_shared_cache(self):
+        self.addCleanup(cache.clear)
+        user, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertIsNotNone(cached_credentials(self.token.key))
+
+        self.token.delete()
+        self.assertIsNone(cached_credentials(self.token.key))
+
+    def test_per_process_default_caches_in_memory(self):
+        self.addCleanup(_tokens.local.clear)
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(cached_credentials(self.token.key), (self.user, self.token))
+
+        with self.assertNumQueries(0):
+            user, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+
+        self.token.delete()
+        self.assertIsNone(cached_credentials(self.token.key))
+
+    def test_per_process_entries_expire_after_the_local_ttl(self):
+        self.addCleanup(_tokens.local.clear)
+        clock = mock.Mock()
+        clock.monotonic.return_value = 1000.0
+        self.enterContext(mock.patch("stocks.cache.time", clock))
+
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        clock.monotonic.return_value += TOKEN_LOCAL_TTL - 1
+        self.assertIsNotNone(cached_credentials(self.token.key))
+        clock.monotonic.return_value += 1
+        self.assertIsNone(cached_credentials(self.token.key))
+
+    def test_saving_the_user_evicts_its_token(self):
+        self.addCleanup(_tokens.local.clear)
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(cached_credentials(self.token.key))
+        with self.assertRaises(AuthenticationFailed):
+            CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user("bob", password="secret")
+        self.profile = UserProfile.objects.create(user=self.user)
+
+    def test_list_change_evicts_shared_entry(self):
+        self.assertEqual(profile_data(self.user)["watchlist"], [])
+        self.assertIsNotNone(_profiles.get(self.user.pk))
+
+        self.profile.watchlist.add(Stock.objects.create(ticker="AAPL", name="Apple"))
+        self.assertIsNone(_profiles.get(self.user.pk))
+        self.assertEqual(profile_data(self.user)["watchlist"], [{"ticker": "AAPL", "name": "Apple"}])
+
+
+class LocalProfileCacheTests(TestCase):
+    def setUp(self):
+        self.addCleanup(_profiles.local.clear)
+        self.user = User.objects.create_user("carol", password="secret")
+        self.profile = UserProfile.objects.create(user=self.user)
+
+    def test_per_process_default_caches_in_memory(self):
+        profile_data(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(profile_data(self.user)["username"], "carol")
+
+    def test_changes_evict_the_local_entry(self):
+        profile_data(self.user)
+        self.profile.portfolio.add(Stock.objects.create(ticker="MSFT", name="Microsoft"))
+        self.assertIsNone(_profiles.get(self.user.pk))
+        self.assertEqual(profile_data(self.user)["portfolio"], [{"ticker": "MSFT", "name": "Microsoft"}])
+
+        self.user.email = "carol@example.com"
+        self.user.save()
+        self.assertEqual(profile_data(self.user)["email"], "carol@example.com")
+
+    def test_entries_expire_after_the_local_ttl(self):
+        clock = mock.Mock()
+        clock.monotonic.return_value = 1000.0
+        self.enterContext(mock.patch("stocks.cache.time", clock))
+
+        profile_data(self.user)
+        clock.monotonic.return_value += PROFILE_LOCAL_TTL
+        self.assertIsNone(_profiles.get(self.user.pk))
+
+
+class BulkStockTests(TestCase):
+    def setUp(self):
+        self.addCleanup(_profiles.local.clear)
+        self.user = User.objects.create_user("erin", password="secret")
+        self.profile = UserProfile.objects.create(user=self.user)
+        token = Token.objects.create(user=self.user)
+        self.headers = {"Authorization": f"Token {token.key}"}
+
+    def _post(self, path, stocks):
+        return self.client.post(f"/user/{path}/", {"stocks": stocks}, content_type="application/json",
+                                headers=self.headers)
+
+    def _tickers(self, field):
+        return sorted(getattr(self.profile, field).values_list("ticker", flat=True))
+
+    def test_bulk_add_creates_missing_stocks_and_skips_existing_links(self):
+        Stock.objects.create(ticker="AAPL", name="Apple")
+        self.profile.portfolio.add(Stock.objects.get(ticker="AAPL"))
+        profile_data(self.user)
+
+        response = self._post("portfolio/add/bulk", ["AAPL", {"ticker": "MSFT", "name": "Microsoft"}, "MSFT"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._tickers("portfolio"), ["AAPL", "MSFT"])
+        self.assertEqual(Stock.objects.count(), 2)
+        self.assertEqual(Stock.objects.get(ticker="AAPL").name, "Apple")
+        self.assertEqual(self._tickers("watchlist"), [])
+        # the cached profile was evicted
+        self.assertEqual([s["ticker"] for s in profile_data(self.user)["portfolio"]], ["AAPL", "MSFT"])
+
+    def test_bulk_add_of_a_stock_another_user_created(self):
+        Stock.objects.create(ticker="TSLA", name="Tesla")
+
+        self._post("watchlist/add/bulk", ["TSLA"])
+
+        self.assertEqual(self._tickers("watchlist"), ["TSLA"])
+        self.assertEqual(Stock.objects.filter(ticker="TSLA").count(), 1)
+
+    def test_bulk_remove_ignores_unknown_tickers(self):
+        self._post("watchlist/add/bulk", ["AAPL", "MSFT", "TSLA"])
+        profile_data(self.user)
+
+        response = self._post("watchlist/remove/bulk", ["AAPL", "TSLA", "TSLA", "NOPE"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"detail": "2 stocks removed from watchlist."})
+        self.assertEqual(self._tickers("watchlist"), ["MSFT"])
+        self.assertEqual([s["ticker"] for s in profile_data(self.user)["watchlist"]], ["MSFT"])
+        # the stocks themselves stay, other users may hold them
+        self.assertEqual(Stock.objects.count(), 3)
+
+    def test_rejects_invalid_bodies(self):
+        for stocks in ([], "AAPL", [""], [None], [{"name": "No ticker"}], ["TOOLONGTICKER"],
+                       ["A"] * (MAX_BULK_STOCKS + 1)):
+            with self.subTest(stocks=stocks):
+                self.assertEqual(self._post("portfolio/add/bulk", stocks).status_code, 400)
+        self.assertEqual(Stock.objects.count(), 0)
+
+    def test_requires_authentication(self):
+        self.headers = {}
+        self.assertEqual(self._post("portfolio/add/bulk", ["AAPL"]).status_code, 401)
+
+    def test_ticker_is_unique(self):
+        Stock.objects.create(ticker="AAPL", name="Apple")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Stock.objects.create(ticker="AAPL", name="Apple again")
+
+
+class MergeDuplicateStocksMigrationTests(TransactionTestCase):
+    before = [("user", "0002_userprofile_avatar")]
+    after = [("user", "0003_stock_ticker_unique")]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged_onto_the_oldest_row(self):
+        apps = self._migrate(self.before)
+        Stock = apps.get_model("user", "Stock")
+        UserProfile = apps.get_model("user", "UserProfile")
+        User = apps.get_model("auth", "User")
+
+        kept = Stock.objects.create(ticker="AAPL", name="Apple")
+        first, second = (Stock.objects.create(ticker="AAPL", name="Apple dup") for _ in range(2))
+        other = Stock.objects.create(ticker="MSFT", name="Microsoft")
+        alice = UserProfile.objects.create(user=User.objects.create(username="alice"))
+        bob = UserProfile.objects.create(user=User.objects.create(username="bob"))
+        alice.portfolio.add(kept, first, other)
+        alice.watchlist.add(second)
+        bob.portfolio.add(second)
+
+        apps = self._migrate(self.after)
+        Stock = apps.get_model("user", "Stock")
+        UserProfile = apps.get_model("user", "UserProfile")
+
+        self.assertEqual(list(Stock.objects.order_by("id").values_list("id", "ticker")),
+                         [(kept.id, "AAPL"), (other.id, "MSFT")])
+        alice = UserProfile.objects.get(pk=alice.pk)
+        bob = UserProfile.objects.get(pk=bob.pk)
+        self.assertEqual(sorted(alice.portfolio.values_list("id", flat=True)), [kept.id, other.id])
+        self.assertEqual(list(alice.watchlist.values_list("id", flat=True)), [kept.id])
+        self.assertEqual(list(bob.portfolio.values_list("id", flat=True)), [kept.id])
@@ -13,6 +13,10 @@ urlpatterns = [
     path('avatar/upload/', views.upload_avatar, name='upload_avatar'),
     path('portfolio/remove/', views.remove_from_portfolio, name='remove_from_portfolio'),
     path('watchlist/remove/', views.remove_from_watchlist, name='remove_from_watchlist'),
+    path('portfolio/add/bulk/', views.bulk_add_to_portfolio, name='bulk_add_to_portfolio'),
+    path('watchlist/add/bulk/', views.bulk_add_to_watchlist, name='bulk_add_to_watchlist'),
+    path('portfolio/remove/bulk/', views.bulk_remove_from_portfolio, name='bulk_remove_from_portfolio'),
+    path('watchlist/remove/bulk/', views.bulk_remove_from_watchlist, name='bulk_remove_from_watchlist'),
     path('portfolio/', views.portfolio_list, name='portfolio_list'),
     path('watchlist/', views.watchlist_list, name='watchlist_list'),
     path('watchlist/contains/<str:ticker>/', views.is_in_watchlist, name='is_in_watchlist'),
@@ -1,12 +1,16 @@
 from rest_framework.decorators import api_view  # handles http resquests in RESTful
 from rest_framework.response import Response    # formats http response data in JSON
 
-from .serializers import StockSerializer, UserProfileSerializer, UserSerializer # converts User model into JSON format for validation
+from .serializers import UserSerializer # converts User model into JSON format for validation
 from rest_framework import status   # provides set of constants to represent status codes
 from rest_framework.authtoken.models import Token   # generate token for user for API-authentication
 from django.contrib.auth.models import User     # django User model, builtin user management functionalities
 from .models import UserProfile, Stock
+from .profiles import profile_data, profile_tickers, forget_profile
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+
+MAX_BULK_STOCKS = 500   # per request, keeps the IN (...) lists within SQLite's limits
 
 @api_view(['POST'])
 def login(request):
@@ -40,35 +44,34 @@ def signup(request):
 
 # imports form authentications within sessions
 from rest_framework.decorators import authentication_classes, permission_classes
-from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.authentication import SessionAuthentication
+from .authentication import CachedTokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])   # checks the request Token and cross reference with DB 
+@authentication_classes([SessionAuthentication, CachedTokenAuthentication])   # checks the request Token and cross reference with DB 
 @permission_classes([IsAuthenticated])      # after if the user is authenticated, it sets request as that user
 def test_token(request):
     return Response("passed for {}".format(request.user.email))
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def logout(request):
-    request.auth.delete()  # delete the user token from db
+    request.auth.delete()  # delete the user token from db, also evicts it from the token cache
     return Response({"detail": "Successfully logged out"}, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def profile(request):
-    profile = UserProfile.objects.get(user=request.user)
-    serializer = UserProfileSerializer(profile, context={'request': request})
-    data = serializer.data
-    data['username'] = request.user.username
-    data['email'] = request.user.email
+    data = dict(profile_data(request.user))   # cached, copy before adding the absolute avatar url
+    if data['avatar']:
+        data['avatar'] = request.build_absolute_uri(data['avatar'])
     return Response(data)
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def add_to_portfolio(request):
     ticker = request.data.get('ticker')
@@ -83,7 +86,7 @@ def add_to_portfolio(request):
 
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def add_to_watchlist(request):
     ticker = request.data.get('ticker')
@@ -97,7 +100,7 @@ def add_to_watchlist(request):
     return Response({"detail": f"{ticker} added to watchlist."})
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def remove_from_portfolio(request):
     ticker = request.data.get('ticker')
@@ -115,7 +118,7 @@ def remove_from_portfolio(request):
 
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def remove_from_watchlist(request):
     ticker = request.data.get('ticker')
@@ -131,36 +134,97 @@ def remove_from_watchlist(request):
     profile.watchlist.remove(stock)
     return Response({"detail": f"{ticker} removed from watchlist."})
 
+def _parse_bulk(request):
+    # accepts ["AAPL", ...] or [{"ticker": "AAPL", "name": "Apple Inc"}, ...], returns {ticker: name}
+    items = request.data.get('stocks')
+    if not isinstance(items, list) or not items:
+        return None, "A non-empty list of stocks is required"
+    if len(items) > MAX_BULK_STOCKS:
+        return None, f"At most {MAX_BULK_STOCKS} stocks per request"
+
+    stocks = {}
+    for item in items:
+        ticker, name = (item, '') if not isinstance(item, dict) else (item.get('ticker'), item.get('name') or '')
+        if not isinstance(ticker, str) or not ticker or len(ticker) > 10:
+            return None, f"Invalid ticker: {ticker}"
+        stocks[ticker] = str(name)[:100]
+    return stocks, None
+
+def _bulk_add(request, field):
+    stocks, error = _parse_bulk(request)
+    if error:
+        return Response({"detail": error}, status=400)
+
+    through = getattr(UserProfile, field).through
+    with transaction.atomic():
+        # one upsert for the stocks and one insert for the links, existing rows are skipped
+        Stock.objects.bulk_create([Stock(ticker=t, name=n) for t, n in stocks.items()], ignore_conflicts=True)
+        stock_ids = Stock.objects.filter(ticker__in=stocks).values_list('id', flat=True)
+        profile_id = UserProfile.objects.values_list('id', flat=True).get(user=request.user)
+        through.objects.bulk_create(
+            [through(userprofile_id=profile_id, stock_id=stock_id) for stock_id in stock_ids],
+            ignore_conflicts=True,
+        )
+    # bulk inserts don't send m2m_changed
+    forget_profile(request.user.pk)
+    return Response({"detail": f"{len(stocks)} stocks added to {field}."})
+
+def _bulk_remove(request, field):
+    stocks, error = _parse_bulk(request)
+    if error:
+        return Response({"detail": error}, status=400)
+
+    through = getattr(UserProfile, field).through
+    with transaction.atomic():
+        removed, _ = through.objects.filter(userprofile__user=request.user, stock__ticker__in=stocks).delete()
+    forget_profile(request.user.pk)
+    return Response({"detail": f"{removed} stocks removed from {field}."})
+
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def bulk_add_to_portfolio(request):
+    return _bulk_add(request, 'portfolio')
+
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def bulk_add_to_watchlist(request):
+    return _bulk_add(request, 'watchlist')
+
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def bulk_remove_from_portfolio(request):
+    return _bulk_remove(request, 'portfolio')
+
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def bulk_remove_from_watchlist(request):
+    return _bulk_remove(request, 'watchlist')
+
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def portfolio_list(request):
-    profile = UserProfile.objects.get(user=request.user)
-    serializer = StockSerializer(profile.portfolio.all(), many=True)
-    return Response(serializer.data)
+    return Response(profile_data(request.user)['portfolio'])
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def watchlist_list(request):
-    profile = UserProfile.objects.get(user=request.user)
-    serializer = StockSerializer(profile.watchlist.all(), many=True)
-    return Response(serializer.data)
+    return Response(profile_data(request.user)['watchlist'])
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def is_in_watchlist(request, ticker):
-    try:
-        stock = Stock.objects.get(ticker=ticker)
-        profile = UserProfile.objects.get(user=request.user)
-        is_present = profile.watchlist.filter(pk=stock.pk).exists()
-        return Response({"is_in_watchlist": is_present})
-    except Stock.DoesNotExist:
-        return Response({"is_in_watchlist": False})
+    is_present = ticker in profile_tickers(request.user, 'watchlist')
+    return Response({"is_in_watchlist": is_present})
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def upload_avatar(request):
     profile = UserProfile.objects.get(user=request.user)